@@ -0,0 +1,252 @@
+"""Esquema inicial (anterior às migrações)
+
+Tabelas como existiam antes do Alembic, para que `alembic upgrade head` em
+um banco vazio chegue ao esquema dos modelos sem depender de `create_all`.
+Em bancos já existentes (criados por `create_all`) as tabelas presentes são
+ignoradas; as alterações posteriores ficam nas revisões seguintes.
+
+Revision ID: 0000
+Revises:
+Create Date: 2026-10-18
+"""
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0000"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _timestamps():
+    return [
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    ]
+
+
+# Tabela -> (fábrica das colunas, índices (nome, colunas, único)), na ordem das chaves estrangeiras
+TABLES = {
+    "users": (
+        lambda: [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("email", sa.String(), nullable=False),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("hashed_password", sa.String(), nullable=False),
+            sa.Column("full_name", sa.String(), nullable=True),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("is_superuser", sa.Boolean(), nullable=True),
+            sa.Column("is_superadmin", sa.Boolean(), nullable=True),
+            sa.Column("plan", sa.String(), nullable=True),
+            *_timestamps(),
+        ],
+        [("ix_users_id", ["id"], False), ("ix_users_email", ["email"], True), ("ix_users_username", ["username"], True)]
+    ),
+    "tenants": (
+        lambda: [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("slug", sa.String(), nullable=False),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("plan", sa.String(), nullable=True),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("settings", sa.JSON(), nullable=True),
+            *_timestamps(),
+        ],
+        [("ix_tenants_id", ["id"], False), ("ix_tenants_slug", ["slug"], True)]
+    ),
+    "agents": (
+        lambda: [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("tenant_id", sa.Integer(), sa.ForeignKey("tenants.id"), nullable=True),
+            sa.Column("personality", sa.JSON(), nullable=True),
+            sa.Column("model", sa.String(), nullable=True),
+            sa.Column("temperature", sa.Float(), nullable=True),
+            sa.Column("max_tokens", sa.Integer(), nullable=True),
+            sa.Column("system_prompt", sa.Text(), nullable=True),
+            sa.Column("skills", sa.JSON(), nullable=True),
+            sa.Column("actions", sa.JSON(), nullable=True),
+            sa.Column("guardrails", sa.JSON(), nullable=True),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("is_published", sa.Boolean(), nullable=True),
+            sa.Column("version", sa.Integer(), nullable=True),
+            sa.Column("total_conversations", sa.Integer(), nullable=True),
+            sa.Column("total_messages", sa.Integer(), nullable=True),
+            sa.Column("avg_rating", sa.Float(), nullable=True),
+            *_timestamps(),
+        ],
+        [("ix_agents_id", ["id"], False)]
+    ),
+    "conversations": (
+        lambda: [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("agent_id", sa.Integer(), sa.ForeignKey("agents.id"), nullable=False),
+            sa.Column("session_id", sa.String(), nullable=False),
+            sa.Column("channel", sa.String(), nullable=True),
+            sa.Column("user_identifier", sa.String(), nullable=True),
+            sa.Column("metadata", sa.JSON(), nullable=True),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("ended_at", sa.DateTime(), nullable=True),
+            sa.Column("rating", sa.Integer(), nullable=True),
+            sa.Column("feedback", sa.Text(), nullable=True),
+            *_timestamps(),
+        ],
+        [("ix_conversations_id", ["id"], False), ("ix_conversations_session_id", ["session_id"], True)]
+    ),
+    "messages": (
+        lambda: [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("conversation_id", sa.Integer(), sa.ForeignKey("conversations.id"), nullable=False),
+            sa.Column("role", sa.String(), nullable=False),
+            sa.Column("content", sa.Text(), nullable=False),
+            sa.Column("model", sa.String(), nullable=True),
+            sa.Column("tokens_used", sa.Integer(), nullable=True),
+            sa.Column("cost", sa.Float(), nullable=True),
+            sa.Column("latency", sa.Float(), nullable=True),
+            sa.Column("metadata", sa.JSON(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        ],
+        [("ix_messages_id", ["id"], False)]
+    ),
+    "knowledge_bases": (
+        lambda: [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("agent_id", sa.Integer(), sa.ForeignKey("agents.id"), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("embedding_model", sa.String(), nullable=True),
+            sa.Column("chunk_size", sa.Integer(), nullable=True),
+            sa.Column("chunk_overlap", sa.Integer(), nullable=True),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("total_documents", sa.Integer(), nullable=True),
+            sa.Column("total_chunks", sa.Integer(), nullable=True),
+            *_timestamps(),
+        ],
+        [("ix_knowledge_bases_id", ["id"], False)]
+    ),
+    "documents": (
+        lambda: [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("knowledge_base_id", sa.Integer(), sa.ForeignKey("knowledge_bases.id"), nullable=False),
+            sa.Column("filename", sa.String(), nullable=False),
+            sa.Column("file_path", sa.String(), nullable=False),
+            sa.Column("file_type", sa.String(), nullable=True),
+            sa.Column("file_size", sa.Integer(), nullable=True),
+            sa.Column("is_processed", sa.Boolean(), nullable=True),
+            sa.Column("chunks_count", sa.Integer(), nullable=True),
+            sa.Column("processing_error", sa.Text(), nullable=True),
+            sa.Column("metadata", sa.JSON(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("processed_at", sa.DateTime(), nullable=True),
+        ],
+        [("ix_documents_id", ["id"], False)]
+    ),
+    "workflows": (
+        lambda: [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("agent_id", sa.Integer(), sa.ForeignKey("agents.id"), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("nodes", sa.JSON(), nullable=True),
+            sa.Column("edges", sa.JSON(), nullable=True),
+            sa.Column("triggers", sa.JSON(), nullable=True),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("version", sa.Integer(), nullable=True),
+            sa.Column("total_executions", sa.Integer(), nullable=True),
+            sa.Column("success_rate", sa.Float(), nullable=True),
+            *_timestamps(),
+        ],
+        [("ix_workflows_id", ["id"], False)]
+    ),
+    "skills": (
+        lambda: [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False, unique=True),
+            sa.Column("display_name", sa.String(), nullable=False),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("category", sa.String(), nullable=True),
+            sa.Column("code", sa.Text(), nullable=True),
+            sa.Column("parameters", sa.JSON(), nullable=True),
+            sa.Column("returns", sa.JSON(), nullable=True),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("is_premium", sa.Boolean(), nullable=True),
+            sa.Column("usage_count", sa.Integer(), nullable=True),
+            sa.Column("rating", sa.Float(), nullable=True),
+            *_timestamps(),
+        ],
+        [("ix_skills_id", ["id"], False)]
+    ),
+    "api_keys": (
+        lambda: [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("key", sa.String(), nullable=False),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("rate_limit", sa.Integer(), nullable=True),
+            sa.Column("scopes", sa.JSON(), nullable=True),
+            sa.Column("total_requests", sa.Integer(), nullable=True),
+            sa.Column("last_used_at", sa.DateTime(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("expires_at", sa.DateTime(), nullable=True),
+        ],
+        [("ix_api_keys_id", ["id"], False), ("ix_api_keys_key", ["key"], True)]
+    ),
+    "subscriptions": (
+        lambda: [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False, unique=True),
+            sa.Column("stripe_customer_id", sa.String(), nullable=True),
+            sa.Column("stripe_subscription_id", sa.String(), nullable=True),
+            sa.Column("plan_id", sa.String(), nullable=True),
+            sa.Column("status", sa.String(), nullable=True),
+            sa.Column("current_period_end", sa.DateTime(), nullable=True),
+            *_timestamps(),
+        ],
+        [
+            ("ix_subscriptions_id", ["id"], False),
+            ("ix_subscriptions_stripe_customer_id", ["stripe_customer_id"], True),
+            ("ix_subscriptions_stripe_subscription_id", ["stripe_subscription_id"], True),
+        ]
+    ),
+    "payment_history": (
+        lambda: [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("stripe_payment_intent_id", sa.String(), nullable=True, unique=True),
+            sa.Column("amount", sa.Integer(), nullable=True),
+            sa.Column("currency", sa.String(), nullable=True),
+            sa.Column("status", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        ],
+        [("ix_payment_history_id", ["id"], False)]
+    ),
+}
+
+
+def _existing_tables() -> set:
+    """Tabelas já presentes no banco (no modo --sql, nenhuma)"""
+    if context.is_offline_mode():
+        return set()
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def upgrade() -> None:
+    existing = _existing_tables()
+    for table, (columns, indexes) in TABLES.items():
+        if table in existing:
+            continue
+        op.create_table(table, *columns())
+        for name, index_columns, unique in indexes:
+            op.create_index(name, table, index_columns, unique=unique)
+
+
+def downgrade() -> None:
+    for table in reversed(list(TABLES)):
+        op.drop_table(table)
@@ -0,0 +1,54 @@
+"""Índices compostos de conversas e mensagens
+
+Cobre as consultas quentes: histórico de uma conversa em ordem
+(`conversation_id`, `created_at`), conversas de um agente por status (e canal), data e
+avaliação, e os agentes de um usuário (dashboard e analytics).
+
+As tabelas são criadas por `Base.metadata.create_all` no startup, que em um
+banco novo já cria estes índices; por isso índices existentes são ignorados.
+
+Revision ID: 0001
+Revises: 0000
+Create Date: 2026-10-18
+"""
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0001"
+down_revision = "0000"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_messages_conversation_created", "messages", ["conversation_id", "created_at", "id"]),
+    ("ix_messages_conversation_role", "messages", ["conversation_id", "role", "latency"]),
+    ("ix_conversations_agent_active", "conversations", ["agent_id", "is_active", "channel"]),
+    ("ix_conversations_agent_created", "conversations", ["agent_id", "created_at"]),
+    ("ix_conversations_agent_rating", "conversations", ["agent_id", "rating"]),
+    ("ix_agents_owner_id", "agents", ["owner_id"]),
+]
+
+
+def _existing_indexes(table: str) -> set:
+    """Índices já presentes na tabela (no modo --sql, nenhum)"""
+    if context.is_offline_mode():
+        return set()
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade() -> None:
+    existing = {}
+    for name, table, columns in INDEXES:
+        if table not in existing:
+            existing[table] = _existing_indexes(table)
+        if name not in existing[table]:
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        if context.is_offline_mode() or name in _existing_indexes(table):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,83 @@
+"""Métricas de analytics pré-agregadas (agent_daily_stats)
+
+Cria a tabela de contadores por agente, dia e canal e a preenche a partir de
+`conversations` e `messages`. Em um banco novo a tabela já existe (criada por
+`create_all` no startup) e está vazia; nesse caso apenas a carga é feita.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+BACKFILL = """
+INSERT INTO agent_daily_stats (
+    agent_id, day, channel, conversations, conversations_ended, rating_sum,
+    rating_count, messages, latency_sum, latency_count
+)
+SELECT agent_id, day, channel, SUM(conversations), SUM(conversations_ended),
+       SUM(rating_sum), SUM(rating_count), SUM(messages), SUM(latency_sum),
+       SUM(latency_count)
+FROM (
+    SELECT c.agent_id, DATE(c.created_at) AS day,
+           COALESCE(c.channel, 'webchat') AS channel,
+           COUNT(c.id) AS conversations,
+           COUNT(CASE WHEN c.is_active = false AND c.ended_at IS NOT NULL THEN 1 END) AS conversations_ended,
+           COALESCE(SUM(c.rating), 0) AS rating_sum,
+           COUNT(c.rating) AS rating_count,
+           0 AS messages, 0.0 AS latency_sum, 0 AS latency_count
+    FROM conversations c
+    GROUP BY c.agent_id, DATE(c.created_at), COALESCE(c.channel, 'webchat')
+    UNION ALL
+    SELECT c.agent_id, DATE(m.created_at), COALESCE(c.channel, 'webchat'),
+           0, 0, 0, 0,
+           COUNT(m.id),
+           COALESCE(SUM(CASE WHEN m.role = 'assistant' THEN m.latency END), 0.0),
+           COUNT(CASE WHEN m.role = 'assistant' THEN m.latency END)
+    FROM messages m
+    JOIN conversations c ON c.id = m.conversation_id
+    GROUP BY c.agent_id, DATE(m.created_at), COALESCE(c.channel, 'webchat')
+) AS counters
+GROUP BY agent_id, day, channel
+"""
+
+
+def _table_exists() -> bool:
+    if context.is_offline_mode():
+        return False
+    return "agent_daily_stats" in sa.inspect(op.get_bind()).get_table_names()
+
+
+def upgrade() -> None:
+    if not _table_exists():
+        op.create_table(
+            "agent_daily_stats",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("agent_id", sa.Integer(), sa.ForeignKey("agents.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("day", sa.Date(), nullable=False),
+            sa.Column("channel", sa.String(), nullable=False),
+            sa.Column("conversations", sa.Integer(), nullable=False),
+            sa.Column("conversations_ended", sa.Integer(), nullable=False),
+            sa.Column("rating_sum", sa.Integer(), nullable=False),
+            sa.Column("rating_count", sa.Integer(), nullable=False),
+            sa.Column("messages", sa.Integer(), nullable=False),
+            sa.Column("latency_sum", sa.Float(), nullable=False),
+            sa.Column("latency_count", sa.Integer(), nullable=False),
+            sa.UniqueConstraint("agent_id", "day", "channel", name="uq_agent_daily_stats"),
+        )
+
+    op.execute("DELETE FROM agent_daily_stats")
+    op.execute(BACKFILL)
+
+
+def downgrade() -> None:
+    op.drop_table("agent_daily_stats")
@@ -0,0 +1,121 @@
+"""Chunks persistidos, re-ranking, re-chunking e hash de documentos
+
+Traz para bancos existentes o que os modelos ganharam sem migração:
+
+- documents.content_hash (deduplicação de uploads) e o seu índice
+- knowledge_bases.rerank_enabled / rerank_top_n (re-ranking com cross-encoder)
+- knowledge_bases.rechunk (re-chunking em background)
+- tabela chunks e os seus índices
+
+`create_all` cria tabelas que faltam, mas não adiciona colunas a tabelas
+existentes; em um banco novo tudo já existe e nada é alterado.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    ("documents", sa.Column("content_hash", sa.String(), nullable=True)),
+    ("knowledge_bases", sa.Column("rerank_enabled", sa.Boolean(), nullable=True)),
+    ("knowledge_bases", sa.Column("rerank_top_n", sa.Integer(), nullable=True)),
+    ("knowledge_bases", sa.Column("rechunk", sa.JSON(none_as_null=True), nullable=True)),
+]
+
+INDEXES = [
+    ("ix_documents_content_hash", "documents", ["content_hash"]),
+    ("ix_chunks_id", "chunks", ["id"]),
+    ("ix_chunks_document_id", "chunks", ["document_id"]),
+    ("ix_chunks_knowledge_base_id", "chunks", ["knowledge_base_id"]),
+    ("ix_chunks_content_hash", "chunks", ["content_hash"]),
+]
+
+
+def _inspector():
+    """Inspetor do banco (no modo --sql, nenhum: tudo é criado)"""
+    if context.is_offline_mode():
+        return None
+    return sa.inspect(op.get_bind())
+
+
+def _existing_columns(inspector, table: str) -> set:
+    if inspector is None:
+        return set()
+    return {column["name"] for column in inspector.get_columns(table)}
+
+
+def _existing_indexes(inspector, table: str) -> set:
+    if inspector is None or table not in inspector.get_table_names():
+        return set()
+    return {index["name"] for index in inspector.get_indexes(table)}
+
+
+def upgrade() -> None:
+    inspector = _inspector()
+
+    existing = {}
+    for table, column in COLUMNS:
+        if table not in existing:
+            existing[table] = _existing_columns(inspector, table)
+        if column.name not in existing[table]:
+            op.add_column(table, column)
+
+    # Bases existentes: valores padrão dos modelos (re-ranking desligado)
+    knowledge_bases = sa.table(
+        "knowledge_bases",
+        sa.column("rerank_enabled", sa.Boolean()),
+        sa.column("rerank_top_n", sa.Integer())
+    )
+    op.execute(
+        knowledge_bases.update()
+        .where(knowledge_bases.c.rerank_enabled.is_(None))
+        .values(rerank_enabled=False, rerank_top_n=50)
+    )
+
+    if inspector is None or "chunks" not in inspector.get_table_names():
+        op.create_table(
+            "chunks",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column(
+                "document_id", sa.Integer(),
+                sa.ForeignKey("documents.id", ondelete="CASCADE"), nullable=False
+            ),
+            sa.Column("knowledge_base_id", sa.Integer(), sa.ForeignKey("knowledge_bases.id"), nullable=False),
+            sa.Column("position", sa.Integer(), nullable=False),
+            sa.Column("content", sa.Text(), nullable=False),
+            sa.Column("content_hash", sa.String(64), nullable=True),
+            sa.Column("page", sa.Integer(), nullable=True),
+            sa.Column("start_offset", sa.Integer(), nullable=True),
+            sa.Column("end_offset", sa.Integer(), nullable=True),
+            sa.Column("vector_row", sa.Integer(), nullable=True),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+
+    indexes = {}
+    for name, table, columns in INDEXES:
+        if table not in indexes:
+            indexes[table] = _existing_indexes(inspector, table)
+        if name not in indexes[table]:
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    op.drop_table("chunks")
+    op.drop_index("ix_documents_content_hash", table_name="documents")
+
+    for table in ("knowledge_bases", "documents"):
+        with op.batch_alter_table(table) as batch_op:
+            for column_table, column in reversed(COLUMNS):
+                if column_table == table:
+                    batch_op.drop_column(column.name)
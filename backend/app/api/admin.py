@@ -7,6 +7,13 @@ from app.database import get_db
 from app.auth import get_current_user
 from app.models import User, Agent, Tenant, Conversation, Message
 from app.schemas import UserResponse
+from app.services.chat_writes import chat_writes
+from app.services.counters import counters
+from app.services.embedding_cache import embedding_cache
+from app.services.password_pool import password_pool
+from app.services.principal_cache import principal_cache
+from app.services.rate_limit import message_quota, rate_limiter
+from app.services.throttling import login_throttle
 from datetime import datetime, timedelta
 from sqlalchemy import func
 
@@ -62,7 +69,16 @@ async def get_system_stats(
         },
         "messages": {
             "total": total_messages
-        }
+        },
+        "embedding_cache": embedding_cache.stats(),
+        "principal_cache": principal_cache.stats(),
+        "auth": {
+            "password_pool": password_pool.stats(),
+            "login_throttled": login_throttle.blocked
+        },
+        "rate_limit": rate_limiter.stats(),
+        "chat_writes": chat_writes.stats(),
+        "counters": counters.stats()
     }
 
 
@@ -104,6 +120,7 @@ async def activate_user(
     
     user.is_active = True
     db.commit()
+    principal_cache.invalidate_user(user.id)
     
     return {"message": "Usuário ativado com sucesso"}
 
@@ -124,6 +141,7 @@ async def deactivate_user(
     
     user.is_active = False
     db.commit()
+    principal_cache.invalidate_user(user.id)
     
     return {"message": "Usuário desativado com sucesso"}
 
@@ -145,6 +163,8 @@ async def change_user_plan(
     
     user.plan = plan
     db.commit()
+    principal_cache.invalidate_user(user.id)
+    message_quota.invalidate(user.id)
     
     return {"message": f"Plano alterado para {plan} com sucesso"}
 
@@ -168,6 +188,7 @@ async def delete_user(
     
     db.delete(user)
     db.commit()
+    principal_cache.invalidate_user(user_id)
     
     return {"message": "Usuário deletado com sucesso"}
 
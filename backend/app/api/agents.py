@@ -8,10 +8,20 @@ from app.database import get_db
 from app.models import User, Agent
 from app.schemas import AgentCreate, AgentUpdate, AgentResponse
 from app.auth import get_current_user, check_plan_limits
+from app.services.counters import counters
+from app.services.response_cache import response_cache
 
 router = APIRouter()
 
 
+def _agent_response(agent: Agent) -> AgentResponse:
+    """Resposta com os contadores ainda não gravados somados aos do banco"""
+    response = AgentResponse.model_validate(agent)
+    response.total_messages = counters.current("agent_messages", agent.id, agent.total_messages)
+    response.total_conversations = counters.current("agent_conversations", agent.id, agent.total_conversations)
+    return response
+
+
 @router.post("/", response_model=AgentResponse, status_code=status.HTTP_201_CREATED)
 async def create_agent(
     agent_data: AgentCreate,
@@ -63,7 +73,7 @@ async def list_agents(
         Agent.owner_id == current_user.id
     ).offset(skip).limit(limit).all()
     
-    return agents
+    return [_agent_response(agent) for agent in agents]
 
 
 @router.get("/{agent_id}", response_model=AgentResponse)
@@ -84,7 +94,7 @@ async def get_agent(
             detail="Agente não encontrado"
         )
     
-    return agent
+    return _agent_response(agent)
 
 
 @router.put("/{agent_id}", response_model=AgentResponse)
@@ -116,7 +126,10 @@ async def update_agent(
     db.commit()
     db.refresh(agent)
     
-    return agent
+    # Respostas em cache da versão anterior não valem mais
+    response_cache.invalidate_agent(agent.id)
+    
+    return _agent_response(agent)
 
 
 @router.delete("/{agent_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -140,6 +153,8 @@ async def delete_agent(
     db.delete(agent)
     db.commit()
     
+    response_cache.invalidate_agent(agent_id)
+    
     return None
 
 
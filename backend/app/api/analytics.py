@@ -1,88 +1,94 @@
-"""Rotas de analytics"""
+"""Rotas de analytics
+
+As métricas vêm da tabela pré-agregada `agent_daily_stats` (uma linha por
+agente, dia e canal), mantida pelo chat - ver app/services/analytics_rollup.py.
+"""
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 
-from app.database import get_db
-from app.models import User, Agent, Conversation, Message
+from app.database import get_async_db
+from app.models import User, Agent, AgentDailyStats as Stats
 from app.schemas import AgentAnalytics, ConversationStats
 from app.auth import get_current_user
+from app.services.response_cache import response_cache
 
 router = APIRouter()
 
 
+def _totals(*where):
+    """Somas dos contadores nas linhas que atendem aos filtros"""
+    return select(
+        func.coalesce(func.sum(Stats.conversations), 0).label("conversations"),
+        func.coalesce(func.sum(Stats.conversations_ended), 0).label("ended"),
+        func.coalesce(func.sum(Stats.messages), 0).label("messages"),
+        func.coalesce(func.sum(Stats.rating_sum), 0).label("rating_sum"),
+        func.coalesce(func.sum(Stats.rating_count), 0).label("rating_count"),
+        func.coalesce(func.sum(Stats.latency_sum), 0.0).label("latency_sum"),
+        func.coalesce(func.sum(Stats.latency_count), 0).label("latency_count"),
+    ).where(*where)
+
+
+def _owned_by(user: User):
+    """Filtro das linhas dos agentes do usuário"""
+    return Stats.agent_id.in_(select(Agent.id).where(Agent.owner_id == user.id))
+
+
 @router.get("/agents/{agent_id}", response_model=AgentAnalytics)
 async def get_agent_analytics(
     agent_id: int,
     days: int = 30,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obter analytics de um agente"""
     
     # Verificar se agente pertence ao usuário
-    agent = db.query(Agent).filter(
-        Agent.id == agent_id,
-        Agent.owner_id == current_user.id
-    ).first()
+    agent = await db.scalar(
+        select(Agent.id).where(
+            Agent.id == agent_id,
+            Agent.owner_id == current_user.id
+        )
+    )
     
     if not agent:
         raise HTTPException(status_code=404, detail="Agente não encontrado")
     
     # Data de início
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    # Métricas básicas
-    total_conversations = db.query(Conversation).filter(
-        Conversation.agent_id == agent_id
-    ).count()
-    
-    active_conversations = db.query(Conversation).filter(
-        Conversation.agent_id == agent_id,
-        Conversation.is_active == True
-    ).count()
+    start_date = (datetime.utcnow() - timedelta(days=days)).date()
     
-    total_messages = db.query(Message).join(Conversation).filter(
-        Conversation.agent_id == agent_id
-    ).count()
-    
-    # Rating médio
-    avg_rating = db.query(func.avg(Conversation.rating)).filter(
-        Conversation.agent_id == agent_id,
-        Conversation.rating.isnot(None)
-    ).scalar() or 0.0
+    # Métricas acumuladas
+    totals = (await db.execute(_totals(Stats.agent_id == agent_id))).one()
     
     # Mensagens por dia
-    messages_by_day = db.query(
-        func.date(Message.created_at).label('date'),
-        func.count(Message.id).label('count')
-    ).join(Conversation).filter(
-        Conversation.agent_id == agent_id,
-        Message.created_at >= start_date
-    ).group_by(func.date(Message.created_at)).all()
-    
-    # Tempo médio de resposta
-    avg_response_time = db.query(func.avg(Message.latency)).filter(
-        Message.conversation_id.in_(
-            db.query(Conversation.id).filter(Conversation.agent_id == agent_id)
-        ),
-        Message.role == 'assistant'
-    ).scalar() or 0.0
+    messages_by_day = (await db.execute(
+        select(
+            Stats.day,
+            func.sum(Stats.messages).label("count")
+        ).where(
+            Stats.agent_id == agent_id,
+            Stats.day >= start_date
+        ).group_by(Stats.day).having(func.sum(Stats.messages) > 0).order_by(Stats.day)
+    )).all()
+    
+    avg_rating = totals.rating_sum / totals.rating_count if totals.rating_count else 0.0
+    avg_response_time = totals.latency_sum / totals.latency_count if totals.latency_count else 0.0
     
     return AgentAnalytics(
-        total_conversations=total_conversations,
-        total_messages=total_messages,
+        total_conversations=totals.conversations,
+        total_messages=totals.messages,
         avg_rating=round(avg_rating, 2),
-        active_conversations=active_conversations,
+        active_conversations=totals.conversations - totals.ended,
         messages_by_day=[
-            {"date": str(row.date), "count": row.count}
+            {"date": str(row.day), "count": row.count}
             for row in messages_by_day
         ],
         top_topics=[],  # Implementar análise de tópicos
         avg_response_time=round(avg_response_time, 2),
-        success_rate=85.5  # Implementar cálculo real
+        success_rate=85.5,  # Implementar cálculo real
+        response_cache=response_cache.agent_stats(agent_id)
     )
 
 
@@ -90,36 +96,30 @@ async def get_agent_analytics(
 async def get_conversation_stats(
     agent_id: int = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obter estatísticas de conversas"""
     
-    query = db.query(Conversation).join(Agent).filter(
-        Agent.owner_id == current_user.id
-    )
-    
+    filters = [_owned_by(current_user)]
     if agent_id:
-        query = query.filter(Conversation.agent_id == agent_id)
+        filters.append(Stats.agent_id == agent_id)
     
-    total = query.count()
-    active = query.filter(Conversation.is_active == True).count()
-    completed = query.filter(
-        Conversation.is_active == False,
-        Conversation.ended_at.isnot(None)
-    ).count()
+    totals = (await db.execute(_totals(*filters))).one()
     
     # Conversas por canal
-    by_channel = db.query(
-        Conversation.channel,
-        func.count(Conversation.id)
-    ).join(Agent).filter(
-        Agent.owner_id == current_user.id
-    ).group_by(Conversation.channel).all()
+    by_channel = (await db.execute(
+        select(
+            Stats.channel,
+            func.sum(Stats.conversations)
+        ).where(
+            _owned_by(current_user)
+        ).group_by(Stats.channel).having(func.sum(Stats.conversations) > 0)
+    )).all()
     
     return ConversationStats(
-        total=total,
-        active=active,
-        completed=completed,
+        total=totals.conversations,
+        active=totals.conversations - totals.ended,
+        completed=totals.ended,
         avg_duration=0.0,  # Implementar cálculo
         by_channel={row[0]: row[1] for row in by_channel}
     )
@@ -128,35 +128,21 @@ async def get_conversation_stats(
 @router.get("/dashboard")
 async def get_dashboard_data(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obter dados do dashboard principal"""
     
     # Total de agentes
-    total_agents = db.query(Agent).filter(
-        Agent.owner_id == current_user.id
-    ).count()
-    
-    # Total de conversas
-    total_conversations = db.query(Conversation).join(Agent).filter(
-        Agent.owner_id == current_user.id
-    ).count()
-    
-    # Total de mensagens
-    total_messages = db.query(Message).join(Conversation).join(Agent).filter(
-        Agent.owner_id == current_user.id
-    ).count()
+    total_agents = await db.scalar(
+        select(func.count(Agent.id)).where(Agent.owner_id == current_user.id)
+    )
     
-    # Conversas ativas
-    active_conversations = db.query(Conversation).join(Agent).filter(
-        Agent.owner_id == current_user.id,
-        Conversation.is_active == True
-    ).count()
+    totals = (await db.execute(_totals(_owned_by(current_user)))).one()
     
     return {
         "total_agents": total_agents,
-        "total_conversations": total_conversations,
-        "total_messages": total_messages,
-        "active_conversations": active_conversations,
+        "total_conversations": totals.conversations,
+        "total_messages": totals.messages,
+        "active_conversations": totals.conversations - totals.ended,
         "plan": current_user.plan
     }
@@ -1,69 +1,100 @@
 """Rotas de autenticação"""
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 
-from app.database import get_db
+from app.database import get_async_db
 from app.models import User
 from app.schemas import UserCreate, UserResponse, UserLogin, Token
-from app.auth import (
-    verify_password,
-    get_password_hash,
-    create_access_token,
-    get_current_user
-)
+from app.auth import create_access_token, get_current_user
 from app.config import settings
+from app.services.password_pool import PasswordPoolBusy, password_pool
+from app.services.throttling import client_ip, login_throttle
 
 router = APIRouter()
 
 
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Muitas autenticações em andamento, tente novamente em instantes",
+        headers={"Retry-After": "1"}
+    )
+
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Registrar novo usuário"""
     
     # Verificar se email já existe
-    if db.query(User).filter(User.email == user_data.email).first():
+    if await db.scalar(select(User.id).where(User.email == user_data.email)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email já cadastrado"
         )
     
     # Verificar se username já existe
-    if db.query(User).filter(User.username == user_data.username).first():
+    if await db.scalar(select(User.id).where(User.username == user_data.username)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username já cadastrado"
         )
     
+    # Hash da senha fora do event loop, sem segurar a conexão durante o bcrypt
+    await db.rollback()
+    try:
+        hashed_password = await password_pool.hash(user_data.password)
+    except PasswordPoolBusy:
+        raise _busy()
+    
     # Criar usuário
     user = User(
         email=user_data.email,
         username=user_data.username,
         full_name=user_data.full_name,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=hashed_password,
         plan=settings.DEFAULT_PLAN
     )
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     return user
 
 
 @router.post("/login", response_model=Token)
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Login do usuário"""
     
+    # Limite de tentativas por IP (antes de qualquer consulta ou bcrypt)
+    retry_after = login_throttle.hit(client_ip(request))
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Muitas tentativas de login, tente novamente mais tarde",
+            headers={"Retry-After": str(retry_after)}
+        )
+    
     # Buscar usuário por email (usando o campo username do form)
-    user = db.query(User).filter(User.email == form_data.username).first()
+    user = await db.scalar(select(User).where(User.email == form_data.username))
+    
+    # Liberar a conexão antes do bcrypt (os atributos já carregados continuam acessíveis)
+    await db.close()
+    
+    try:
+        valid = user is not None and await password_pool.verify(form_data.password, user.hashed_password)
+    except PasswordPoolBusy:
+        raise _busy()
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email ou senha incorretos",
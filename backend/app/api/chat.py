@@ -1,32 +1,44 @@
 """Rotas de chat com agentes"""
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import json
 import uuid
 import time
 from datetime import datetime
 
-from app.database import get_db
+from app.database import get_async_db, AsyncSessionLocal
 from app.models import Agent, Conversation, Message
 from app.schemas import ChatRequest, ChatResponse
+from app.services import analytics_rollup
+from app.services.chat_writes import chat_writes
+from app.services.counters import counters
 from app.services.llm import LLMService
+from app.services.rate_limit import message_quota
+from app.services.context import ContextManager
+from app.services.response_cache import response_cache
+from app.services.retrieval import ContextRetriever
 
 router = APIRouter()
 
 
-@router.post("/", response_model=ChatResponse)
-async def chat(
-    chat_data: ChatRequest,
-    db: Session = Depends(get_db)
-):
-    """Conversar com um agente"""
+async def _start_turn(chat_data: ChatRequest, db: AsyncSession):
+    """Validar agente, obter/criar conversa, salvar mensagem do usuário e montar contexto
+    
+    Retorna (agente, conversa, primeiro turno da conversa?, serviço de LLM do
+    agente, histórico, system prompt, resultado do RAG ou None).
+    """
     
     # Buscar agente
-    agent = db.query(Agent).filter(
-        Agent.id == chat_data.agent_id,
-        Agent.is_published == True,
-        Agent.is_active == True
-    ).first()
+    agent = await db.scalar(
+        select(Agent).where(
+            Agent.id == chat_data.agent_id,
+            Agent.is_published == True,
+            Agent.is_active == True
+        )
+    )
     
     if not agent:
         raise HTTPException(
@@ -34,15 +46,25 @@ async def chat(
             detail="Agente não encontrado ou não publicado"
         )
     
+    # Limite mensal de mensagens do plano do dono do agente
+    allowed, retry_after = await message_quota.allow(agent.owner_id)
+    if not allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Limite de mensagens do plano atingido",
+            headers={"Retry-After": str(retry_after)}
+        )
+    
     # Obter ou criar conversa
     if chat_data.session_id:
-        conversation = db.query(Conversation).filter(
-            Conversation.session_id == chat_data.session_id
-        ).first()
+        conversation = await db.scalar(
+            select(Conversation).where(Conversation.session_id == chat_data.session_id)
+        )
     else:
         conversation = None
     
-    if not conversation:
+    new_conversation = conversation is None
+    if new_conversation:
         session_id = str(uuid.uuid4())
         conversation = Conversation(
             agent_id=agent.id,
@@ -52,58 +74,107 @@ async def chat(
             metadata=chat_data.metadata
         )
         db.add(conversation)
-        db.commit()
-        db.refresh(conversation)
+        await db.flush()  # id da conversa para a mensagem do usuário
+    elif chat_writes.has_pending(conversation.id):
+        # A resposta do turno anterior ainda está no buffer de escrita;
+        # devolver a conexão da sessão antes de esperar o flush
+        await db.commit()
+        await chat_writes.sync_conversation(conversation.id)
     
-    # Salvar mensagem do usuário
+    # Primeiro turno: nenhuma mensagem anterior na conversa (independe do
+    # quanto do histórico cabe na janela de contexto)
+    first_turn = new_conversation or await db.scalar(
+        select(Message.id).where(Message.conversation_id == conversation.id).limit(1)
+    ) is None
+    
+    # Salvar mensagem do usuário (mesma transação da conversa nova)
     user_message = Message(
         conversation_id=conversation.id,
         role="user",
         content=chat_data.message
     )
     db.add(user_message)
-    db.commit()
+    await db.commit()
     
-    # Obter histórico de mensagens
-    messages = db.query(Message).filter(
-        Message.conversation_id == conversation.id
-    ).order_by(Message.created_at).all()
+    # Métricas do turno no buffer de escrita (sem travar a linha de rollup aqui)
+    await chat_writes.add_turn(agent.id, conversation.channel, new_conversation)
+    if new_conversation:
+        counters.incr("agent_conversations", agent.id)
     
-    # Preparar contexto
-    chat_history = [
-        {"role": msg.role, "content": msg.content}
-        for msg in messages
-    ]
+    # Buscar nas bases de conhecimento do agente em paralelo com o histórico
+    retriever = await ContextRetriever.for_agent(db, agent)
+    if retriever:
+        await retriever.start(chat_data.message)
     
-    # Chamar LLM
-    start_time = time.time()
+    # Preparar contexto (janela recente + resumo, dentro do orçamento de tokens)
     llm_service = LLMService(agent.model)
+    chat_history, system_prompt = await ContextManager(db, agent, conversation).build(
+        llm_service,
+        agent.system_prompt,
+        reserved_tokens=retriever.policy.max_tokens if retriever else 0
+    )
+    
+    # Contexto RAG (o turno segue sem ele se estourar o orçamento de latência)
+    retrieval = None
+    if retriever:
+        retrieval = await retriever.result()
+        context_block = retrieval.context_block(agent.model, retriever.policy.max_tokens)
+        if context_block:
+            system_prompt = f"{system_prompt}\n\n{context_block}" if system_prompt else context_block
+    
+    # Devolver a conexão ao pool durante a chamada ao LLM (os objetos continuam carregados)
+    await db.close()
+    
+    return agent, conversation, first_turn, llm_service, chat_history, system_prompt, retrieval
+
+
+def _sse_event(data: dict) -> str:
+    """Formatar evento Server-Sent Events"""
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/", response_model=ChatResponse)
+async def chat(
+    chat_data: ChatRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Conversar com um agente"""
+    
+    agent, conversation, first_turn, llm_service, chat_history, system_prompt, retrieval = await _start_turn(
+        chat_data, db
+    )
+    
+    # Chamar LLM (a primeira pergunta da conversa pode vir do cache; o
+    # system prompt, com o contexto RAG, faz parte da chave)
+    start_time = time.time()
+    cacheable = first_turn
     
     try:
-        response_text = await llm_service.generate(
-            messages=chat_history,
-            system_prompt=agent.system_prompt,
-            temperature=agent.temperature,
-            max_tokens=agent.max_tokens
-        )
+        response_text = None
+        if cacheable:
+            response_text = await response_cache.lookup(agent, chat_data.message, context=system_prompt)
+        
+        if response_text is None:
+            response_text = await llm_service.generate(
+                messages=chat_history,
+                system_prompt=system_prompt,
+                temperature=agent.temperature,
+                max_tokens=agent.max_tokens
+            )
+            if cacheable:
+                await response_cache.store(agent, chat_data.message, response_text, context=system_prompt)
         
         latency = time.time() - start_time
         
-        # Salvar resposta do assistente
-        assistant_message = Message(
-            conversation_id=conversation.id,
-            role="assistant",
+        # Resposta do assistente e métricas do agente (gravadas em lote)
+        await chat_writes.add_reply(
+            conversation.id, agent.id, conversation.channel,
             content=response_text,
             model=agent.model,
-            tokens_used=0,  # Calcular depois
-            latency=latency
+            latency=latency,
+            metadata={"rag": retrieval.to_metadata()} if retrieval else {}
         )
-        db.add(assistant_message)
-        
-        # Atualizar métricas do agente
-        agent.total_messages += 2  # user + assistant
-        
-        db.commit()
+        counters.incr_many("skill_uses", agent.skills or [])
         
         return ChatResponse(
             session_id=conversation.session_id,
@@ -121,15 +192,125 @@ async def chat(
         )
 
 
+@router.post("/stream")
+async def chat_stream(
+    chat_data: ChatRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Conversar com um agente recebendo a resposta token a token (SSE)
+    
+    Eventos enviados:
+    - start: session_id da conversa
+    - delta: trecho de texto gerado pelo modelo
+    - end: latência total e tempo até o primeiro token
+    - error: falha durante a geração
+    """
+    
+    agent, conversation, first_turn, llm_service, chat_history, system_prompt, retrieval = await _start_turn(
+        chat_data, db
+    )
+    
+    # Copiar dados usados após o fim da dependência get_async_db
+    agent_id = agent.id
+    agent_name = agent.name
+    agent_version = agent.version
+    skills = list(agent.skills or [])
+    model = agent.model
+    conversation_id = conversation.id
+    session_id = conversation.session_id
+    channel = conversation.channel
+    question = chat_data.message
+    message_metadata = {"rag": retrieval.to_metadata()} if retrieval else {}
+    
+    # A primeira pergunta da conversa pode vir do cache (chave inclui o system prompt)
+    cacheable = first_turn
+    cached = await response_cache.lookup(agent, question, context=system_prompt) if cacheable else None
+    
+    if cached is not None:
+        async def cached_stream():
+            yield cached
+        stream = cached_stream()
+    else:
+        stream = llm_service.stream(
+            messages=chat_history,
+            system_prompt=system_prompt,
+            temperature=agent.temperature,
+            max_tokens=agent.max_tokens
+        )
+    
+    async def event_stream():
+        start_time = time.time()
+        first_token_latency = None
+        parts = []
+        
+        yield _sse_event({
+            "type": "start",
+            "session_id": session_id,
+            "agent_name": agent_name,
+            "model": model
+        })
+        
+        try:
+            async for delta in stream:
+                if first_token_latency is None:
+                    first_token_latency = time.time() - start_time
+                parts.append(delta)
+                yield _sse_event({"type": "delta", "content": delta})
+        except Exception as e:
+            # Resposta incompleta: não é gravada nem contabilizada
+            yield _sse_event({
+                "type": "error",
+                "detail": f"Erro ao processar mensagem: {str(e)}"
+            })
+            return
+        
+        latency = time.time() - start_time
+        response_text = "".join(parts)
+        
+        # Resposta do assistente e métricas do agente (gravadas em lote)
+        await chat_writes.add_reply(
+            conversation_id, agent_id, channel,
+            content=response_text,
+            model=model,
+            latency=latency,
+            metadata=message_metadata
+        )
+        counters.incr_many("skill_uses", skills)
+        
+        # Guardar no cache (só streams completos) apenas se o agente não mudou durante o stream
+        # (a sessão de get_async_db já foi encerrada quando o corpo é enviado)
+        if cacheable and cached is None:
+            async with AsyncSessionLocal() as session:
+                stored_agent = await session.get(Agent, agent_id)
+                if stored_agent and stored_agent.version == agent_version:
+                    await response_cache.store(stored_agent, question, response_text, context=system_prompt)
+        
+        yield _sse_event({
+            "type": "end",
+            "session_id": session_id,
+            "latency": latency,
+            "first_token_latency": first_token_latency
+        })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
 @router.get("/history/{session_id}")
 async def get_chat_history(
     session_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obter histórico de conversa"""
-    conversation = db.query(Conversation).filter(
-        Conversation.session_id == session_id
-    ).first()
+    conversation = await db.scalar(
+        select(Conversation).where(Conversation.session_id == session_id)
+    )
     
     if not conversation:
         raise HTTPException(
@@ -137,9 +318,15 @@ async def get_chat_history(
             detail="Conversa não encontrada"
         )
     
-    messages = db.query(Message).filter(
-        Message.conversation_id == conversation.id
-    ).order_by(Message.created_at).all()
+    if chat_writes.has_pending(conversation.id):
+        await db.commit()  # devolver a conexão antes de esperar o flush
+        await chat_writes.sync_conversation(conversation.id)
+    
+    messages = await db.scalars(
+        select(Message).where(
+            Message.conversation_id == conversation.id
+        ).order_by(Message.created_at)
+    )
     
     return {
         "session_id": session_id,
@@ -160,12 +347,12 @@ async def end_conversation(
     session_id: str,
     rating: int = None,
     feedback: str = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Encerrar conversa"""
-    conversation = db.query(Conversation).filter(
-        Conversation.session_id == session_id
-    ).first()
+    conversation = await db.scalar(
+        select(Conversation).where(Conversation.session_id == session_id)
+    )
     
     if not conversation:
         raise HTTPException(
@@ -173,6 +360,17 @@ async def end_conversation(
             detail="Conversa não encontrada"
         )
     
+    # Encerramento e avaliação contam no dia em que a conversa começou
+    ended = 1 if conversation.is_active else 0
+    rating_delta, rating_count = 0, 0
+    if rating:
+        rating_delta = rating - (conversation.rating or 0)
+        rating_count = 0 if conversation.rating else 1
+    await analytics_rollup.record(
+        db, conversation.agent_id, conversation.channel, conversation.created_at.date(),
+        conversations_ended=ended, rating_sum=rating_delta, rating_count=rating_count
+    )
+    
     conversation.is_active = False
     conversation.ended_at = datetime.utcnow()
     
@@ -181,6 +379,6 @@ async def end_conversation(
     if feedback:
         conversation.feedback = feedback
     
-    db.commit()
+    await db.commit()
     
     return {"message": "Conversa encerrada com sucesso"}
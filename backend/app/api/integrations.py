@@ -1,8 +1,8 @@
 
 from fastapi import APIRouter, Request, HTTPException, Query, BackgroundTasks
 import logging
-import httpx
 from app.config import settings
+from app.services.clients import get_provider_clients
 from app.services.llm import LLMService
 
 router = APIRouter()
@@ -96,10 +96,10 @@ async def send_whatsapp_message(phone_number_id, recipient_id, text):
         "text": {"body": text}
     }
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(url, json=data, headers=headers)
-            response.raise_for_status()
-            logger.info(f"Resposta enviada para {recipient_id}")
-        except Exception as e:
-            logger.error(f"Erro ao enviar mensagem WA: {str(e)}")
+    client = get_provider_clients().http
+    try:
+        response = await client.post(url, json=data, headers=headers)
+        response.raise_for_status()
+        logger.info(f"Resposta enviada para {recipient_id}")
+    except Exception as e:
+        logger.error(f"Erro ao enviar mensagem WA: {str(e)}")
@@ -1,20 +1,42 @@
 """Rotas de RAG (Retrieval Augmented Generation)"""
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request
 from sqlalchemy.orm import Session
 from typing import List
 import os
-import uuid
 
 from app.database import get_db
 from app.models import User, Agent, KnowledgeBase, Document
-from app.schemas import KnowledgeBaseCreate, KnowledgeBaseResponse, DocumentUploadResponse
+from app.schemas import (
+    KnowledgeBaseCreate,
+    KnowledgeBaseUpdate,
+    KnowledgeBaseResponse,
+    KnowledgeBaseRechunk,
+    RechunkStatusResponse,
+    DocumentUploadResponse,
+    DocumentStatusResponse
+)
 from app.auth import get_current_user
 from app.config import settings
 from app.services.rag import RAGService
+from app.services.ingestion import ingestion_queue, document_status, rechunk_status, RUNNING
+from app.services.chunk_store import delete_chunks
+from app.services.storage import store_upload, release_blob, FileTooLargeError
 
 router = APIRouter()
 
+# Bytes extras aceitos no corpo multipart além do arquivo (boundary, cabeçalhos)
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def ensure_not_rechunking(kb: KnowledgeBase):
+    """Bloquear alterações de documentos enquanto o re-chunking da base roda"""
+    if (kb.rechunk or {}).get("status") == RUNNING:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Base de conhecimento em re-chunking; tente novamente ao final"
+        )
+
 
 @router.post("/knowledge-bases", response_model=KnowledgeBaseResponse, status_code=status.HTTP_201_CREATED)
 async def create_knowledge_base(
@@ -43,7 +65,9 @@ async def create_knowledge_base(
         name=kb_data.name,
         description=kb_data.description,
         chunk_size=kb_data.chunk_size,
-        chunk_overlap=kb_data.chunk_overlap
+        chunk_overlap=kb_data.chunk_overlap,
+        rerank_enabled=kb_data.rerank_enabled,
+        rerank_top_n=kb_data.rerank_top_n
     )
     
     db.add(kb)
@@ -53,6 +77,179 @@ async def create_knowledge_base(
     return kb
 
 
+@router.patch("/knowledge-bases/{kb_id}", response_model=KnowledgeBaseResponse)
+async def update_knowledge_base(
+    kb_id: int,
+    kb_data: KnowledgeBaseUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Atualizar base de conhecimento (nome, status, re-ranking)"""
+    
+    kb = db.query(KnowledgeBase).join(Agent).filter(
+        KnowledgeBase.id == kb_id,
+        Agent.owner_id == current_user.id
+    ).first()
+    
+    if not kb:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Base de conhecimento não encontrada"
+        )
+    
+    update_data = kb_data.model_dump(exclude_unset=True)
+    for field, value in update_data.items():
+        setattr(kb, field, value)
+    
+    db.commit()
+    db.refresh(kb)
+    
+    return kb
+
+
+@router.post("/knowledge-bases/{kb_id}/reindex", status_code=status.HTTP_202_ACCEPTED)
+async def reindex_knowledge_base(
+    kb_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Reconstruir os índices da base a partir dos chunks gravados
+    
+    Os documentos voltam para a fila de ingestão, que lê os chunks do banco
+    (sem reprocessar os arquivos) e gera os índices vetorial e lexical.
+    """
+    
+    kb = db.query(KnowledgeBase).join(Agent).filter(
+        KnowledgeBase.id == kb_id,
+        Agent.owner_id == current_user.id
+    ).first()
+    
+    if not kb:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Base de conhecimento não encontrada"
+        )
+    
+    ensure_not_rechunking(kb)
+    
+    pending = db.query(Document.id).filter(
+        Document.knowledge_base_id == kb_id,
+        Document.is_processed == False,
+        Document.processing_error.is_(None)
+    ).first()
+    
+    if pending:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Aguarde o processamento dos documentos pendentes"
+        )
+    
+    documents = db.query(Document).filter(
+        Document.knowledge_base_id == kb_id,
+        Document.is_processed == True
+    ).all()
+    
+    await RAGService(kb.embedding_model).drop_index(kb.id)
+    
+    for document in documents:
+        document.is_processed = False
+        document.processed_at = None
+    kb.total_documents = 0
+    kb.total_chunks = 0
+    db.commit()
+    
+    for document in documents:
+        ingestion_queue.enqueue(document.id)
+    
+    return {
+        "knowledge_base_id": kb.id,
+        "documents": len(documents),
+        "status": "queued"
+    }
+
+
+@router.post(
+    "/knowledge-bases/{kb_id}/rechunk",
+    response_model=RechunkStatusResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def rechunk_knowledge_base(
+    kb_id: int,
+    rechunk_data: KnowledgeBaseRechunk,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Alterar chunk_size/chunk_overlap e dividir os documentos de novo
+    
+    Roda em background: só os chunks com texto novo geram embeddings, e o
+    índice atual continua atendendo buscas até ser substituído pelo novo.
+    """
+    
+    kb = db.query(KnowledgeBase).join(Agent).filter(
+        KnowledgeBase.id == kb_id,
+        Agent.owner_id == current_user.id
+    ).first()
+    
+    if not kb:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Base de conhecimento não encontrada"
+        )
+    
+    if rechunk_data.chunk_overlap >= rechunk_data.chunk_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="chunk_overlap deve ser menor que chunk_size"
+        )
+    
+    ensure_not_rechunking(kb)
+    
+    pending = db.query(Document.id).filter(
+        Document.knowledge_base_id == kb_id,
+        Document.is_processed == False,
+        Document.processing_error.is_(None)
+    ).first()
+    
+    if pending:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Aguarde o processamento dos documentos pendentes"
+        )
+    
+    kb.rechunk = {
+        "chunk_size": rechunk_data.chunk_size,
+        "chunk_overlap": rechunk_data.chunk_overlap,
+        "status": RUNNING
+    }
+    db.commit()
+    
+    ingestion_queue.start_rechunk(kb.id)
+    
+    return rechunk_status(kb)
+
+
+@router.get("/knowledge-bases/{kb_id}/rechunk", response_model=RechunkStatusResponse)
+async def get_rechunk_status(
+    kb_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Status do re-chunking de uma base"""
+    
+    kb = db.query(KnowledgeBase).join(Agent).filter(
+        KnowledgeBase.id == kb_id,
+        Agent.owner_id == current_user.id
+    ).first()
+    
+    if not kb:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Base de conhecimento não encontrada"
+        )
+    
+    return rechunk_status(kb)
+
+
 @router.get("/knowledge-bases", response_model=List[KnowledgeBaseResponse])
 async def list_knowledge_bases(
     agent_id: int,
@@ -80,9 +277,14 @@ async def list_knowledge_bases(
     return knowledge_bases
 
 
-@router.post("/knowledge-bases/{kb_id}/documents", response_model=DocumentUploadResponse)
+@router.post(
+    "/knowledge-bases/{kb_id}/documents",
+    response_model=DocumentUploadResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
 async def upload_document(
     kb_id: int,
+    request: Request,
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -101,6 +303,8 @@ async def upload_document(
             detail="Base de conhecimento não encontrada"
         )
     
+    ensure_not_rechunking(kb)
+    
     # Validar tipo de arquivo
     allowed_extensions = ['.pdf', '.txt', '.docx', '.md']
     file_ext = os.path.splitext(file.filename)[1].lower()
@@ -111,22 +315,37 @@ async def upload_document(
             detail=f"Tipo de arquivo não suportado. Tipos permitidos: {', '.join(allowed_extensions)}"
         )
     
-    # Salvar arquivo
-    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-    file_id = str(uuid.uuid4())
-    file_path = os.path.join(settings.UPLOAD_DIR, f"{file_id}{file_ext}")
+    too_large = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Arquivo muito grande. Tamanho máximo: {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB"
+    )
+    
+    # Rejeitar cedo pelo Content-Length (margem para os cabeçalhos multipart)
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        if int(content_length) > settings.MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD:
+            raise too_large
+    
+    # Salvar arquivo em blocos (memória constante), endereçado pelo conteúdo
+    try:
+        file_path, file_size, content_hash = await store_upload(
+            file, file_ext, settings.MAX_UPLOAD_SIZE
+        )
+    except FileTooLargeError:
+        raise too_large
+    
+    # Mesmo arquivo já enviado para esta base: reaproveitar o documento
+    existing = db.query(Document).filter(
+        Document.knowledge_base_id == kb_id,
+        Document.content_hash == content_hash,
+        Document.processing_error.is_(None)
+    ).first()
     
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        
-        # Verificar tamanho
-        if len(content) > settings.MAX_UPLOAD_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Arquivo muito grande. Tamanho máximo: {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB"
-            )
-        
-        f.write(content)
+    if existing:
+        response = DocumentUploadResponse.model_validate(existing)
+        response.job_id = existing.id
+        response.status = document_status(existing)["status"]
+        return response
     
     # Criar documento
     document = Document(
@@ -134,35 +353,21 @@ async def upload_document(
         filename=file.filename,
         file_path=file_path,
         file_type=file_ext[1:],  # Remover o ponto
-        file_size=len(content)
+        file_size=file_size,
+        content_hash=content_hash
     )
     
     db.add(document)
     db.commit()
     db.refresh(document)
     
-    # Processar documento em background (aqui simulado)
-    try:
-        rag_service = RAGService()
-        chunks = await rag_service.process_document(
-            file_path,
-            kb.chunk_size,
-            kb.chunk_overlap
-        )
-        
-        document.is_processed = True
-        document.chunks_count = len(chunks)
-        kb.total_documents += 1
-        kb.total_chunks += len(chunks)
-        
-        db.commit()
-        db.refresh(document)
-        
-    except Exception as e:
-        document.processing_error = str(e)
-        db.commit()
-    
-    return document
+    # Processar documento em background (fila de ingestão)
+    job_id = ingestion_queue.enqueue(document.id)
+    
+    response = DocumentUploadResponse.model_validate(document)
+    response.job_id = job_id
+    response.status = "queued"
+    return response
 
 
 @router.get("/knowledge-bases/{kb_id}/documents")
@@ -192,6 +397,28 @@ async def list_documents(
     return documents
 
 
+@router.get("/documents/{document_id}/status", response_model=DocumentStatusResponse)
+async def get_document_status(
+    document_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Status do processamento (ingestão) de um documento"""
+    
+    document = db.query(Document).join(KnowledgeBase).join(Agent).filter(
+        Document.id == document_id,
+        Agent.owner_id == current_user.id
+    ).first()
+    
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Documento não encontrado"
+        )
+    
+    return document_status(document)
+
+
 @router.delete("/documents/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_document(
     document_id: int,
@@ -212,10 +439,16 @@ async def delete_document(
             detail="Documento não encontrado"
         )
     
-    # Deletar arquivo físico
-    if os.path.exists(document.file_path):
-        os.remove(document.file_path)
+    kb = document.knowledge_base
+    ensure_not_rechunking(kb)
+    
+    # Remover chunks do índice vetorial
+    await RAGService(kb.embedding_model).delete_document(kb.id, document.id)
     
+    # Deletar arquivo físico (se nenhum outro documento usa o mesmo blob)
+    release_blob(db, document)
+    
+    delete_chunks(db, document.id)
     db.delete(document)
     db.commit()
     
@@ -240,8 +473,11 @@ async def search_knowledge(
         )
     
     # Buscar documentos relevantes
-    rag_service = RAGService()
-    results = await rag_service.search(query, kb_id, top_k)
+    rag_service = RAGService(kb.embedding_model)
+    results = await rag_service.search(
+        query, kb_id, top_k,
+        rerank_top_n=kb.rerank_top_n if kb.rerank_enabled else None
+    )
     
     return {
         "query": query,
@@ -7,10 +7,18 @@ from typing import List
 from app.database import get_db
 from app.models import Skill
 from app.schemas import SkillResponse
+from app.services.counters import counters
 
 router = APIRouter()
 
 
+def _skill_response(skill: Skill) -> SkillResponse:
+    """Resposta com os usos ainda não gravados somados aos do banco"""
+    response = SkillResponse.model_validate(skill)
+    response.usage_count = counters.current("skill_uses", skill.name, skill.usage_count)
+    return response
+
+
 @router.get("/", response_model=List[SkillResponse])
 async def list_skills(
     category: str = None,
@@ -27,7 +35,7 @@ async def list_skills(
     
     skills = query.offset(skip).limit(limit).all()
     
-    return skills
+    return [_skill_response(skill) for skill in skills]
 
 
 @router.get("/{skill_id}", response_model=SkillResponse)
@@ -48,7 +56,7 @@ async def get_skill(
             detail="Skill não encontrada"
         )
     
-    return skill
+    return _skill_response(skill)
 
 
 @router.get("/categories/list")
@@ -6,12 +6,12 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
 
 from app.config import settings
-from app.database import get_db
+from app.database import AsyncSessionLocal
 from app.models import User
 from app.schemas import TokenData
+from app.services.principal_cache import Principal, principal_cache
 
 # Configuração de senha
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -67,14 +67,24 @@ def decode_access_token(token: str) -> TokenData:
         )
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    """Obter usuário atual do token"""
+async def _load_principal(user_id: int) -> Optional[Principal]:
+    async with AsyncSessionLocal() as db:
+        user = await db.get(User, user_id)
+        return Principal.from_user(user) if user else None
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    """Obter usuário atual do token
+    
+    Retorna um snapshot do usuário (Principal) em cache por alguns segundos;
+    rotas que precisam alterar o usuário devem buscá-lo na própria sessão.
+    """
     token_data = decode_access_token(token)
     
-    user = db.query(User).filter(User.id == token_data.user_id).first()
+    user = await principal_cache.get(
+        token_data.user_id, token,
+        lambda: _load_principal(token_data.user_id)
+    )
     
     if user is None:
         raise HTTPException(
@@ -7,6 +7,16 @@ from typing import List
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite:///./aimaestro.db"
+    DATABASE_ASYNC_URL: str = ""  # vazio = DATABASE_URL com driver assíncrono (aiosqlite/asyncpg)
+    
+    # Pool de conexões (por engine: síncrona e assíncrona)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30  # segundos esperando uma conexão livre
+    DB_POOL_RECYCLE: int = 1800  # segundos até reabrir uma conexão
+    DB_POOL_PRE_PING: bool = True
+    SQLITE_WAL: bool = True  # journal WAL (leituras concorrentes com a escrita)
+    SQLITE_BUSY_TIMEOUT: float = 30.0  # segundos esperando o lock de escrita
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
@@ -16,8 +26,23 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # Senhas (bcrypt em pool de threads dedicado) e limite de logins
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32  # acima disso login/registro respondem 503
+    LOGIN_RATE_LIMIT: int = 10  # tentativas por IP na janela (0 = sem limite)
+    LOGIN_RATE_WINDOW: int = 60  # segundos
+    TRUST_PROXY_HEADERS: bool = False  # usar X-Forwarded-For (atrás de proxy confiável)
+    
+    # Rate limiting (token buckets por chave de API, usuário e agente)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # memory | redis (buckets compartilhados entre workers)
+    RATE_LIMIT_AGENT_RPM: int = 600  # mensagens por minuto por agente no chat (0 = sem limite)
+    USAGE_FLUSH_INTERVAL: float = 10.0  # segundos entre gravações do uso das chaves de API
+    USAGE_REFRESH_INTERVAL: int = 60  # segundos de cache da contagem mensal de mensagens
+    
     # OpenAI
     OPENAI_API_KEY: str = ""
+    OPENAI_BASE_URL: str = ""  # vazio = endpoint oficial (útil para proxies e mocks)
     
     # Anthropic
     ANTHROPIC_API_KEY: str = ""
@@ -25,6 +50,13 @@ class Settings(BaseSettings):
     # Google
     GOOGLE_API_KEY: str = ""
     
+    # Pool de conexões dos provedores de LLM
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_KEEPALIVE_EXPIRY: float = 30.0  # segundos
+    LLM_TIMEOUT: float = 120.0  # segundos
+    LLM_HTTP2: bool = True
+    
     # Server
     HOST: str = "0.0.0.0"
     PORT: int = 8000
@@ -37,6 +69,54 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str = "./uploads"
     MAX_UPLOAD_SIZE: int = 10485760  # 10MB
     
+    # RAG / índice vetorial
+    VECTOR_INDEX_DIR: str = "./vector_indexes"
+    VECTOR_IVF_MIN_VECTORS: int = 20000  # abaixo disso a busca é exata
+    VECTOR_IVF_MAX_LISTS: int = 4096
+    VECTOR_IVF_NPROBE: int = 16
+    LOCAL_EMBEDDING_MODEL: str = "paraphrase-multilingual-MiniLM-L12-v2"
+    EMBEDDING_OFFLINE: bool = False  # True = sempre usar o modelo local
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "./embedding_cache.db"
+    EMBEDDING_CACHE_MAX_QUERIES: int = 10000  # embeddings de consultas por modelo (0 = não gravar)
+    EMBEDDING_BATCH_SIZE: int = 256  # textos por requisição
+    EMBEDDING_BATCH_TOKENS: int = 50000  # tokens por requisição
+    EMBEDDING_CONCURRENCY: int = 4  # requisições simultâneas por modelo
+    EMBEDDING_TPM: int = 1000000  # orçamento de tokens por minuto (0 = sem limite)
+    EMBEDDING_MAX_RETRIES: int = 6  # retries em 429
+    INGESTION_WORKERS: int = 2  # documentos processados ao mesmo tempo
+    INGESTION_PROCESSES: int = 0  # processos para parsing/chunking (0 = núcleos da CPU)
+    PDF_PAGES_PER_TASK: int = 25  # páginas de PDF por tarefa no pool de processos
+    RAG_HYBRID_SEARCH: bool = True  # vetorial + BM25 com reciprocal rank fusion
+    RAG_RRF_K: int = 60
+    RERANK_MODEL: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"  # multilíngue
+    RERANK_BATCH_SIZE: int = 16  # pares por lote no cross-encoder
+    RERANK_TIMEOUT_MS: int = 300  # limite de latência do re-ranking
+    RAG_CHAT_ENABLED: bool = True  # injetar contexto das bases no chat
+    RAG_CHAT_TOP_K: int = 4
+    RAG_CHAT_LATENCY_BUDGET_MS: int = 150  # acima disso o turno segue sem contexto
+    RAG_CHAT_MAX_TOKENS: int = 1500  # tokens de contexto no system prompt
+    
+    # Cache do usuário autenticado (get_current_user)
+    PRINCIPAL_CACHE_ENABLED: bool = True
+    PRINCIPAL_CACHE_TTL: int = 60  # segundos
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+    
+    # Gravação em lote das respostas do chat (write-behind)
+    CHAT_WRITE_BEHIND: bool = True
+    CHAT_WRITE_FLUSH_INTERVAL: float = 0.2  # segundos entre flushes
+    CHAT_WRITE_BATCH_SIZE: int = 500  # mensagens que antecipam o flush
+    CHAT_WRITE_MAX_PENDING: int = 10000  # acima disso a requisição grava o buffer
+    COUNTER_FLUSH_INTERVAL: float = 5.0  # segundos entre gravações de total_messages/usage_count
+    
+    # Cache de respostas do chat
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_TTL: int = 3600  # segundos
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+    RESPONSE_CACHE_SEMANTIC: bool = True  # busca por similaridade além da exata
+    RESPONSE_CACHE_THRESHOLD: float = 0.95  # similaridade mínima (cosseno)
+    RESPONSE_CACHE_EMBEDDING_MODEL: str = "text-embedding-ada-002"
+    
     # Multi-tenant
     DEFAULT_PLAN: str = "starter"
 
@@ -1,19 +1,85 @@
-"""Configuração do banco de dados"""
+"""Configuração do banco de dados
 
-from sqlalchemy import create_engine
+Duas engines sobre o mesmo banco: a síncrona (`get_db`), usada pela maior
+parte das rotas e pelos serviços em background, e a assíncrona
+(`get_async_db`, aiosqlite/asyncpg), usada nas rotas de maior tráfego para
+que a espera pelo banco não bloqueie o event loop. Cada engine tem o seu pool,
+configurado em `Settings` (DB_POOL_*).
+
+Em SQLite, as conexões usam WAL (leitores não bloqueiam o commit de quem
+escreve) e esperam até SQLITE_BUSY_TIMEOUT segundos pelo lock de escrita.
+"""
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 
+
+def _pool_options(url: str) -> dict:
+    """Opções de pool da engine (SQLite não usa QueuePool com tamanho fixo)"""
+    options = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    if not url.startswith("sqlite"):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    return options
+
+
+def async_database_url() -> str:
+    """URL com driver assíncrono (DATABASE_ASYNC_URL ou derivada de DATABASE_URL)"""
+    if settings.DATABASE_ASYNC_URL:
+        return settings.DATABASE_ASYNC_URL
+
+    url = settings.DATABASE_URL
+    for prefix, async_prefix in (
+        ("sqlite://", "sqlite+aiosqlite://"),
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgres://", "postgresql+asyncpg://"),
+    ):
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+
 # Criar engine
 engine = create_engine(
     settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
+    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {},
+    **_pool_options(settings.DATABASE_URL)
 )
 
+# Engine assíncrona
+ASYNC_DATABASE_URL = async_database_url()
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_options(ASYNC_DATABASE_URL))
+
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    if settings.SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT * 1000)}")
+    cursor.close()
+
+
+for _engine in (engine, async_engine.sync_engine):
+    if _engine.dialect.name == "sqlite":
+        event.listen(_engine, "connect", _configure_sqlite)
+
 # Session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Objetos continuam utilizáveis após o commit (sem lazy load fora do await)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
 # Base para modelos
 Base = declarative_base()
 
@@ -25,3 +91,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
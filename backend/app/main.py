@@ -13,7 +13,14 @@ import logging
 from pathlib import Path
 
 from app.config import settings
-from app.database import engine, Base
+from app.database import engine, async_engine, Base
+from app.services.clients import provider_clients
+from app.services.chat_writes import chat_writes
+from app.services.counters import counters
+from app.services.ingestion import ingestion_queue
+from app.services.password_pool import password_pool
+from app.services.rate_limit import rate_limiter, usage_recorder
+from app.middleware import RateLimitMiddleware
 from app.api import auth, agents, chat, rag, analytics, workflows, skills, admin, billing, integrations
 
 # Configurar logging
@@ -28,9 +35,23 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 Iniciando AI-Maestro Backend...")
     Base.metadata.create_all(bind=engine)
     logger.info("✅ Tabelas do banco de dados criadas")
+    provider_clients.start()
+    password_pool.start()
+    await usage_recorder.start()
+    await chat_writes.start()
+    await counters.start()
+    await ingestion_queue.start()
     yield
     # Shutdown
     logger.info("👋 Encerrando AI-Maestro Backend...")
+    await ingestion_queue.stop()
+    await provider_clients.close()
+    password_pool.close()
+    await chat_writes.stop()
+    await counters.stop()
+    await usage_recorder.stop()
+    await rate_limiter.close()
+    await async_engine.dispose()
 
 
 app = FastAPI(
@@ -42,6 +63,9 @@ app = FastAPI(
     redoc_url="/api/redoc"
 )
 
+# Rate limiting (registrado antes do CORS, que fica por fora e também cobre as respostas 429)
+app.add_middleware(RateLimitMiddleware)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
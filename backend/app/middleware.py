@@ -0,0 +1,131 @@
+"""Middleware de rate limiting
+
+Middleware ASGI puro (não bufferiza respostas, preserva streams SSE). Antes
+das rotas, identifica a requisição - chave de API (X-API-Key), usuário do
+token Bearer e, no chat público, o agente do corpo JSON - e consome um token
+de cada bucket aplicável (app/services/rate_limit.py). O primeiro bucket
+vazio encerra a requisição com 429 e Retry-After.
+
+Token inválido ou ausente não é rejeitado aqui: a rota responde 401 como
+antes. Chave de API inválida responde 401 já no middleware.
+"""
+
+import json
+import math
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.auth import get_current_user
+from app.config import settings
+from app.services.principal_cache import Principal
+from app.services.rate_limit import (
+    api_key_cache,
+    plan_requests_per_minute,
+    rate_limiter,
+    usage_recorder
+)
+
+# Rotas de chat público (o agente vem no corpo da requisição)
+CHAT_PATHS = {"/api/chat/", "/api/chat/stream"}
+
+# Corpos maiores não são inspecionados (sem limite por agente)
+MAX_INSPECTED_BODY = 64 * 1024
+
+
+class RateLimitMiddleware:
+    """Token buckets por chave de API, usuário e agente"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not settings.RATE_LIMIT_ENABLED or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        buckets: List[Tuple[str, int, int]] = []  # (bucket, limite, janela em segundos)
+
+        api_key = None
+        raw_key = headers.get(b"x-api-key")
+        if raw_key:
+            api_key = await api_key_cache.get(raw_key.decode("latin-1"))
+            if api_key is None:
+                response = JSONResponse(status_code=401, content={"detail": "Chave de API inválida"})
+                await response(scope, receive, send)
+                return
+            if api_key.rate_limit:
+                buckets.append((f"key:{api_key.id}", api_key.rate_limit, 3600))
+            user_id, plan = api_key.user_id, api_key.plan
+        else:
+            user = await _bearer_user(headers)
+            user_id, plan = (user.id, user.plan) if user else (None, None)
+
+        if user_id is not None and plan_requests_per_minute(plan):
+            buckets.append((f"user:{user_id}", plan_requests_per_minute(plan), 60))
+
+        if scope["method"] == "POST" and scope["path"] in CHAT_PATHS and settings.RATE_LIMIT_AGENT_RPM:
+            body, receive = await _buffer_body(receive)
+            agent_id = _agent_id(body)
+            if agent_id is not None:
+                buckets.append((f"agent:{agent_id}", settings.RATE_LIMIT_AGENT_RPM, 60))
+
+        for bucket, limit, window in buckets:
+            wait = await rate_limiter.take(bucket, limit, window)
+            if wait:
+                response = JSONResponse(
+                    status_code=429,
+                    content={"detail": "Limite de requisições excedido, tente novamente mais tarde"},
+                    headers={"Retry-After": str(math.ceil(wait))}
+                )
+                await response(scope, receive, send)
+                return
+
+        if api_key is not None:
+            usage_recorder.record_api_key(api_key.id)
+
+        await self.app(scope, receive, send)
+
+
+async def _bearer_user(headers: Dict[bytes, bytes]) -> Optional[Principal]:
+    """Usuário do token Bearer (via cache de principal), ou None"""
+    scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return await get_current_user(token)
+    except HTTPException:
+        return None
+
+
+async def _buffer_body(receive: Receive) -> Tuple[Optional[bytes], Callable[[], Awaitable[Message]]]:
+    """Ler o corpo (até MAX_INSPECTED_BODY) e devolver um receive que o repete para a rota"""
+    messages: List[Message] = []
+    body = b""
+    complete = False
+    while not complete and len(body) <= MAX_INSPECTED_BODY:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        body += message.get("body", b"")
+        complete = not message.get("more_body", False)
+
+    async def replay() -> Message:
+        if messages:
+            return messages.pop(0)
+        return await receive()
+
+    return (body if complete else None), replay
+
+
+def _agent_id(body: Optional[bytes]) -> Optional[int]:
+    if not body:
+        return None
+    try:
+        return int(json.loads(body)["agent_id"])
+    except (ValueError, TypeError, KeyError):
+        return None
@@ -1,6 +1,6 @@
 """Modelos do banco de dados"""
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Float, JSON
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Text, ForeignKey, Float, JSON, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -53,7 +53,7 @@ class Agent(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     description = Column(Text)
-    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"))
     
     # Configurações do agente
@@ -113,6 +113,13 @@ class Conversation(Base):
     # Relacionamentos
     agent = relationship("Agent", back_populates="conversations")
     messages = relationship("Message", back_populates="conversation")
+    
+    # Índices das consultas por agente (chat, analytics)
+    __table_args__ = (
+        Index("ix_conversations_agent_active", "agent_id", "is_active", "channel"),
+        Index("ix_conversations_agent_created", "agent_id", "created_at"),
+        Index("ix_conversations_agent_rating", "agent_id", "rating"),
+    )
 
 
 class Message(Base):
@@ -137,6 +144,37 @@ class Message(Base):
     
     # Relacionamentos
     conversation = relationship("Conversation", back_populates="messages")
+    
+    # Histórico em ordem (chat, janela de contexto) e métricas por papel
+    __table_args__ = (
+        Index("ix_messages_conversation_created", "conversation_id", "created_at", "id"),
+        Index("ix_messages_conversation_role", "conversation_id", "role", "latency"),
+    )
+
+
+class AgentDailyStats(Base):
+    """Métricas pré-agregadas por agente, dia (UTC) e canal (analytics)"""
+    __tablename__ = "agent_daily_stats"
+    
+    id = Column(Integer, primary_key=True)
+    agent_id = Column(Integer, ForeignKey("agents.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False)
+    channel = Column(String, nullable=False, default="webchat")
+    
+    # Conversas iniciadas no dia (encerramentos e avaliações contam no dia de início)
+    conversations = Column(Integer, nullable=False, default=0)
+    conversations_ended = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    rating_count = Column(Integer, nullable=False, default=0)
+    
+    # Mensagens criadas no dia (latência apenas das respostas do assistente)
+    messages = Column(Integer, nullable=False, default=0)
+    latency_sum = Column(Float, nullable=False, default=0.0)
+    latency_count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        UniqueConstraint("agent_id", "day", "channel", name="uq_agent_daily_stats"),
+    )
 
 
 class KnowledgeBase(Base):
@@ -152,6 +190,9 @@ class KnowledgeBase(Base):
     embedding_model = Column(String, default="text-embedding-ada-002")
     chunk_size = Column(Integer, default=1000)
     chunk_overlap = Column(Integer, default=200)
+    rerank_enabled = Column(Boolean, default=False)  # re-ranking com cross-encoder
+    rerank_top_n = Column(Integer, default=50)  # candidatos re-pontuados
+    rechunk = Column(JSON(none_as_null=True))  # novo chunking em andamento (ou falha)
     
     # Status
     is_active = Column(Boolean, default=True)
@@ -178,6 +219,7 @@ class Document(Base):
     file_path = Column(String, nullable=False)
     file_type = Column(String)  # pdf, docx, txt
     file_size = Column(Integer)  # em bytes
+    content_hash = Column(String, index=True)  # sha256 do conteúdo
     
     # Processamento
     is_processed = Column(Boolean, default=False)
@@ -192,6 +234,39 @@ class Document(Base):
     
     # Relacionamentos
     knowledge_base = relationship("KnowledgeBase", back_populates="documents")
+    chunks = relationship(
+        "Chunk",
+        back_populates="document",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by="Chunk.position"
+    )
+
+
+class Chunk(Base):
+    """Trecho de um documento (texto já extraído e dividido)"""
+    __tablename__ = "chunks"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    knowledge_base_id = Column(Integer, ForeignKey("knowledge_bases.id"), nullable=False, index=True)
+    
+    # Conteúdo
+    position = Column(Integer, nullable=False)  # ordem no documento
+    content = Column(Text, nullable=False)
+    content_hash = Column(String(64), index=True)  # sha256 do texto
+    page = Column(Integer)  # página de origem (PDF, a partir de 0)
+    start_offset = Column(Integer)  # posição do texto na página/arquivo
+    end_offset = Column(Integer)
+    
+    # Linha do embedding no índice vetorial da base
+    vector_row = Column(Integer)
+    is_active = Column(Boolean, default=True)  # False = gerado por re-chunking ainda não aplicado
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relacionamentos
+    document = relationship("Document", back_populates="chunks")
 
 
 class Workflow(Base):
@@ -125,6 +125,21 @@ class KnowledgeBaseCreate(BaseModel):
     description: Optional[str] = None
     chunk_size: int = Field(1000, ge=100, le=4000)
     chunk_overlap: int = Field(200, ge=0, le=1000)
+    rerank_enabled: bool = False
+    rerank_top_n: int = Field(50, ge=1, le=200)
+
+
+class KnowledgeBaseUpdate(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=100)
+    description: Optional[str] = None
+    is_active: Optional[bool] = None
+    rerank_enabled: Optional[bool] = None
+    rerank_top_n: Optional[int] = Field(None, ge=1, le=200)
+
+
+class KnowledgeBaseRechunk(BaseModel):
+    chunk_size: int = Field(..., ge=100, le=4000)
+    chunk_overlap: int = Field(..., ge=0, le=1000)
 
 
 class KnowledgeBaseResponse(BaseModel):
@@ -135,6 +150,10 @@ class KnowledgeBaseResponse(BaseModel):
     is_active: bool
     total_documents: int
     total_chunks: int
+    chunk_size: Optional[int] = 1000
+    chunk_overlap: Optional[int] = 200
+    rerank_enabled: Optional[bool] = False
+    rerank_top_n: Optional[int] = 50
     created_at: datetime
     
     class Config:
@@ -148,11 +167,39 @@ class DocumentUploadResponse(BaseModel):
     file_size: int
     is_processed: bool
     created_at: datetime
+    job_id: Optional[int] = None
+    status: Optional[str] = None
     
     class Config:
         from_attributes = True
 
 
+class RechunkStatusResponse(BaseModel):
+    knowledge_base_id: int
+    status: str  # running, completed, failed
+    chunk_size: int
+    chunk_overlap: int
+    error: Optional[str] = None
+    documents: int = 0
+    processed: int = 0
+    chunks: int = 0
+    embedded: int = 0  # chunks com texto novo (embedding gerado)
+    reused: int = 0  # chunks com vetor reaproveitado
+
+
+class DocumentStatusResponse(BaseModel):
+    job_id: int
+    document_id: int
+    filename: str
+    status: str  # queued, processing, completed, failed
+    stage: Optional[str] = None  # parsing, indexing
+    is_processed: bool
+    chunks_count: int
+    processing_error: Optional[str] = None
+    created_at: datetime
+    processed_at: Optional[datetime] = None
+
+
 # Workflow Schemas
 class WorkflowCreate(BaseModel):
     name: str
@@ -187,6 +234,7 @@ class AgentAnalytics(BaseModel):
     top_topics: List[Dict[str, Any]]
     avg_response_time: float
     success_rate: float
+    response_cache: Dict[str, Any] = {}
 
 
 class ConversationStats(BaseModel):
@@ -0,0 +1,153 @@
+"""Métricas de analytics pré-agregadas (tabela `agent_daily_stats`)
+
+Cada linha acumula, por agente, dia (UTC) e canal, as conversas iniciadas e
+encerradas, as avaliações, as mensagens e a soma das latências. Os
+incrementos de cada turno (mensagens, conversa nova, latência) ficam no
+buffer de escrita do chat (app/services/chat_writes.py) e são gravados em
+lote com as respostas, um upsert por linha; até o flush, as linhas ficam
+atrás do que já foi respondido. Encerramento e avaliação (`record`) entram
+na transação que encerra a conversa. Os dashboards leem O(dias × canais)
+linhas em vez de varrer `messages`.
+
+`rebuild_rollups` recalcula as linhas a partir de `conversations` e
+`messages` (carga inicial ou correção) - ver scripts/rebuild_analytics.py.
+"""
+
+from datetime import date, datetime
+from typing import Optional, Union
+
+from sqlalchemy import and_, case, delete, func, literal, select, union_all
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models import AgentDailyStats, Conversation, Message
+
+DEFAULT_CHANNEL = "webchat"
+
+COUNTERS = (
+    "conversations",
+    "conversations_ended",
+    "rating_sum",
+    "rating_count",
+    "messages",
+    "latency_sum",
+    "latency_count",
+)
+
+
+def increment_statement(
+    dialect: str,
+    agent_id: int,
+    channel: Optional[str],
+    day: Optional[date] = None,
+    **deltas: Union[int, float]
+):
+    """INSERT ... ON CONFLICT DO UPDATE somando `deltas` à linha do dia
+
+    Atômico no banco (SQLite e PostgreSQL): incrementos concorrentes na
+    mesma linha não se perdem.
+    """
+    unknown = set(deltas) - set(COUNTERS)
+    if unknown:
+        raise ValueError(f"Contadores desconhecidos: {', '.join(sorted(unknown))}")
+
+    insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+    stmt = insert(AgentDailyStats).values(
+        agent_id=agent_id,
+        day=day or datetime.utcnow().date(),
+        channel=channel or DEFAULT_CHANNEL,
+        **{name: deltas.get(name, 0) for name in COUNTERS}
+    )
+    columns = AgentDailyStats.__table__.c
+    return stmt.on_conflict_do_update(
+        index_elements=["agent_id", "day", "channel"],
+        set_={name: columns[name] + stmt.excluded[name] for name in deltas}
+    )
+
+
+async def record(
+    db: AsyncSession,
+    agent_id: int,
+    channel: Optional[str],
+    day: Optional[date] = None,
+    **deltas: Union[int, float]
+):
+    """Incrementar contadores na transação da sessão (o commit fica com o chamador)"""
+    if not any(deltas.values()):
+        return
+    await db.execute(increment_statement(db.get_bind().dialect.name, agent_id, channel, day, **deltas))
+
+
+def _source_rows(agent_id: Optional[int] = None):
+    """Contadores por (agente, dia, canal) calculados das tabelas brutas"""
+    channel = func.coalesce(Conversation.channel, DEFAULT_CHANNEL)
+    assistant_latency = case((Message.role == "assistant", Message.latency))
+
+    conversations = select(
+        Conversation.agent_id.label("agent_id"),
+        func.date(Conversation.created_at).label("day"),
+        channel.label("channel"),
+        func.count(Conversation.id).label("conversations"),
+        func.count(case((and_(Conversation.is_active == False, Conversation.ended_at.isnot(None)), 1))).label(
+            "conversations_ended"
+        ),
+        func.coalesce(func.sum(Conversation.rating), 0).label("rating_sum"),
+        func.count(Conversation.rating).label("rating_count"),
+        literal(0).label("messages"),
+        literal(0.0).label("latency_sum"),
+        literal(0).label("latency_count"),
+    ).group_by(Conversation.agent_id, func.date(Conversation.created_at), channel)
+
+    messages = select(
+        Conversation.agent_id,
+        func.date(Message.created_at),
+        channel,
+        literal(0),
+        literal(0),
+        literal(0),
+        literal(0),
+        func.count(Message.id),
+        func.coalesce(func.sum(assistant_latency), 0.0),
+        func.count(assistant_latency),
+    ).join(Conversation, Message.conversation_id == Conversation.id).group_by(
+        Conversation.agent_id, func.date(Message.created_at), channel
+    )
+
+    if agent_id is not None:
+        conversations = conversations.where(Conversation.agent_id == agent_id)
+        messages = messages.where(Conversation.agent_id == agent_id)
+
+    rows = union_all(conversations, messages).subquery()
+    return select(
+        rows.c.agent_id,
+        rows.c.day,
+        rows.c.channel,
+        *(func.sum(rows.c[name]) for name in COUNTERS)
+    ).group_by(rows.c.agent_id, rows.c.day, rows.c.channel)
+
+
+def rebuild_rollups(db: Session, agent_id: Optional[int] = None) -> int:
+    """Recalcular as métricas (de um agente ou de todos) a partir das tabelas brutas
+
+    Substitui as linhas em uma transação. Mensagens gravadas durante o
+    recálculo podem ficar de fora; rode com pouco tráfego.
+    """
+    stale = delete(AgentDailyStats)
+    if agent_id is not None:
+        stale = stale.where(AgentDailyStats.agent_id == agent_id)
+    db.execute(stale)
+
+    db.execute(
+        AgentDailyStats.__table__.insert().from_select(
+            ["agent_id", "day", "channel", *COUNTERS],
+            _source_rows(agent_id)
+        )
+    )
+    db.commit()
+
+    count = select(func.count(AgentDailyStats.id))
+    if agent_id is not None:
+        count = count.where(AgentDailyStats.agent_id == agent_id)
+    return db.scalar(count)
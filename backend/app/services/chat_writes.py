@@ -0,0 +1,227 @@
+"""Gravação em lote (write-behind) das respostas do chat
+
+O início do turno grava conversa e mensagem do usuário em uma transação. A
+resposta do assistente e todos os incrementos de `agent_daily_stats` do
+turno (mensagens, conversa nova) entram em um buffer em memória, gravado a
+cada CHAT_WRITE_FLUSH_INTERVAL segundos (ou ao juntar CHAT_WRITE_BATCH_SIZE
+mensagens) em uma única transação: INSERT em lote das mensagens e um upsert
+por linha de rollup - a linha (agente, dia, canal) não é travada na
+requisição. `Agent.total_messages`
+vai para os contadores em memória (app/services/counters.py) - a linha do
+agente deixa de ser lida e travada a cada turno.
+
+Leitura das próprias escritas: antes de um novo turno ou da leitura do
+histórico de uma conversa com respostas pendentes, `sync_conversation`
+força o flush - assim os ids das mensagens seguem a ordem da conversa.
+
+No encerramento da aplicação o buffer é gravado; uma queda do processo
+perde no máximo as respostas do último intervalo. Com CHAT_WRITE_BEHIND
+desativado, cada resposta é gravada na própria requisição.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from app.config import settings
+from app.database import async_engine
+from app.models import Message
+from app.services.analytics_rollup import DEFAULT_CHANNEL, increment_statement
+from app.services.counters import counters
+
+logger = logging.getLogger(__name__)
+
+RollupKey = Tuple[int, date, str]
+
+
+class ChatWriteBuffer:
+    """Buffer de respostas do assistente e incrementos, gravado em lote"""
+
+    def __init__(self, interval: float, batch_size: int, max_pending: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.messages: List[Dict[str, Any]] = []
+        self.rollups: Dict[RollupKey, Dict[str, float]] = {}
+        self.conversations: Set[int] = set()  # conversas com respostas no buffer
+        self.flushing: Set[int] = set()  # conversas do lote sendo gravado
+        self.lock = asyncio.Lock()
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+        self.counters = {"messages": 0, "flushes": 0, "errors": 0, "dropped": 0}
+
+    async def start(self):
+        if self.task is None and settings.CHAT_WRITE_BEHIND:
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        await self.flush()
+
+    async def add_turn(self, agent_id: int, channel: Optional[str], new_conversation: bool):
+        """Registrar os incrementos do início do turno (mensagem do usuário e conversa nova)"""
+        deltas = self._rollup(agent_id, datetime.utcnow().date(), channel)
+        deltas["messages"] += 1
+        if new_conversation:
+            deltas["conversations"] += 1
+
+        if self.task is None:
+            await self.flush()
+
+    async def add_reply(
+        self,
+        conversation_id: int,
+        agent_id: int,
+        channel: Optional[str],
+        content: str,
+        model: Optional[str],
+        latency: float,
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        """Registrar a resposta do assistente e os contadores do turno"""
+        created_at = datetime.utcnow()
+        self.messages.append({
+            "conversation_id": conversation_id,
+            "role": "assistant",
+            "content": content,
+            "model": model,
+            "tokens_used": 0,  # Calcular depois
+            "cost": 0.0,
+            "latency": latency,
+            "metadata": metadata or {},
+            "created_at": created_at
+        })
+        self.conversations.add(conversation_id)
+
+        deltas = self._rollup(agent_id, created_at.date(), channel)
+        deltas["messages"] += 1
+        deltas["latency_sum"] += latency
+        deltas["latency_count"] += 1
+        counters.incr("agent_messages", agent_id, 2)  # user + assistant
+
+        if self.task is None or len(self.messages) >= self.max_pending:
+            # Sem worker (desativado) ou buffer cheio: gravar na requisição
+            await self.flush()
+        elif len(self.messages) >= self.batch_size:
+            self.wakeup.set()
+
+    def has_pending(self, conversation_id: int) -> bool:
+        return conversation_id in self.conversations or conversation_id in self.flushing
+
+    async def sync_conversation(self, conversation_id: int):
+        """Garantir que as respostas pendentes da conversa estão no banco
+
+        O flush usa uma conexão do pool: quem chama não deve estar segurando
+        outra (ex.: sessão com transação aberta), ou requisições esperando o
+        flush podem esgotar o pool.
+        """
+        if self.has_pending(conversation_id):
+            await self.flush(conversation_id)
+
+    async def flush(self, conversation_id: Optional[int] = None) -> int:
+        """Gravar o buffer em uma transação; retorna o número de mensagens
+        
+        Com `conversation_id`, não faz nada se um flush concorrente já gravou
+        as respostas daquela conversa.
+        """
+        async with self.lock:
+            if conversation_id is not None and conversation_id not in self.conversations:
+                return 0
+            if not self.messages and not self.rollups:
+                return 0
+
+            messages, self.messages = self.messages, []
+            rollups, self.rollups = self.rollups, {}
+            self.flushing, self.conversations = self.conversations, set()
+            try:
+                async with async_engine.begin() as conn:
+                    await self._write_rollups(conn, rollups)
+                    if messages:
+                        await conn.execute(Message.__table__.insert(), messages)
+            except IntegrityError:
+                # Ex.: conversa removida durante o turno; gravar item a item
+                messages = await self._write_separately(messages, rollups)
+            except Exception as e:
+                self.counters["errors"] += 1
+                self._requeue(messages, rollups)
+                logger.error(f"Erro ao gravar respostas do chat ({len(messages)} no buffer): {e}")
+                return 0
+            finally:
+                self.flushing = set()
+
+            self.counters["messages"] += len(messages)
+            self.counters["flushes"] += 1
+            return len(messages)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **self.counters,
+            "pending": len(self.messages),
+            "enabled": self.task is not None
+        }
+
+    def _rollup(self, agent_id: int, day: date, channel: Optional[str]) -> Dict[str, float]:
+        return self.rollups.setdefault((agent_id, day, channel or DEFAULT_CHANNEL), defaultdict(int))
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+    async def _write_rollups(self, conn, rollups: Dict[RollupKey, Dict[str, float]]):
+        dialect = conn.dialect.name
+        for (agent_id, day, channel), deltas in rollups.items():
+            await conn.execute(increment_statement(dialect, agent_id, channel, day, **deltas))
+
+    async def _write_separately(self, messages, rollups) -> List[Dict[str, Any]]:
+        """Rollups em uma transação e cada mensagem na sua; retorna as gravadas"""
+        try:
+            async with async_engine.begin() as conn:
+                await self._write_rollups(conn, rollups)
+        except Exception as e:
+            self.counters["errors"] += 1
+            self._requeue([], rollups)
+            logger.error(f"Erro ao gravar contadores do chat: {e}")
+
+        written = []
+        for message in messages:
+            try:
+                async with async_engine.begin() as conn:
+                    await conn.execute(Message.__table__.insert(), [message])
+                written.append(message)
+            except IntegrityError as e:
+                self.counters["dropped"] += 1
+                logger.warning(f"Resposta descartada (conversa {message['conversation_id']}): {e}")
+            except Exception as e:
+                self.counters["errors"] += 1
+                self._requeue([message], {})
+                logger.error(f"Erro ao gravar resposta do chat: {e}")
+        return written
+
+    def _requeue(self, messages, rollups):
+        """Devolver um lote que falhou ao buffer (na frente, preservando a ordem)"""
+        self.messages[:0] = messages
+        self.conversations.update(message["conversation_id"] for message in messages)
+        for key, deltas in rollups.items():
+            pending = self.rollups.setdefault(key, defaultdict(int))
+            for name, value in deltas.items():
+                pending[name] += value
+
+
+chat_writes = ChatWriteBuffer(
+    interval=settings.CHAT_WRITE_FLUSH_INTERVAL,
+    batch_size=settings.CHAT_WRITE_BATCH_SIZE,
+    max_pending=settings.CHAT_WRITE_MAX_PENDING
+)
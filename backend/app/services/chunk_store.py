@@ -0,0 +1,179 @@
+"""Chunks persistidos (tabela `chunks`)
+
+Na ingestão os chunks de cada documento são gravados em lote, com texto,
+página, offsets, sha256 e a linha do embedding no índice vetorial da base.
+Reindexar uma base ou indexar outra cópia do mesmo arquivo lê estas linhas
+em vez de reprocessar o arquivo original.
+
+Um re-chunking grava os novos chunks inativos (`is_active=False`); eles
+substituem os atuais na mesma transação que aplica o novo chunking da base.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.models import Chunk, Document, KnowledgeBase
+from app.services.rag import chunk_hash
+
+# Chunks lidos por lote
+READ_BATCH = 256
+
+
+def save_chunks(
+    db: Session,
+    document: Document,
+    chunks: List[Dict[str, Any]],
+    vector_rows: List[int],
+    start_position: int = 0,
+    is_active: bool = True
+):
+    """Inserir em lote os chunks de um documento (a partir de `start_position`)"""
+    if not chunks:
+        return
+
+    rows = []
+    for position, (chunk, vector_row) in enumerate(zip(chunks, vector_rows), start=start_position):
+        metadata = chunk.get("metadata", {})
+        start_offset = metadata.get("start_index")
+        rows.append({
+            "document_id": document.id,
+            "knowledge_base_id": document.knowledge_base_id,
+            "position": position,
+            "content": chunk["content"],
+            "content_hash": chunk.get("hash") or chunk_hash(chunk["content"]),
+            "page": metadata.get("page"),
+            "start_offset": start_offset,
+            "end_offset": start_offset + len(chunk["content"]) if start_offset is not None else None,
+            "vector_row": vector_row,
+            "is_active": is_active
+        })
+
+    db.execute(insert(Chunk), rows)
+    db.commit()
+
+
+def set_vector_rows(db: Session, chunk_ids: List[int], vector_rows: List[int]):
+    """Atualizar a linha do índice vetorial de chunks já gravados (reindexação)"""
+    if not chunk_ids:
+        return
+    db.execute(update(Chunk), [
+        {"id": chunk_id, "vector_row": vector_row}
+        for chunk_id, vector_row in zip(chunk_ids, vector_rows)
+    ])
+    db.commit()
+
+
+def copy_chunks(db: Session, source_document_id: int, document: Document, row_map: Dict[int, int]):
+    """Copiar os chunks de um documento idêntico, com as linhas do novo índice"""
+    position = 0
+    for batch in iter_document_chunks(db, source_document_id, document.file_path):
+        save_chunks(
+            db, document, batch,
+            [row_map.get(chunk["vector_row"]) for chunk in batch],
+            start_position=position
+        )
+        position += len(batch)
+
+
+def delete_chunks(db: Session, document_id: int) -> int:
+    """Remover os chunks de um documento
+
+    A FK tem ON DELETE CASCADE, mas o SQLite só a aplica com foreign_keys
+    ligado; a remoção explícita funciona em qualquer banco.
+    """
+    removed = db.query(Chunk).filter(Chunk.document_id == document_id).delete(
+        synchronize_session=False
+    )
+    db.commit()
+    return removed
+
+
+def has_chunks(db: Session, document_id: int) -> bool:
+    return db.query(Chunk.id).filter(
+        Chunk.document_id == document_id,
+        Chunk.is_active == True
+    ).first() is not None
+
+
+def discard_staged_chunks(db: Session, kb_id: int) -> int:
+    """Remover chunks de um re-chunking não aplicado"""
+    removed = db.query(Chunk).filter(
+        Chunk.knowledge_base_id == kb_id,
+        Chunk.is_active == False
+    ).delete(synchronize_session=False)
+    db.commit()
+    return removed
+
+
+def activate_staged_chunks(db: Session, kb_id: int):
+    """Trocar os chunks atuais da base pelos do re-chunking (sem commit)"""
+    db.query(Chunk).filter(
+        Chunk.knowledge_base_id == kb_id,
+        Chunk.is_active == True
+    ).delete(synchronize_session=False)
+    db.query(Chunk).filter(
+        Chunk.knowledge_base_id == kb_id,
+        Chunk.is_active == False
+    ).update({"is_active": True}, synchronize_session=False)
+
+
+def find_chunk_source(db: Session, document: Document, kb: KnowledgeBase) -> Optional[int]:
+    """Documento cujos chunks servem para este (ele mesmo ou outro com o mesmo conteúdo)"""
+    if has_chunks(db, document.id):
+        return document.id
+    if not document.content_hash:
+        return None
+
+    source = db.query(Document.id).join(KnowledgeBase).filter(
+        Document.content_hash == document.content_hash,
+        Document.id != document.id,
+        Document.is_processed == True,
+        KnowledgeBase.chunk_size == kb.chunk_size,
+        KnowledgeBase.chunk_overlap == kb.chunk_overlap,
+        Document.chunks.any(Chunk.is_active == True)
+    ).first()
+    return source[0] if source else None
+
+
+def iter_document_chunks(
+    db: Session,
+    document_id: int,
+    source: str,
+    batch_size: int = READ_BATCH
+) -> Iterator[List[Dict[str, Any]]]:
+    """Lotes de chunks do documento, na ordem, no formato do parsing
+
+    `source` é o caminho registrado nos metadados de cada chunk.
+    """
+    last_position = -1
+    while True:
+        batch = db.query(Chunk).filter(
+            Chunk.document_id == document_id,
+            Chunk.is_active == True,
+            Chunk.position > last_position
+        ).order_by(Chunk.position).limit(batch_size).all()
+        if not batch:
+            return
+
+        last_position = batch[-1].position
+        yield [
+            {
+                "id": chunk.id,
+                "content": chunk.content,
+                "hash": chunk.content_hash,
+                "metadata": _metadata(chunk, source),
+                "vector_row": chunk.vector_row
+            }
+            for chunk in batch
+        ]
+
+
+def _metadata(chunk: Chunk, source: str) -> Dict[str, Any]:
+    metadata: Dict[str, Any] = {"source": source}
+    if chunk.page is not None:
+        metadata["page"] = chunk.page
+    if chunk.start_offset is not None:
+        metadata["start_index"] = chunk.start_offset
+    return metadata
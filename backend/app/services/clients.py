@@ -0,0 +1,104 @@
+"""Registro de clientes HTTP/SDK compartilhados pelo processo
+
+Os clientes dos provedores de LLM são criados uma única vez (no lifespan da
+aplicação) e reutilizados por todas as requisições, preservando o pool de
+conexões keep-alive e as sessões TLS entre chamadas.
+"""
+
+import logging
+from typing import Optional
+
+import httpx
+import openai
+import anthropic
+import google.generativeai as genai
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    """HTTP/2 no httpx depende do pacote opcional `h2`"""
+    if not settings.LLM_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("Pacote h2 não instalado, usando HTTP/1.1 para os provedores de LLM")
+        return False
+
+
+def _build_http_client(http2: bool) -> httpx.AsyncClient:
+    """Criar cliente httpx com pool de conexões configurável"""
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(settings.LLM_TIMEOUT, connect=10.0)
+    )
+
+
+class ProviderClients:
+    """Clientes dos provedores, um pool de conexões por provedor"""
+
+    def __init__(self):
+        self.openai: Optional[openai.AsyncOpenAI] = None
+        self.anthropic: Optional[anthropic.AsyncAnthropic] = None
+        self.http: Optional[httpx.AsyncClient] = None  # chamadas externas (ex: WhatsApp)
+        self.started = False
+
+    def start(self):
+        """Criar os clientes (idempotente)"""
+        if self.started:
+            return
+
+        http2 = _http2_available()
+
+        if settings.OPENAI_API_KEY:
+            self.openai = openai.AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL or None,
+                http_client=_build_http_client(http2)
+            )
+
+        if settings.ANTHROPIC_API_KEY:
+            self.anthropic = anthropic.AsyncAnthropic(
+                api_key=settings.ANTHROPIC_API_KEY,
+                http_client=_build_http_client(http2)
+            )
+
+        if settings.GOOGLE_API_KEY:
+            genai.configure(api_key=settings.GOOGLE_API_KEY)
+
+        self.http = _build_http_client(http2)
+        self.started = True
+        logger.info("Clientes dos provedores de LLM inicializados")
+
+    async def close(self):
+        """Fechar pools de conexões"""
+        if self.openai:
+            await self.openai.close()
+        if self.anthropic:
+            await self.anthropic.close()
+        if self.http:
+            await self.http.aclose()
+
+        self.openai = None
+        self.anthropic = None
+        self.http = None
+        self.started = False
+
+
+provider_clients = ProviderClients()
+
+
+def get_provider_clients() -> ProviderClients:
+    """Obter o registro de clientes, inicializando sob demanda fora do lifespan"""
+    if not provider_clients.started:
+        provider_clients.start()
+    return provider_clients
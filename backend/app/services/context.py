@@ -0,0 +1,224 @@
+"""Gerenciamento da janela de contexto das conversas
+
+Monta o histórico enviado ao LLM respeitando um orçamento de tokens por
+agente: mantém uma janela deslizante das mensagens mais recentes e um resumo
+acumulado das mensagens que já saíram da janela. Apenas as linhas necessárias
+são lidas do banco.
+
+A política é configurada em `Agent.guardrails["context"]`, por exemplo:
+
+    {"context": {"max_tokens": 6000, "recent_messages": 20,
+                 "summarize": true, "summary_every": 10, "summary_tokens": 300}}
+"""
+
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Agent, Conversation, Message
+
+# Imports condicionais (tokenizer exato quando disponível)
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Janela de contexto (tokens) por família de modelo - prefixo mais longo vence
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4-1106": 128000,
+    "gpt-4-0125": 128000,
+    "gpt-4o": 128000,
+    "gpt-3.5-turbo": 16385,
+    "claude": 200000,
+    "gemini": 30720,
+}
+
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Tokens extras por mensagem (papel e separadores no formato de chat)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_SYSTEM_PROMPT = (
+    "Você resume conversas entre um usuário e um assistente. Atualize o resumo "
+    "existente com as novas mensagens, preservando fatos, nomes, números, "
+    "decisões e pedidos pendentes. Responda apenas com o resumo, em texto corrido."
+)
+
+
+@lru_cache(maxsize=32)
+def _get_encoding(model: str):
+    """Obter tokenizer do modelo (None se indisponível)"""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception as e:
+        logger.warning(f"Tokenizer indisponível para {model}: {e}")
+        return None
+    try:
+        # Modelos não-OpenAI: cl100k_base é uma boa aproximação
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Tokenizer cl100k_base indisponível: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    """Contar tokens de um texto"""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        # Aproximação: ~4 caracteres por token
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(message: Dict[str, str], model: str = "gpt-4") -> int:
+    """Contar tokens de uma mensagem de chat"""
+    return count_tokens(message["content"], model) + MESSAGE_OVERHEAD_TOKENS
+
+
+def get_context_window(model: str) -> int:
+    """Tamanho da janela de contexto do modelo"""
+    matches = [prefix for prefix in MODEL_CONTEXT_WINDOWS if model.startswith(prefix)]
+    if not matches:
+        return DEFAULT_CONTEXT_WINDOW
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
+
+
+@dataclass
+class ContextPolicy:
+    """Política de truncamento do histórico de um agente"""
+    max_tokens: int
+    recent_messages: int = 20
+    summarize: bool = True
+    summary_every: int = 10
+    summary_tokens: int = 300
+
+    @classmethod
+    def from_agent(cls, agent: Agent) -> "ContextPolicy":
+        config = (agent.guardrails or {}).get("context", {})
+
+        # Orçamento padrão: janela do modelo menos a reserva para a resposta
+        model_budget = get_context_window(agent.model) - (agent.max_tokens or 1000)
+        max_tokens = min(config.get("max_tokens", model_budget), model_budget)
+
+        return cls(
+            max_tokens=max(max_tokens, 256),
+            recent_messages=max(int(config.get("recent_messages", 20)), 1),
+            summarize=bool(config.get("summarize", True)),
+            summary_every=max(int(config.get("summary_every", 10)), 1),
+            summary_tokens=int(config.get("summary_tokens", 300))
+        )
+
+
+class ContextManager:
+    """Monta o histórico de uma conversa dentro do orçamento de tokens"""
+
+    def __init__(self, db: AsyncSession, agent: Agent, conversation: Conversation):
+        self.db = db
+        self.agent = agent
+        self.conversation = conversation
+        self.policy = ContextPolicy.from_agent(agent)
+
+    def _summary_state(self) -> Tuple[str, int]:
+        metadata = self.conversation.metadata or {}
+        return metadata.get("context_summary", ""), metadata.get("summary_message_id", 0)
+
+    async def _load_recent(self, summary_message_id: int) -> List[Message]:
+        """Ler apenas a janela recente (mais o lote ainda não resumido)"""
+        limit = self.policy.recent_messages
+        if self.policy.summarize:
+            # +1: cada turno adiciona até 2 mensagens, o lote pode passar de summary_every
+            limit += self.policy.summary_every + 1
+
+        result = await self.db.scalars(
+            select(Message).where(
+                Message.conversation_id == self.conversation.id,
+                Message.id > summary_message_id
+            ).order_by(Message.created_at.desc(), Message.id.desc()).limit(limit)
+        )
+
+        rows = list(result)
+        rows.reverse()
+        return rows
+
+    async def _update_summary(self, llm_service, summary: str, messages: List[Message]) -> str:
+        """Incorporar mensagens que saíram da janela ao resumo acumulado"""
+        transcript = "\n".join(f"{msg.role}: {msg.content}" for msg in messages)
+        prompt = f"Resumo atual:\n{summary or '(vazio)'}\n\nNovas mensagens:\n{transcript}"
+
+        new_summary = await llm_service.generate(
+            messages=[{"role": "user", "content": prompt}],
+            system_prompt=SUMMARY_SYSTEM_PROMPT,
+            temperature=0.2,
+            max_tokens=self.policy.summary_tokens
+        )
+
+        # LLMService devolve mensagens de erro como texto; não persistir
+        if not new_summary or new_summary.startswith(("⚠️", "Erro ao gerar resposta")):
+            return summary
+
+        metadata = dict(self.conversation.metadata or {})
+        metadata["context_summary"] = new_summary
+        metadata["summary_message_id"] = messages[-1].id
+        self.conversation.metadata = metadata
+        await self.db.commit()
+        return new_summary
+
+    async def build(
+        self,
+        llm_service=None,
+        system_prompt: Optional[str] = None,
+        reserved_tokens: int = 0
+    ) -> Tuple[List[Dict[str, str]], Optional[str]]:
+        """Retorna (histórico, system prompt com resumo) dentro do orçamento
+        
+        `reserved_tokens` fica fora do orçamento do histórico (ex: contexto
+        RAG que ainda será adicionado ao system prompt).
+        """
+        model = self.agent.model
+        summary, summary_message_id = self._summary_state()
+        rows = await self._load_recent(summary_message_id)
+
+        # Mensagens além da janela recente ainda não resumidas
+        overflow = rows[:-self.policy.recent_messages] if len(rows) > self.policy.recent_messages else []
+        if (
+            self.policy.summarize
+            and llm_service is not None
+            and len(overflow) >= self.policy.summary_every
+        ):
+            summary = await self._update_summary(llm_service, summary, overflow)
+            rows = rows[len(overflow):]
+
+        if summary:
+            summary_block = f"Resumo da conversa até aqui:\n{summary}"
+            system_prompt = f"{system_prompt}\n\n{summary_block}" if system_prompt else summary_block
+
+        budget = self.policy.max_tokens - count_tokens(system_prompt or "", model) - reserved_tokens
+
+        # Preencher do mais recente para o mais antigo até esgotar o orçamento
+        history: List[Dict[str, str]] = []
+        for msg in reversed(rows):
+            message = {"role": msg.role, "content": msg.content}
+            tokens = count_message_tokens(message, model)
+            if history and tokens > budget:
+                break
+            history.append(message)
+            budget -= tokens
+
+        history.reverse()
+        return history, system_prompt
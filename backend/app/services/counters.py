@@ -0,0 +1,125 @@
+"""Contadores atômicos acumulados em memória (por worker)
+
+`Agent.total_messages`, `Agent.total_conversations` e `Skill.usage_count`
+não são mais incrementados na requisição (leitura + escrita da linha, com
+perda de incrementos concorrentes e lock na linha quente). Cada worker
+acumula os deltas no seu próprio shard em memória e os grava a cada
+COUNTER_FLUSH_INTERVAL segundos, em uma transação, com
+UPDATE ... SET x = coalesce(x, 0) + n - incrementos de workers diferentes
+se somam no banco sem conflito.
+
+Leitores combinam o valor gravado com os deltas ainda pendentes deste
+worker (`current`), incluindo o lote que está sendo gravado. Um lote que
+falha volta ao shard e é regravado no flush seguinte; o shard é gravado no
+encerramento da aplicação.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+from sqlalchemy import bindparam, func
+
+from app.config import settings
+from app.database import async_engine
+from app.models import Agent, Skill
+
+logger = logging.getLogger(__name__)
+
+# Nome do contador -> (tabela, coluna, coluna de busca)
+COUNTERS = {
+    "agent_messages": (Agent.__table__, "total_messages", "id"),
+    "agent_conversations": (Agent.__table__, "total_conversations", "id"),
+    "skill_uses": (Skill.__table__, "usage_count", "name"),
+}
+
+CounterKey = Tuple[str, Hashable]
+
+
+class CounterShard:
+    """Deltas pendentes deste worker, gravados em lote"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.pending: Dict[CounterKey, int] = defaultdict(int)
+        self.flushing: Dict[CounterKey, int] = {}
+        self.lock = asyncio.Lock()
+        self.task: Optional[asyncio.Task] = None
+        self.counters = {"increments": 0, "flushes": 0, "rows_updated": 0, "errors": 0}
+
+    async def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        await self.flush()
+
+    def incr(self, name: str, key: Hashable, delta: int = 1):
+        if name not in COUNTERS:
+            raise ValueError(f"Contador desconhecido: {name}")
+        if delta:
+            self.pending[(name, key)] += delta
+            self.counters["increments"] += 1
+
+    def incr_many(self, name: str, keys: Iterable[Hashable], delta: int = 1):
+        for key in keys:
+            self.incr(name, key, delta)
+
+    def current(self, name: str, key: Hashable, persisted: Optional[int]) -> int:
+        """Valor gravado somado aos deltas deste worker ainda não gravados"""
+        return (persisted or 0) + self.pending.get((name, key), 0) + self.flushing.get((name, key), 0)
+
+    async def flush(self) -> int:
+        """Gravar os deltas acumulados; retorna o número de linhas atualizadas"""
+        async with self.lock:
+            if not self.pending:
+                return 0
+
+            self.flushing, self.pending = self.pending, defaultdict(int)
+            try:
+                async with async_engine.begin() as conn:
+                    for name, rows in self._group(self.flushing).items():
+                        table, column, lookup = COUNTERS[name]
+                        await conn.execute(
+                            table.update().where(table.c[lookup] == bindparam("counter_key")).values({
+                                column: func.coalesce(table.c[column], 0) + bindparam("delta")
+                            }),
+                            rows
+                        )
+            except Exception as e:
+                # Devolver ao shard para a próxima rodada
+                for counter_key, delta in self.flushing.items():
+                    self.pending[counter_key] += delta
+                self.counters["errors"] += 1
+                logger.error(f"Erro ao gravar contadores ({len(self.flushing)} pendentes): {e}")
+                return 0
+            finally:
+                batch, self.flushing = self.flushing, {}
+
+            self.counters["flushes"] += 1
+            self.counters["rows_updated"] += len(batch)
+            return len(batch)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, "pending": len(self.pending)}
+
+    @staticmethod
+    def _group(deltas: Dict[CounterKey, int]) -> Dict[str, list]:
+        rows = defaultdict(list)
+        for (name, key), delta in deltas.items():
+            if delta:
+                rows[name].append({"counter_key": key, "delta": delta})
+        return rows
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+
+counters = CounterShard(interval=settings.COUNTER_FLUSH_INTERVAL)
@@ -0,0 +1,244 @@
+"""Cache persistente de embeddings (SQLite em disco local)
+
+Chave: (modelo de embeddings, sha256 do texto). O modelo é o namespace —
+o mesmo texto embedado por modelos diferentes gera entradas diferentes.
+Re-ingestão, re-chunking e consultas repetidas não voltam ao provedor.
+
+Embeddings de consultas (texto livre dos usuários) ficam em uma tabela à
+parte, limitada a EMBEDDING_CACHE_MAX_QUERIES entradas por modelo: ao passar
+do limite, as mais antigas são removidas. Os vetores de documentos não
+expiram.
+
+O total de entradas por modelo fica em `embedding_counts` /
+`query_embedding_counts`, mantido por triggers na inserção e remoção (vale
+para todos os processos que usam o arquivo); as estatísticas e a poda não
+percorrem as tabelas de vetores.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable
+
+import numpy as np
+
+from app.config import settings
+
+# Limite de parâmetros por consulta (SQLITE_MAX_VARIABLE_NUMBER antigo = 999)
+LOOKUP_BATCH = 500
+
+# Tabela de vetores -> tabela de contagem por modelo
+DOCUMENTS = "embeddings"
+QUERIES = "query_embeddings"
+COUNTS = {DOCUMENTS: "embedding_counts", QUERIES: "query_embedding_counts"}
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Vetores por (modelo, hash do texto) com métricas de acerto em memória"""
+
+    def __init__(self, path: str, max_queries: int):
+        self.path = path
+        self.max_queries = max_queries
+        self._conn = None
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " hash TEXT NOT NULL,"
+                " dim INTEGER NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, hash)"
+                ") WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                " model TEXT NOT NULL,"
+                " hash TEXT NOT NULL,"
+                " dim INTEGER NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (model, hash)"
+                ") WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_query_embeddings_created_at "
+                "ON query_embeddings (model, created_at)"
+            )
+            for table in COUNTS:
+                self._create_counts(conn, table)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _create_counts(conn: sqlite3.Connection, table: str):
+        """Contagem por modelo mantida por triggers (carga inicial em caches antigos)"""
+        counts = COUNTS[table]
+        with conn:
+            created = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (counts,)
+            ).fetchone() is None
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {counts} ("
+                " model TEXT PRIMARY KEY,"
+                " entries INTEGER NOT NULL"
+                ")"
+            )
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_count_insert AFTER INSERT ON {table} BEGIN"
+                f" INSERT OR IGNORE INTO {counts} (model, entries) VALUES (NEW.model, 0);"
+                f" UPDATE {counts} SET entries = entries + 1 WHERE model = NEW.model;"
+                " END"
+            )
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_count_delete AFTER DELETE ON {table} BEGIN"
+                f" UPDATE {counts} SET entries = entries - 1 WHERE model = OLD.model;"
+                " END"
+            )
+            if created:
+                conn.execute(
+                    f"INSERT INTO {counts} (model, entries) "
+                    f"SELECT model, COUNT(*) FROM {table} GROUP BY model"
+                )
+
+    def get_many(self, model: str, hashes: Iterable[str], queries: bool = False) -> Dict[str, np.ndarray]:
+        """Vetores já conhecidos para os hashes informados (de documentos ou de consultas)"""
+        table = QUERIES if queries else DOCUMENTS
+        unique = list(dict.fromkeys(hashes))
+        found: Dict[str, np.ndarray] = {}
+
+        with self._lock:
+            conn = self._connect()
+            for start in range(0, len(unique), LOOKUP_BATCH):
+                batch = unique[start:start + LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT hash, dim, vector FROM {table} "
+                    f"WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *batch]
+                )
+                for hash_, dim, blob in rows:
+                    found[hash_] = np.frombuffer(blob, dtype=np.float32, count=dim)
+
+        return found
+
+    def put_many(self, model: str, items: Dict[str, np.ndarray]):
+        if not items:
+            return
+        rows = [
+            (model, hash_, int(vector.shape[0]), np.asarray(vector, dtype=np.float32).tobytes())
+            for hash_, vector in items.items()
+        ]
+        with self._lock:
+            conn = self._connect()
+            # Upsert (e não INSERT OR REPLACE): a substituição não dispara os triggers de contagem
+            conn.executemany(
+                "INSERT INTO embeddings (model, hash, dim, vector) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (model, hash) DO UPDATE SET dim = excluded.dim, vector = excluded.vector",
+                rows
+            )
+            conn.commit()
+
+    def put_queries(self, model: str, items: Dict[str, np.ndarray]):
+        """Gravar embeddings de consultas, removendo os mais antigos acima do limite"""
+        if not items or self.max_queries <= 0:
+            return
+        now = time.time()
+        rows = [
+            (model, hash_, int(vector.shape[0]), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for hash_, vector in items.items()
+        ]
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO query_embeddings (model, hash, dim, vector, created_at) "
+                    "VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (model, hash) DO UPDATE SET "
+                    "dim = excluded.dim, vector = excluded.vector, created_at = excluded.created_at",
+                    rows
+                )
+                entries = conn.execute(
+                    "SELECT entries FROM query_embedding_counts WHERE model = ?", (model,)
+                ).fetchone()[0]
+                excess = entries - self.max_queries
+                if excess > 0:
+                    conn.execute(
+                        "DELETE FROM query_embeddings WHERE model = ? AND hash IN ("
+                        " SELECT hash FROM query_embeddings WHERE model = ?"
+                        " ORDER BY created_at LIMIT ?"
+                        ")",
+                        (model, model, excess)
+                    )
+
+    def record(self, model: str, hits: int, misses: int):
+        with self._lock:
+            stats = self._stats.setdefault(model, {"hits": 0, "misses": 0})
+            stats["hits"] += hits
+            stats["misses"] += misses
+
+    def clear(self, model: str = None):
+        with self._lock:
+            conn = self._connect()
+            for table in COUNTS:
+                if model:
+                    conn.execute(f"DELETE FROM {table} WHERE model = ?", (model,))
+                else:
+                    conn.execute(f"DELETE FROM {table}")
+            conn.commit()
+
+    def stats(self) -> Dict[str, object]:
+        """Taxa de acerto (desde o início do processo) e entradas por modelo"""
+        with self._lock:
+            conn = self._connect()
+            entries = dict(conn.execute(
+                "SELECT model, entries FROM embedding_counts WHERE entries > 0"
+            ).fetchall())
+            queries = dict(conn.execute(
+                "SELECT model, entries FROM query_embedding_counts WHERE entries > 0"
+            ).fetchall())
+            counters = {model: dict(values) for model, values in self._stats.items()}
+
+        models = {}
+        for model in set(entries) | set(queries) | set(counters):
+            hits = counters.get(model, {}).get("hits", 0)
+            misses = counters.get(model, {}).get("misses", 0)
+            models[model] = {
+                "entries": entries.get(model, 0),
+                "queries": queries.get(model, 0),
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None
+            }
+
+        hits = sum(m["hits"] for m in models.values())
+        misses = sum(m["misses"] for m in models.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+            "models": models
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+embedding_cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_QUERIES)
@@ -0,0 +1,151 @@
+"""Agendador de requisições de embeddings
+
+Divide os textos em lotes limitados por quantidade e por tokens, envia os
+lotes em paralelo (concorrência limitada) respeitando um orçamento de tokens
+por minuto e refaz as requisições rejeitadas por rate limit (429) com
+backoff exponencial com jitter. O resultado mantém a ordem dos textos.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.context import count_tokens
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE = 0.5  # segundos
+BACKOFF_MAX = 30.0
+
+
+class TokenBudget:
+    """Balde de tokens: até `tokens_per_minute` tokens, reabastecido continuamente"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: int):
+        # Lotes maiores que o orçamento inteiro esperam o balde encher
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return
+                await asyncio.sleep((tokens - self.available) / self.rate)
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limited(exc: Exception) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status == 429
+
+
+class EmbeddingScheduler:
+    """Executa `embed_batch` sobre lotes de textos, em paralelo e sob orçamento"""
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], Awaitable[np.ndarray]],
+        max_batch_size: int = 256,
+        max_batch_tokens: int = 50000,
+        concurrency: int = 4,
+        tokens_per_minute: int = 0,
+        max_retries: int = 6
+    ):
+        self.embed_batch = embed_batch
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.budget = TokenBudget(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.rate_limited = 0  # 429 recebidos (métrica)
+
+    def make_batches(self, texts: List[str]) -> List[Tuple[List[int], int]]:
+        """Agrupar índices dos textos em lotes (índices, tokens) por quantidade e por tokens"""
+        batches = []
+        current: List[int] = []
+        current_tokens = 0
+
+        for i, text in enumerate(texts):
+            tokens = count_tokens(text)
+            full = (
+                len(current) >= self.max_batch_size
+                or current_tokens + tokens > self.max_batch_tokens
+            )
+            if current and full:
+                batches.append((current, current_tokens))
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+
+        if current:
+            batches.append((current, current_tokens))
+        return batches
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(indices: List[int], tokens: int) -> np.ndarray:
+            async with semaphore:
+                return await self._run_batch([texts[i] for i in indices], tokens)
+
+        batches = self.make_batches(texts)
+        results = await asyncio.gather(*(run(indices, tokens) for indices, tokens in batches))
+
+        vectors = np.empty((len(texts), results[0].shape[1]), dtype=np.float32)
+        for (indices, _), batch_vectors in zip(batches, results):
+            vectors[indices] = batch_vectors
+        return vectors
+
+    async def _run_batch(self, batch: List[str], tokens: int) -> np.ndarray:
+        attempt = 0
+        while True:
+            if self.budget:
+                await self.budget.acquire(tokens)
+            try:
+                return await self.embed_batch(batch)
+            except Exception as e:
+                if not is_rate_limited(e) or attempt >= self.max_retries:
+                    raise
+                self.rate_limited += 1
+
+                # Backoff exponencial com jitter completo (ou o Retry-After do provedor)
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+                else:
+                    delay += random.uniform(0, BACKOFF_BASE)
+                attempt += 1
+                logger.warning(
+                    f"Rate limit nos embeddings ({len(batch)} textos), "
+                    f"tentativa {attempt}/{self.max_retries} em {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
@@ -0,0 +1,155 @@
+"""Modelos de embeddings (OpenAI ou local via sentence-transformers)"""
+
+import logging
+import threading
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.services.clients import get_provider_clients
+from app.services.embedding_cache import embedding_cache, text_hash
+from app.services.embedding_scheduler import EmbeddingScheduler
+
+# Imports condicionais (modelo local é opcional)
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+OPENAI_EMBEDDING_PREFIX = "text-embedding"
+
+
+class OpenAIEmbedder:
+    """Embeddings pela API da OpenAI (cliente assíncrono compartilhado)
+    
+    As requisições passam pelo agendador: lotes limitados, enviados em
+    paralelo sob o orçamento de tokens por minuto, com retry em 429.
+    """
+
+    def __init__(self, model: str):
+        self.name = model
+        self.scheduler = EmbeddingScheduler(
+            self._embed_batch,
+            max_batch_size=settings.EMBEDDING_BATCH_SIZE,
+            max_batch_tokens=settings.EMBEDDING_BATCH_TOKENS,
+            concurrency=settings.EMBEDDING_CONCURRENCY,
+            tokens_per_minute=settings.EMBEDDING_TPM,
+            max_retries=settings.EMBEDDING_MAX_RETRIES
+        )
+
+    async def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        # Retries ficam a cargo do agendador (backoff com jitter)
+        client = get_provider_clients().openai.with_options(max_retries=0)
+        response = await client.embeddings.create(model=self.name, input=texts)
+        return np.asarray([item.embedding for item in response.data], dtype=np.float32)
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return await self.scheduler.embed(texts)
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        return (await self.embed([text]))[0]
+
+
+class LocalEmbedder:
+    """Embeddings locais (CPU), funcionam sem acesso à rede"""
+
+    def __init__(self, model: str):
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            raise RuntimeError("sentence-transformers não instalado")
+        self.name = model
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        with self._lock:
+            if self._model is None:
+                self._model = SentenceTransformer(self.name, device="cpu")
+        vectors = self._model.encode(
+            texts,
+            batch_size=32,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return vectors.astype(np.float32)
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return await run_in_threadpool(self._encode, texts)
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        return (await self.embed([text]))[0]
+
+
+class CachedEmbedder:
+    """Embedder com cache persistente: só os textos inéditos vão ao modelo"""
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self.name = embedder.name
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        hashes = [text_hash(text) for text in texts]
+        known = await run_in_threadpool(embedding_cache.get_many, self.name, hashes)
+
+        # Textos repetidos no mesmo lote são embedados uma vez
+        missing = {}
+        for text, hash_ in zip(texts, hashes):
+            if hash_ not in known and hash_ not in missing:
+                missing[hash_] = text
+
+        embedding_cache.record(self.name, len(texts) - len(missing), len(missing))
+
+        if missing:
+            vectors = await self.embedder.embed(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            await run_in_threadpool(embedding_cache.put_many, self.name, computed)
+            known.update(computed)
+
+        return np.stack([known[hash_] for hash_ in hashes]).astype(np.float32, copy=False)
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        """Embedding de uma consulta (cache à parte, limitado por modelo)"""
+        hash_ = text_hash(text)
+        known = await run_in_threadpool(embedding_cache.get_many, self.name, [hash_], True)
+        embedding_cache.record(self.name, len(known), 1 - len(known))
+        if hash_ in known:
+            return known[hash_]
+
+        vector = np.asarray((await self.embedder.embed([text]))[0], dtype=np.float32)
+        await run_in_threadpool(embedding_cache.put_queries, self.name, {hash_: vector})
+        return vector
+
+
+def resolve_embedding_model(requested: str) -> str:
+    """Modelo efetivo: OpenAI quando configurada, senão o modelo local"""
+    requested = requested or settings.LOCAL_EMBEDDING_MODEL
+    if requested.startswith(OPENAI_EMBEDDING_PREFIX):
+        if settings.OPENAI_API_KEY and not settings.EMBEDDING_OFFLINE:
+            return requested
+        return settings.LOCAL_EMBEDDING_MODEL
+    return requested
+
+
+@lru_cache(maxsize=8)
+def get_embedder(model: str):
+    """Obter embedder (instância única por modelo no processo)
+    
+    O modelo resolvido de `KnowledgeBase.embedding_model` é o namespace do
+    cache de embeddings.
+    """
+    model = resolve_embedding_model(model)
+    if model.startswith(OPENAI_EMBEDDING_PREFIX):
+        embedder = OpenAIEmbedder(model)
+    else:
+        logger.info(f"Usando modelo de embeddings local: {model}")
+        embedder = LocalEmbedder(model)
+
+    if settings.EMBEDDING_CACHE_ENABLED:
+        return CachedEmbedder(embedder)
+    return embedder
@@ -0,0 +1,466 @@
+"""Fila de ingestão de documentos (processamento em background)
+
+Uploads apenas gravam o arquivo e enfileiram o documento; workers assíncronos
+consomem a fila, fazem o parsing/chunking em um pool de processos (fora do
+worker HTTP), geram embeddings, indexam e gravam o resultado em
+`Document.is_processed` / `processing_error`. O id do documento é o id do job.
+
+Os chunks são gerados em lotes (PDFs em faixas de páginas paralelas no pool),
+indexados à medida que chegam e gravados na tabela `chunks`.
+
+Conteúdo repetido não é reprocessado: se o documento (ou outro com o mesmo
+conteúdo e chunking) já tem chunks gravados, eles são lidos do banco em vez
+do arquivo; se o mesmo arquivo já foi indexado com os mesmos parâmetros, os
+vetores são copiados do documento original.
+
+Alterar o chunking de uma base (re-chunking) roda como tarefa em background:
+os documentos são divididos de novo em um índice paralelo, reaproveitando os
+vetores dos chunks cujo texto não mudou (sha256), e o índice novo substitui
+o atual de uma vez ao final, depois do commit dos chunks. Até lá as buscas
+usam o índice atual.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+from contextlib import aclosing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Optional, List, AsyncIterator
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Document, KnowledgeBase
+from app.services.embeddings import resolve_embedding_model
+from app.services.rag import RAGService
+from app.services.chunk_store import (
+    save_chunks,
+    set_vector_rows,
+    copy_chunks,
+    delete_chunks,
+    find_chunk_source,
+    iter_document_chunks,
+    discard_staged_chunks,
+    activate_staged_chunks
+)
+from app.services.lexical_index import LexicalIndex
+from app.services.vector_index import VectorIndex, get_vector_index, staging_index_path
+
+logger = logging.getLogger(__name__)
+
+# Estados de um job
+QUEUED = "queued"
+PROCESSING = "processing"
+COMPLETED = "completed"
+FAILED = "failed"
+RUNNING = "running"
+
+
+class IngestionQueue:
+    """Fila em processo com workers assíncronos e pool de processos para parsing"""
+
+    def __init__(self):
+        self.queue: Optional[asyncio.Queue] = None
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.workers: List[asyncio.Task] = []
+        self.jobs: Dict[int, Dict[str, Any]] = {}  # estado em memória (etapa atual)
+        self.rechunks: Dict[int, Dict[str, Any]] = {}  # progresso do re-chunking por base
+        self.rechunk_tasks: Dict[int, asyncio.Task] = {}
+
+    async def start(self):
+        """Iniciar workers e reenfileirar documentos pendentes"""
+        if self.workers:
+            return
+
+        self.queue = asyncio.Queue()
+        self.pool = ProcessPoolExecutor(
+            max_workers=settings.INGESTION_PROCESSES or os.cpu_count() or 1,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        self.workers = [
+            asyncio.create_task(self._worker(i))
+            for i in range(settings.INGESTION_WORKERS)
+        ]
+
+        # Documentos e re-chunkings que ficaram pendentes em um restart
+        pending, rechunking = await run_in_threadpool(_load_pending)
+
+        for document_id in pending:
+            self.enqueue(document_id)
+        for kb_id in rechunking:
+            self.start_rechunk(kb_id)
+
+        logger.info(f"Fila de ingestão iniciada ({len(self.workers)} workers, {len(pending)} pendentes)")
+
+    async def stop(self):
+        """Encerrar workers e pool de processos"""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+        for task in self.rechunk_tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.rechunk_tasks.values(), return_exceptions=True)
+        self.rechunk_tasks = {}
+
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def enqueue(self, document_id: int) -> int:
+        """Enfileirar documento para processamento. Retorna o id do job"""
+        self.jobs[document_id] = {"status": QUEUED, "stage": None, "queued_at": time.time()}
+        self.queue.put_nowait(document_id)
+        return document_id
+
+    def get_job(self, document_id: int) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(document_id)
+
+    def start_rechunk(self, kb_id: int):
+        """Iniciar o re-chunking da base (parâmetros em `KnowledgeBase.rechunk`)"""
+        self.rechunks[kb_id] = {"documents": 0, "processed": 0, "chunks": 0, "embedded": 0, "reused": 0}
+        task = asyncio.create_task(self._rechunk(kb_id))
+        self.rechunk_tasks[kb_id] = task
+        task.add_done_callback(lambda _: self.rechunk_tasks.pop(kb_id, None))
+
+    @property
+    def pending(self) -> int:
+        return self.queue.qsize() if self.queue else 0
+
+    async def _worker(self, worker_id: int):
+        while True:
+            document_id = await self.queue.get()
+            try:
+                await self._process(document_id)
+            except Exception as e:
+                logger.error(f"Erro inesperado na ingestão do documento {document_id}: {e}", exc_info=True)
+            finally:
+                self.queue.task_done()
+
+    def _set_stage(self, document_id: int, stage: str, **extra):
+        job = self.jobs.setdefault(document_id, {"queued_at": time.time()})
+        job.update(status=PROCESSING, stage=stage, **extra)
+
+    async def _process(self, document_id: int):
+        # Sessão síncrona: todo acesso ao banco roda no threadpool (inclusive
+        # atributos expirados após commits, lidos nos helpers abaixo)
+        db = SessionLocal()
+        try:
+            loaded = await run_in_threadpool(_load_document, db, document_id)
+            if loaded is None:
+                self.jobs.pop(document_id, None)
+                return
+            document, kb = loaded
+            kb_id = kb.id
+
+            self._set_stage(document_id, "parsing", started_at=time.time())
+            rag_service = RAGService(kb.embedding_model)
+
+            # Chunks já gravados do próprio documento (reindexação) não são apagados em falha
+            chunk_source = await run_in_threadpool(find_chunk_source, db, document, kb)
+            own_chunks = chunk_source == document_id
+
+            try:
+                # Mesmo conteúdo já indexado com os mesmos parâmetros: copiar vetores
+                chunks_count = 0
+                source = None if own_chunks else await run_in_threadpool(_find_indexed_copy, db, document, kb)
+                if source:
+                    row_map = await rag_service.copy_document(
+                        source.knowledge_base_id, source.id, kb_id, document_id
+                    )
+                    await run_in_threadpool(copy_chunks, db, source.id, document, row_map)
+                    chunks_count = len(row_map)
+
+                if not chunks_count:
+                    batches = self._iter_chunks(rag_service, db, document, kb, chunk_source)
+                    async with aclosing(batches):
+                        async for batch in batches:
+                            rows = await rag_service.index_chunks(kb_id, document_id, batch)
+                            if own_chunks:
+                                await run_in_threadpool(
+                                    set_vector_rows, db, [chunk["id"] for chunk in batch], rows
+                                )
+                            else:
+                                await run_in_threadpool(
+                                    save_chunks, db, document, batch, rows, chunks_count
+                                )
+                            chunks_count += len(batch)
+                            self._set_stage(document_id, "indexing", chunks=chunks_count)
+
+                await run_in_threadpool(_mark_processed, db, document, kb, chunks_count)
+
+                self.jobs[document_id].update(status=COMPLETED, stage=None, finished_at=time.time())
+
+            except Exception as e:
+                await run_in_threadpool(db.rollback)
+
+                # Descartar lotes já indexados (um novo envio reindexa do zero)
+                try:
+                    await rag_service.delete_document(kb_id, document_id)
+                    if not own_chunks:
+                        await run_in_threadpool(delete_chunks, db, document_id)
+                except Exception:
+                    logger.warning(f"Não foi possível limpar o índice do documento {document_id}")
+                    await run_in_threadpool(db.rollback)
+
+                await run_in_threadpool(_mark_failed, db, document, str(e))
+
+                self.jobs[document_id].update(status=FAILED, stage=None, finished_at=time.time())
+                logger.warning(f"Falha na ingestão do documento {document_id}: {e}")
+
+        finally:
+            await run_in_threadpool(db.close)
+
+    async def _rechunk(self, kb_id: int):
+        # Sessão síncrona: como em `_process`, todo acesso ao banco roda no
+        # threadpool e o loop só vê valores simples (ids, caminhos, parâmetros)
+        db = SessionLocal()
+        staging_path = staging_index_path(kb_id)
+        generation_path = None
+        lexical_index = None
+        try:
+            embedding_model, rechunk, documents = await run_in_threadpool(_load_rechunk, db, kb_id)
+            chunk_size = rechunk["chunk_size"]
+            chunk_overlap = rechunk["chunk_overlap"]
+            rag_service = RAGService(embedding_model)
+
+            # Restos de uma tentativa interrompida
+            await run_in_threadpool(discard_staged_chunks, db, kb_id)
+            if staging_path.exists():
+                await run_in_threadpool(shutil.rmtree, staging_path)
+
+            progress = self.rechunks[kb_id]
+            progress["documents"] = len(documents)
+            index = VectorIndex(staging_path)
+            lexical_index = LexicalIndex(staging_path / "lexical.db")
+            live_index = get_vector_index(kb_id)
+            counts: Dict[int, int] = {}
+
+            try:
+                for document_id, file_path in documents:
+                    position = 0
+                    batches = rag_service.iter_chunks(
+                        file_path, chunk_size, chunk_overlap, executor=self.pool
+                    )
+                    async with aclosing(batches):
+                        async for batch in batches:
+                            rows, embedded = await rag_service.add_chunks(
+                                index, lexical_index, document_id, batch, reuse=[live_index]
+                            )
+                            await run_in_threadpool(
+                                _save_staged_chunks, db, document_id, batch, rows, position
+                            )
+                            position += len(batch)
+                            progress["chunks"] += len(batch)
+                            progress["embedded"] += embedded
+                            progress["reused"] += len(batch) - embedded
+
+                    counts[document_id] = position
+                    progress["processed"] += 1
+
+                lexical_index.close()
+
+                # Aplicar: índices novos em uma geração fora do ar; chunking,
+                # contagens e chunks em uma transação; só depois do commit a troca
+                generation_path = await rag_service.install_index(kb_id, staging_path)
+                await run_in_threadpool(
+                    _apply_rechunk, db, kb_id, chunk_size, chunk_overlap, counts
+                )
+
+            except Exception as e:
+                await run_in_threadpool(db.rollback)
+                lexical_index.close()
+                await run_in_threadpool(discard_staged_chunks, db, kb_id)
+                await run_in_threadpool(shutil.rmtree, generation_path or staging_path, True)
+
+                await run_in_threadpool(_mark_rechunk_failed, db, kb_id, str(e))
+                logger.warning(f"Falha no re-chunking da base {kb_id}: {e}")
+
+            else:
+                await rag_service.replace_index(kb_id, generation_path)
+                logger.info(
+                    f"Re-chunking da base {kb_id} concluído: {progress['chunks']} chunks, "
+                    f"{progress['embedded']} embedados, {progress['reused']} reaproveitados"
+                )
+
+        finally:
+            if lexical_index:
+                lexical_index.close()
+            await run_in_threadpool(db.close)
+
+    async def _iter_chunks(
+        self,
+        rag_service: RAGService,
+        db,
+        document: Document,
+        kb: KnowledgeBase,
+        chunk_source: Optional[int]
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Lotes de chunks: do banco, se já extraídos, ou do parsing do arquivo"""
+        if chunk_source is not None:
+            batches = iter_document_chunks(db, chunk_source, document.file_path)
+            while True:
+                batch = await run_in_threadpool(next, batches, None)
+                if batch is None:
+                    return
+                yield batch
+
+        async for batch in rag_service.iter_chunks(
+            document.file_path,
+            kb.chunk_size,
+            kb.chunk_overlap,
+            executor=self.pool
+        ):
+            yield batch
+
+
+def _load_pending():
+    """Ids dos documentos pendentes e das bases com re-chunking em andamento"""
+    db = SessionLocal()
+    try:
+        pending = [
+            document_id for (document_id,) in db.query(Document.id).filter(
+                Document.is_processed == False,
+                Document.processing_error.is_(None)
+            )
+        ]
+        rechunking = [
+            kb_id for kb_id, rechunk in db.query(KnowledgeBase.id, KnowledgeBase.rechunk).filter(
+                KnowledgeBase.rechunk.isnot(None)
+            )
+            if rechunk.get("status") == RUNNING
+        ]
+        return pending, rechunking
+    finally:
+        db.close()
+
+
+def _load_document(db, document_id: int):
+    """Documento pendente e a sua base (None se já processado ou removido)"""
+    document = db.query(Document).filter(Document.id == document_id).first()
+    if not document or document.is_processed:
+        return None
+
+    kb = db.query(KnowledgeBase).filter(
+        KnowledgeBase.id == document.knowledge_base_id
+    ).first()
+    return document, kb
+
+
+def _mark_processed(db, document: Document, kb: KnowledgeBase, chunks_count: int):
+    document.is_processed = True
+    document.chunks_count = chunks_count
+    document.processing_error = None
+    document.processed_at = datetime.utcnow()
+    kb.total_documents += 1
+    kb.total_chunks += chunks_count
+    db.commit()
+
+
+def _mark_failed(db, document: Document, error: str):
+    document.processing_error = error
+    document.processed_at = datetime.utcnow()
+    db.commit()
+
+
+def _load_rechunk(db, kb_id: int):
+    """Modelo de embeddings, parâmetros do re-chunking e (id, caminho) dos documentos processados"""
+    kb = db.query(KnowledgeBase).filter(KnowledgeBase.id == kb_id).first()
+    documents = db.query(Document.id, Document.file_path).filter(
+        Document.knowledge_base_id == kb_id,
+        Document.is_processed == True
+    ).order_by(Document.id).all()
+    return kb.embedding_model, dict(kb.rechunk), [tuple(document) for document in documents]
+
+
+def _save_staged_chunks(db, document_id: int, chunks: List[Dict[str, Any]], rows: List[int], position: int):
+    save_chunks(db, db.get(Document, document_id), chunks, rows, position, False)
+
+
+def _apply_rechunk(db, kb_id: int, chunk_size: int, chunk_overlap: int, counts: Dict[int, int]):
+    """Ativar os chunks novos e gravar o chunking e as contagens (uma transação)"""
+    activate_staged_chunks(db, kb_id)
+    for document_id, chunks_count in counts.items():
+        db.get(Document, document_id).chunks_count = chunks_count
+    kb = db.get(KnowledgeBase, kb_id)
+    kb.chunk_size = chunk_size
+    kb.chunk_overlap = chunk_overlap
+    kb.total_chunks = sum(counts.values())
+    kb.rechunk = None
+    db.commit()
+
+
+def _mark_rechunk_failed(db, kb_id: int, error: str):
+    kb = db.get(KnowledgeBase, kb_id)
+    kb.rechunk = dict(kb.rechunk, status=FAILED, error=error)
+    db.commit()
+
+
+def _find_indexed_copy(db, document: Document, kb: KnowledgeBase) -> Optional[Document]:
+    """Documento já processado com o mesmo conteúdo, chunking e modelo de embeddings"""
+    if not document.content_hash:
+        return None
+
+    candidates = db.query(Document).join(KnowledgeBase).filter(
+        Document.content_hash == document.content_hash,
+        Document.id != document.id,
+        Document.is_processed == True,
+        KnowledgeBase.chunk_size == kb.chunk_size,
+        KnowledgeBase.chunk_overlap == kb.chunk_overlap
+    ).all()
+
+    model = resolve_embedding_model(kb.embedding_model)
+    for candidate in candidates:
+        if resolve_embedding_model(candidate.knowledge_base.embedding_model) == model:
+            return candidate
+    return None
+
+
+ingestion_queue = IngestionQueue()
+
+
+def rechunk_status(kb: KnowledgeBase) -> Dict[str, Any]:
+    """Status do re-chunking de uma base (banco + progresso em memória)"""
+    rechunk = kb.rechunk or {}
+    status = rechunk.get("status", COMPLETED)
+    progress = ingestion_queue.rechunks.get(kb.id, {})
+
+    return {
+        "knowledge_base_id": kb.id,
+        "status": status,
+        "chunk_size": rechunk.get("chunk_size", kb.chunk_size),
+        "chunk_overlap": rechunk.get("chunk_overlap", kb.chunk_overlap),
+        "error": rechunk.get("error"),
+        **progress
+    }
+
+
+def document_status(document: Document) -> Dict[str, Any]:
+    """Status de ingestão de um documento (banco + estado em memória)"""
+    job = ingestion_queue.get_job(document.id) or {}
+
+    if document.is_processed:
+        status = COMPLETED
+    elif document.processing_error:
+        status = FAILED
+    else:
+        status = job.get("status", QUEUED)
+
+    return {
+        "job_id": document.id,
+        "document_id": document.id,
+        "filename": document.filename,
+        "status": status,
+        "stage": job.get("stage") if status == PROCESSING else None,
+        "is_processed": document.is_processed,
+        "chunks_count": document.chunks_count,
+        "processing_error": document.processing_error,
+        "created_at": document.created_at,
+        "processed_at": document.processed_at
+    }
@@ -0,0 +1,193 @@
+"""Índice lexical (BM25) por base de conhecimento
+
+Índice invertido em SQLite FTS5 (lexical.db, no diretório do índice
+vetorial da base). O rowid de cada chunk é a mesma linha do índice vetorial,
+o que permite fundir os dois rankings. O tokenizador unicode61 ignora
+acentos, então "ação" e "acao" casam; códigos como "SKU-1234-A" ou
+"8.078/90" são buscados como frase.
+
+A atualização é incremental: `sync` indexa apenas as linhas do índice
+vetorial ainda não vistas e `delete_document` remove as linhas de um
+documento.
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.services.vector_index import VectorIndex, current_index_path
+
+logger = logging.getLogger(__name__)
+
+# Termos considerados por consulta
+MAX_QUERY_TERMS = 64
+
+WORD_RE = re.compile(r"\w+")
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """Consulta FTS5: termos em OR; palavras com pontuação interna viram frase"""
+    terms = []
+    for word in query.split():
+        tokens = WORD_RE.findall(word.lower())
+        if tokens:
+            terms.append('"' + " ".join(tokens) + '"')
+    if not terms:
+        return None
+    return " OR ".join(dict.fromkeys(terms[:MAX_QUERY_TERMS]))
+
+
+class LexicalIndex:
+    """Índice BM25 de uma base de conhecimento"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5("
+                "content, tokenize='unicode61 remove_diacritics 2')"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunk_documents ("
+                "row INTEGER PRIMARY KEY, document_id INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_chunk_documents_document_id "
+                "ON chunk_documents (document_id)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _synced_rows(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT value FROM state WHERE key = 'synced_rows'").fetchone()
+        return row[0] if row else 0
+
+    def sync(self, vector_index: VectorIndex) -> int:
+        """Indexar as linhas novas do índice vetorial. Retorna quantas foram indexadas"""
+        with self.lock:
+            conn = self._connect()
+            start = self._synced_rows(conn)
+            total = vector_index.count
+            if start >= total:
+                return 0
+
+            added = 0
+            for row, document_id, payload in vector_index.iter_rows(start):
+                if row >= total:
+                    break
+                conn.execute(
+                    "INSERT OR REPLACE INTO chunks (rowid, content) VALUES (?, ?)",
+                    (row, payload.get("content", ""))
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO chunk_documents (row, document_id) VALUES (?, ?)",
+                    (row, document_id)
+                )
+                added += 1
+
+            conn.execute(
+                "INSERT OR REPLACE INTO state (key, value) VALUES ('synced_rows', ?)", (total,)
+            )
+            conn.commit()
+            return added
+
+    def delete_document(self, document_id: int) -> int:
+        with self.lock:
+            conn = self._connect()
+            conn.execute(
+                "DELETE FROM chunks WHERE rowid IN "
+                "(SELECT row FROM chunk_documents WHERE document_id = ?)",
+                (document_id,)
+            )
+            removed = conn.execute(
+                "DELETE FROM chunk_documents WHERE document_id = ?", (document_id,)
+            ).rowcount
+            conn.commit()
+            return removed
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """(linha, score BM25) dos chunks mais relevantes; maior score = melhor"""
+        match = build_match_query(query)
+        if not match:
+            return []
+
+        sql = (
+            "SELECT chunks.rowid, bm25(chunks) FROM chunks "
+            "JOIN chunk_documents ON chunk_documents.row = chunks.rowid "
+            "WHERE chunks MATCH ?"
+        )
+        params: list = [match]
+        if document_ids is not None:
+            if not document_ids:
+                return []
+            sql += f" AND chunk_documents.document_id IN ({','.join('?' * len(document_ids))})"
+            params.extend(document_ids)
+        sql += " ORDER BY bm25(chunks) LIMIT ?"
+        params.append(top_k)
+
+        with self.lock:
+            conn = self._connect()
+            try:
+                rows = conn.execute(sql, params).fetchall()
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Consulta lexical inválida ({match}): {e}")
+                return []
+
+        # bm25() do FTS5 é negativo (menor = mais relevante)
+        return [(row, -score) for row, score in rows]
+
+    def close(self):
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_indexes: Dict[int, LexicalIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(kb_id: int) -> LexicalIndex:
+    """Obter (e manter aberto) o índice lexical da geração atual da base"""
+    path = current_index_path(kb_id) / "lexical.db"
+    with _indexes_lock:
+        index = _indexes.get(kb_id)
+        if index is None or index.path != path:
+            # Geração trocada: a conexão antiga fecha quando o último leitor a libera
+            index = LexicalIndex(path)
+            _indexes[kb_id] = index
+        return index
+
+
+def close_lexical_index(kb_id: int):
+    """Fechar o índice lexical (antes de remover o diretório da base)"""
+    with _indexes_lock:
+        index = _indexes.pop(kb_id, None)
+    if index:
+        index.close()
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> Dict[int, float]:
+    """Score RRF de cada linha: soma de 1 / (k + posição) em cada ranking"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + rank)
+    return scores
@@ -1,10 +1,10 @@
 """Serviço de LLM (Large Language Models)"""
 
-from typing import List, Dict, Any, Optional
-import openai
-import anthropic
+from typing import List, Dict, Any, Optional, AsyncIterator
 import google.generativeai as genai
 from app.config import settings
+from app.services.clients import get_provider_clients
+from app.services.context import count_tokens
 
 
 class LLMService:
@@ -13,17 +13,10 @@ class LLMService:
     def __init__(self, model: str = "gpt-4"):
         self.model = model
         
-        # Configurar clientes
-        if settings.OPENAI_API_KEY:
-            openai.api_key = settings.OPENAI_API_KEY
-        
-        if settings.ANTHROPIC_API_KEY:
-            self.anthropic_client = anthropic.Anthropic(
-                api_key=settings.ANTHROPIC_API_KEY
-            )
-            
-        if settings.GOOGLE_API_KEY:
-            genai.configure(api_key=settings.GOOGLE_API_KEY)
+        # Clientes compartilhados pelo processo (criados no lifespan)
+        clients = get_provider_clients()
+        self.openai_client = clients.openai
+        self.anthropic_client = clients.anthropic
     
     async def generate(
         self,
@@ -49,6 +42,98 @@ class LLMService:
         else:
             raise ValueError(f"Modelo não suportado: {self.model}")
     
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000
+    ) -> AsyncIterator[str]:
+        """Gerar resposta do LLM em streaming (trechos de texto à medida que chegam)
+        
+        Diferente de `generate`, falhas do provedor (inclusive no meio da
+        resposta) são propagadas, para que quem consome o stream não trate
+        texto de erro ou uma resposta parcial como resposta do modelo.
+        """
+        
+        if self.model.startswith("gpt"):
+            stream = self._stream_openai(
+                messages, system_prompt, temperature, max_tokens
+            )
+        elif self.model.startswith("claude"):
+            stream = self._stream_anthropic(
+                messages, system_prompt, temperature, max_tokens
+            )
+        elif self.model.startswith("gemini"):
+            stream = self._stream_google(
+                messages, system_prompt, temperature, max_tokens
+            )
+        else:
+            raise ValueError(f"Modelo não suportado: {self.model}")
+        
+        async for delta in stream:
+            if delta:
+                yield delta
+    
+    def _openai_messages(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str]
+    ) -> List[Dict[str, str]]:
+        """Preparar mensagens no formato da OpenAI"""
+        chat_messages = []
+        
+        if system_prompt:
+            chat_messages.append({"role": "system", "content": system_prompt})
+        
+        chat_messages.extend(messages)
+        return chat_messages
+    
+    def _anthropic_messages(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Preparar mensagens (Claude não usa system no array de mensagens)"""
+        return [
+            {"role": msg["role"], "content": msg["content"]}
+            for msg in messages
+            if msg["role"] != "system"
+        ]
+    
+    def _google_request(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str],
+        temperature: float,
+        max_tokens: int
+    ):
+        """Preparar modelo, prompt e configuração do Gemini"""
+        # Selecionar modelo
+        model_name = "gemini-pro"
+        if "vision" in self.model:
+            model_name = "gemini-pro-vision"
+            
+        model = genai.GenerativeModel(model_name)
+        
+        # Preparar prompt
+        # Gemini tem estrutura diferente, vamos simplificar concatenando
+        full_prompt = ""
+        if system_prompt:
+            full_prompt += f"System: {system_prompt}\n\n"
+        
+        for msg in messages:
+            role = msg["role"]
+            content = msg["content"]
+            if role == "user":
+                full_prompt += f"User: {content}\n"
+            elif role == "assistant":
+                full_prompt += f"Assistant: {content}\n"
+        
+        # Configuração
+        generation_config = genai.types.GenerationConfig(
+            temperature=temperature,
+            max_output_tokens=max_tokens
+        )
+        
+        return model, full_prompt, generation_config
+    
     async def _generate_openai(
         self,
         messages: List[Dict[str, str]],
@@ -62,18 +147,10 @@ class LLMService:
             return "⚠️ API Key da OpenAI não configurada. Por favor, configure OPENAI_API_KEY no arquivo .env"
         
         try:
-            # Preparar mensagens
-            chat_messages = []
-            
-            if system_prompt:
-                chat_messages.append({"role": "system", "content": system_prompt})
-            
-            chat_messages.extend(messages)
-            
             # Chamar API
-            response = openai.chat.completions.create(
+            response = await self.openai_client.chat.completions.create(
                 model=self.model,
-                messages=chat_messages,
+                messages=self._openai_messages(messages, system_prompt),
                 temperature=temperature,
                 max_tokens=max_tokens
             )
@@ -83,6 +160,31 @@ class LLMService:
         except Exception as e:
             return f"Erro ao gerar resposta: {str(e)}"
     
+    async def _stream_openai(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str],
+        temperature: float,
+        max_tokens: int
+    ) -> AsyncIterator[str]:
+        """Gerar resposta em streaming usando OpenAI"""
+        
+        if not settings.OPENAI_API_KEY:
+            yield "⚠️ API Key da OpenAI não configurada. Por favor, configure OPENAI_API_KEY no arquivo .env"
+            return
+        
+        stream = await self.openai_client.chat.completions.create(
+            model=self.model,
+            messages=self._openai_messages(messages, system_prompt),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
     async def _generate_anthropic(
         self,
         messages: List[Dict[str, str]],
@@ -96,18 +198,11 @@ class LLMService:
             return "⚠️ API Key da Anthropic não configurada. Por favor, configure ANTHROPIC_API_KEY no arquivo .env"
         
         try:
-            # Preparar mensagens (Claude não usa system no array de mensagens)
-            formatted_messages = [
-                {"role": msg["role"], "content": msg["content"]}
-                for msg in messages
-                if msg["role"] != "system"
-            ]
-            
             # Chamar API
-            response = self.anthropic_client.messages.create(
+            response = await self.anthropic_client.messages.create(
                 model=self.model,
                 system=system_prompt or "",
-                messages=formatted_messages,
+                messages=self._anthropic_messages(messages),
                 temperature=temperature,
                 max_tokens=max_tokens
             )
@@ -117,6 +212,32 @@ class LLMService:
         except Exception as e:
             return f"Erro ao gerar resposta: {str(e)}"
     
+    async def _stream_anthropic(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str],
+        temperature: float,
+        max_tokens: int
+    ) -> AsyncIterator[str]:
+        """Gerar resposta em streaming usando Anthropic Claude"""
+        
+        if not settings.ANTHROPIC_API_KEY:
+            yield "⚠️ API Key da Anthropic não configurada. Por favor, configure ANTHROPIC_API_KEY no arquivo .env"
+            return
+        
+        stream = await self.anthropic_client.messages.create(
+            model=self.model,
+            system=system_prompt or "",
+            messages=self._anthropic_messages(messages),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        
+        async for event in stream:
+            if event.type == "content_block_delta":
+                yield event.delta.text
+    
     async def _generate_google(
         self,
         messages: List[Dict[str, str]],
@@ -130,35 +251,12 @@ class LLMService:
             return "⚠️ API Key do Google não configurada. Por favor, configure GOOGLE_API_KEY no arquivo .env"
         
         try:
-            # Selecionar modelo
-            model_name = "gemini-pro"
-            if "vision" in self.model:
-                model_name = "gemini-pro-vision"
-                
-            model = genai.GenerativeModel(model_name)
-            
-            # Preparar prompt
-            # Gemini tem estrutura diferente, vamos simplificar concatenando
-            full_prompt = ""
-            if system_prompt:
-                full_prompt += f"System: {system_prompt}\n\n"
-            
-            for msg in messages:
-                role = msg["role"]
-                content = msg["content"]
-                if role == "user":
-                    full_prompt += f"User: {content}\n"
-                elif role == "assistant":
-                    full_prompt += f"Assistant: {content}\n"
-            
-            # Configuração
-            generation_config = genai.types.GenerationConfig(
-                temperature=temperature,
-                max_output_tokens=max_tokens
+            model, full_prompt, generation_config = self._google_request(
+                messages, system_prompt, temperature, max_tokens
             )
             
             # Gerar
-            response = model.generate_content(
+            response = await model.generate_content_async(
                 full_prompt,
                 generation_config=generation_config
             )
@@ -168,10 +266,35 @@ class LLMService:
         except Exception as e:
             return f"Erro ao gerar resposta: {str(e)}"
     
+    async def _stream_google(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str],
+        temperature: float,
+        max_tokens: int
+    ) -> AsyncIterator[str]:
+        """Gerar resposta em streaming usando Google Gemini"""
+        
+        if not settings.GOOGLE_API_KEY:
+            yield "⚠️ API Key do Google não configurada. Por favor, configure GOOGLE_API_KEY no arquivo .env"
+            return
+        
+        model, full_prompt, generation_config = self._google_request(
+            messages, system_prompt, temperature, max_tokens
+        )
+        
+        response = await model.generate_content_async(
+            full_prompt,
+            generation_config=generation_config,
+            stream=True
+        )
+        
+        async for chunk in response:
+            yield chunk.text
+    
     def estimate_tokens(self, text: str) -> int:
         """Estimar número de tokens"""
-        # Aproximação: ~4 caracteres por token
-        return len(text) // 4
+        return count_tokens(text, self.model)
     
     def estimate_cost(self, tokens: int) -> float:
         """Estimar custo em USD"""
@@ -0,0 +1,82 @@
+"""Hash e verificação de senhas fora do event loop
+
+Cada bcrypt custa 100-300 ms de CPU. Executado dentro de `async def login`,
+uma rajada de logins trava todas as outras requisições do worker (chat,
+streams). As chamadas rodam em um pool de threads dedicado e limitado
+(a extensão do bcrypt libera o GIL durante o hash); além de
+PASSWORD_HASH_WORKERS em execução, no máximo PASSWORD_HASH_MAX_PENDING
+aguardam na fila - acima disso `PasswordPoolBusy` é levantada e a rota
+responde 503 com Retry-After, em vez de acumular espera indefinidamente.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, TypeVar
+
+from app.auth import get_password_hash, verify_password
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class PasswordPoolBusy(Exception):
+    """Fila de hashing cheia"""
+
+
+class PasswordPool:
+    """Pool de threads limitado para bcrypt, com fila de tamanho fixo"""
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = max(workers, 1)
+        self.max_pending = max(max_pending, 0)
+        self.in_flight = 0
+        self.rejected = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="password-hash"
+            )
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        """Executar `func` no pool, ou levantar PasswordPoolBusy se a fila estiver cheia"""
+        if self.in_flight >= self.workers + self.max_pending:
+            self.rejected += 1
+            raise PasswordPoolBusy()
+
+        self.start()
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.run(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self.run(get_password_hash, password)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected
+        }
+
+
+password_pool = PasswordPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
@@ -0,0 +1,162 @@
+"""Cache do usuário autenticado (principal) por token
+
+`get_current_user` roda em toda requisição autenticada; sem cache, cada uma
+faz a mesma consulta em `users` antes de qualquer trabalho. O principal
+(snapshot imutável dos campos usados pelas rotas) fica em memória do processo
+por (usuário, token) durante PRINCIPAL_CACHE_TTL segundos, com descarte LRU.
+
+Requisições simultâneas do mesmo token (um dashboard disparando várias
+chamadas) compartilham uma única consulta. Rotas que alteram o usuário
+(ativar, desativar, trocar plano, remover) chamam `invalidate_user`; com
+vários workers, os demais enxergam a mudança ao fim do TTL.
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from app.config import settings
+from app.models import User
+
+Key = Tuple[int, str]
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Dados do usuário autenticado usados pelas rotas"""
+    id: int
+    email: str
+    username: str
+    full_name: Optional[str]
+    plan: str
+    is_active: bool
+    is_superadmin: bool
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            username=user.username,
+            full_name=user.full_name,
+            plan=user.plan,
+            is_active=bool(user.is_active),
+            is_superadmin=bool(user.is_superadmin),
+            created_at=user.created_at
+        )
+
+
+class _LoadAborted(Exception):
+    """A consulta compartilhada foi cancelada; quem esperava consulta por conta própria"""
+
+
+class PrincipalCache:
+    """Cache em memória do processo, com TTL, LRU e consultas concorrentes unificadas"""
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Key, Tuple[Principal, float]]" = OrderedDict()
+        self.keys_by_user: Dict[int, Set[Key]] = {}
+        self.pending: Dict[Key, asyncio.Future] = {}
+        self.generations: Dict[int, int] = {}  # incrementado a cada invalidação
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0}
+
+    @staticmethod
+    def key(user_id: int, token: str) -> Key:
+        return user_id, hashlib.sha256(token.encode()).hexdigest()
+
+    async def get(
+        self,
+        user_id: int,
+        token: str,
+        loader: Callable[[], Awaitable[Optional[Principal]]]
+    ) -> Optional[Principal]:
+        """Principal do cache ou de `loader` (None = usuário não existe, não é guardado)"""
+        if not settings.PRINCIPAL_CACHE_ENABLED:
+            return await loader()
+
+        key = self.key(user_id, token)
+        cached = self.entries.get(key)
+        if cached and cached[1] > time.monotonic():
+            self.entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return cached[0]
+
+        pending = self.pending.get(key)
+        if pending is not None:
+            try:
+                principal = await asyncio.shield(pending)
+                self.counters["coalesced"] += 1
+                return principal
+            except _LoadAborted:
+                pass
+
+        self.counters["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        # Evitar aviso de exceção não lida quando ninguém esperava
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.pending[key] = future
+        generation = self.generations.get(user_id, 0)
+        try:
+            principal = await loader()
+        except asyncio.CancelledError:
+            future.set_exception(_LoadAborted())
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if self.pending.get(key) is future:
+                del self.pending[key]
+
+        future.set_result(principal)
+        # Não guardar o que foi lido antes de uma invalidação concorrente
+        if principal is not None and self.generations.get(user_id, 0) == generation:
+            self._store(key, principal)
+        return principal
+
+    def invalidate_user(self, user_id: int) -> int:
+        """Remover as entradas de um usuário (todas as sessões/tokens)"""
+        keys = self.keys_by_user.pop(user_id, set())
+        for key in keys:
+            self.entries.pop(key, None)
+        # Consultas em andamento podem ter lido o estado antigo
+        for key in [key for key in self.pending if key[0] == user_id]:
+            del self.pending[key]
+        self.generations[user_id] = self.generations.get(user_id, 0) + 1
+        self.counters["invalidations"] += 1
+        return len(keys)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.counters["hits"] + self.counters["coalesced"] + self.counters["misses"]
+        served = self.counters["hits"] + self.counters["coalesced"]
+        return {
+            **self.counters,
+            "entries": len(self.entries),
+            "hit_rate": round(100 * served / lookups, 1) if lookups else 0.0
+        }
+
+    def _store(self, key: Key, principal: Principal):
+        self.entries[key] = (principal, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        self.keys_by_user.setdefault(key[0], set()).add(key)
+
+        while len(self.entries) > self.max_entries:
+            old_key, _ = self.entries.popitem(last=False)
+            user_keys = self.keys_by_user.get(old_key[0])
+            if user_keys is not None:
+                user_keys.discard(old_key)
+                if not user_keys:
+                    del self.keys_by_user[old_key[0]]
+
+
+principal_cache = PrincipalCache(
+    ttl=settings.PRINCIPAL_CACHE_TTL,
+    max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES
+)
@@ -1,119 +1,463 @@
 """Serviço de RAG (Retrieval Augmented Generation)"""
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, AsyncIterator, Sequence, Tuple
+from collections import deque
+from concurrent.futures import Executor
+from functools import lru_cache
+import asyncio
+import hashlib
+import logging
 import os
 from pathlib import Path
 
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.services.embeddings import get_embedder
+from app.services.lexical_index import (
+    LexicalIndex,
+    get_lexical_index,
+    close_lexical_index,
+    reciprocal_rank_fusion
+)
+from app.services.reranker import get_reranker
+from app.services.vector_index import (
+    VectorIndex,
+    get_vector_index,
+    drop_vector_index,
+    replace_vector_index,
+    install_vector_index,
+    normalize
+)
+
 # Imports condicionais (pode não ter todas as libs instaladas)
 try:
     from langchain.text_splitter import RecursiveCharacterTextSplitter
-    from langchain.embeddings import OpenAIEmbeddings
-    from langchain_community.vectorstores import Chroma
     from langchain_community.document_loaders import (
         PyPDFLoader,
         TextLoader,
         Docx2txtLoader
     )
+    from langchain.schema import Document as LangchainDocument
     LANGCHAIN_AVAILABLE = True
 except ImportError:
     LANGCHAIN_AVAILABLE = False
 
+try:
+    from pypdf import PdfReader
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+def chunk_hash(content: str) -> str:
+    """sha256 do texto de um chunk"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _split(documents, chunk_size: int, chunk_overlap: int) -> List[Dict[str, Any]]:
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        add_start_index=True
+    )
+    return [
+        {
+            "content": chunk.page_content,
+            "metadata": chunk.metadata
+        }
+        for chunk in text_splitter.split_documents(documents)
+    ]
+
+
+@lru_cache(maxsize=2)
+def _open_pdf(file_path: str, mtime: float) -> "PdfReader":
+    """Leitor reaproveitado entre faixas do mesmo PDF no processo
+    
+    Montar a lista de páginas percorre a árvore inteira do PDF; sem o cache
+    esse custo se repetiria em cada faixa.
+    """
+    return PdfReader(file_path)
+
+
+def pdf_page_count(file_path: str) -> int:
+    """Número de páginas de um PDF (0 se não for possível dividir por páginas)"""
+    if not (LANGCHAIN_AVAILABLE and PYPDF_AVAILABLE):
+        return 0
+    try:
+        return len(_open_pdf(file_path, os.path.getmtime(file_path)).pages)
+    except Exception as e:
+        raise Exception(f"Erro ao processar documento: {str(e)}")
+
+
+def split_pdf_pages(
+    file_path: str,
+    start: int,
+    end: int,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200
+) -> List[Dict[str, Any]]:
+    """Extrair e dividir em chunks as páginas [start, end) de um PDF
+    
+    Mesmos metadados do PyPDFLoader (source, page). Cada página é dividida
+    isoladamente, então faixas diferentes podem rodar em processos
+    diferentes sem alterar o resultado.
+    """
+    try:
+        reader = _open_pdf(file_path, os.path.getmtime(file_path))
+        pages = [
+            LangchainDocument(
+                page_content=reader.pages[page].extract_text(),
+                metadata={"source": file_path, "page": page}
+            )
+            for page in range(start, min(end, len(reader.pages)))
+        ]
+        return _split(pages, chunk_size, chunk_overlap)
+    
+    except Exception as e:
+        raise Exception(f"Erro ao processar documento: {str(e)}")
+
+
+def split_document(
+    file_path: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200
+) -> List[Dict[str, Any]]:
+    """Carregar documento e dividir em chunks
+    
+    Função de módulo (picklable) para poder rodar em um pool de processos.
+    """
+    
+    if not LANGCHAIN_AVAILABLE:
+        return []
+    
+    # Carregar documento baseado na extensão
+    file_ext = Path(file_path).suffix.lower()
+    
+    if file_ext == '.pdf' and PYPDF_AVAILABLE:
+        return split_pdf_pages(file_path, 0, pdf_page_count(file_path), chunk_size, chunk_overlap)
+    
+    try:
+        if file_ext == '.pdf':
+            loader = PyPDFLoader(file_path)
+        elif file_ext == '.txt' or file_ext == '.md':
+            loader = TextLoader(file_path)
+        elif file_ext == '.docx':
+            loader = Docx2txtLoader(file_path)
+        else:
+            raise ValueError(f"Tipo de arquivo não suportado: {file_ext}")
+        
+        # Carregar documento e dividir em chunks
+        return _split(loader.load(), chunk_size, chunk_overlap)
+    
+    except Exception as e:
+        raise Exception(f"Erro ao processar documento: {str(e)}")
+
 
 class RAGService:
     """Serviço para processamento e busca de documentos (RAG)"""
     
-    def __init__(self):
-        self.embeddings = None
-        if LANGCHAIN_AVAILABLE:
-            try:
-                self.embeddings = OpenAIEmbeddings()
-            except:
-                pass
+    def __init__(self, embedding_model: str = "text-embedding-ada-002"):
+        self.embedding_model = embedding_model
+    
+    @property
+    def embeddings(self):
+        """Embedder da base (resolvido sob demanda: OpenAI ou modelo local)"""
+        return get_embedder(self.embedding_model)
     
     async def process_document(
         self,
         file_path: str,
         chunk_size: int = 1000,
-        chunk_overlap: int = 200
+        chunk_overlap: int = 200,
+        executor: Optional[Executor] = None
     ) -> List[Dict[str, Any]]:
-        """Processar documento e dividir em chunks"""
+        """Processar documento e dividir em chunks (fora do event loop)
         
-        if not LANGCHAIN_AVAILABLE:
-            return []
+        `executor` permite usar um pool de processos; por padrão usa o pool
+        de threads do event loop.
+        """
+        chunks = []
+        async for batch in self.iter_chunks(file_path, chunk_size, chunk_overlap, executor):
+            chunks.extend(batch)
+        return chunks
+    
+    async def iter_chunks(
+        self,
+        file_path: str,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        executor: Optional[Executor] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Gerar os chunks do documento em lotes, na ordem do documento
         
-        # Carregar documento baseado na extensão
-        file_ext = Path(file_path).suffix.lower()
+        PDFs são divididos em faixas de PDF_PAGES_PER_TASK páginas processadas
+        em paralelo no `executor`; no máximo 2 faixas por processo ficam em
+        andamento, então a memória não cresce com o tamanho do documento.
+        Outros formatos são processados em uma única tarefa.
+        """
+        loop = asyncio.get_running_loop()
         
-        try:
-            if file_ext == '.pdf':
-                loader = PyPDFLoader(file_path)
-            elif file_ext == '.txt' or file_ext == '.md':
-                loader = TextLoader(file_path)
-            elif file_ext == '.docx':
-                loader = Docx2txtLoader(file_path)
-            else:
-                raise ValueError(f"Tipo de arquivo não suportado: {file_ext}")
-            
-            # Carregar documento
-            documents = loader.load()
-            
-            # Dividir em chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap,
-                length_function=len
+        pages = 0
+        if Path(file_path).suffix.lower() == '.pdf':
+            pages = await loop.run_in_executor(executor, pdf_page_count, file_path)
+        
+        if not pages:
+            yield await loop.run_in_executor(
+                executor, split_document, file_path, chunk_size, chunk_overlap
             )
+            return
+        
+        step = settings.PDF_PAGES_PER_TASK
+        max_in_flight = 2 * (settings.INGESTION_PROCESSES or os.cpu_count() or 1)
+        in_flight = deque()
+        
+        try:
+            for start in range(0, pages, step):
+                in_flight.append(loop.run_in_executor(
+                    executor, split_pdf_pages, file_path, start, start + step,
+                    chunk_size, chunk_overlap
+                ))
+                if len(in_flight) >= max_in_flight:
+                    yield await in_flight.popleft()
             
-            chunks = text_splitter.split_documents(documents)
-            
-            # Retornar chunks processados
-            return [
-                {
-                    "content": chunk.page_content,
-                    "metadata": chunk.metadata
-                }
-                for chunk in chunks
-            ]
+            while in_flight:
+                yield await in_flight.popleft()
+        finally:
+            # Consumidor parou antes do fim: cancelar faixas pendentes
+            for future in in_flight:
+                future.cancel()
+    
+    async def index_chunks(
+        self,
+        kb_id: int,
+        document_id: int,
+        chunks: List[Dict[str, Any]]
+    ) -> List[int]:
+        """Gerar embeddings dos chunks e adicioná-los ao índice da base
         
-        except Exception as e:
-            raise Exception(f"Erro ao processar documento: {str(e)}")
+        Chunks cujo texto já foi indexado nesta base (mesmo sha256) reutilizam
+        o vetor existente; apenas os inéditos vão para o modelo de embeddings.
+        Retorna a linha do índice vetorial de cada chunk.
+        """
+        
+        rows, _ = await self.add_chunks(
+            get_vector_index(kb_id), get_lexical_index(kb_id), document_id, chunks
+        )
+        return rows
+    
+    async def add_chunks(
+        self,
+        index: VectorIndex,
+        lexical_index: LexicalIndex,
+        document_id: int,
+        chunks: List[Dict[str, Any]],
+        reuse: Sequence[VectorIndex] = ()
+    ) -> Tuple[List[int], int]:
+        """Adicionar chunks a um índice, reaproveitando vetores pelo sha256
+        
+        Vetores são procurados no próprio índice e nos de `reuse` antes de
+        chamar o modelo de embeddings. Retorna (linhas, chunks embedados).
+        """
+        
+        if not chunks:
+            return [], 0
+        
+        hashes = [chunk.get("hash") or chunk_hash(chunk["content"]) for chunk in chunks]
+        known: Dict[str, np.ndarray] = {}
+        for source in (index, *reuse):
+            pending = [h for h in hashes if h not in known]
+            if not pending:
+                break
+            known.update(await run_in_threadpool(source.vectors_by_hash, pending))
+        
+        missing = [i for i, h in enumerate(hashes) if h not in known]
+        if missing:
+            embedded = await self.create_embeddings([chunks[i]["content"] for i in missing])
+            for i, vector in zip(missing, embedded):
+                known[hashes[i]] = vector
+        
+        vectors = np.stack([known[h] for h in hashes])
+        payloads = [
+            {"content": chunk["content"], "metadata": chunk.get("metadata", {}), "hash": h}
+            for chunk, h in zip(chunks, hashes)
+        ]
+        
+        total = await run_in_threadpool(
+            index.add, vectors, document_id, payloads, self.embeddings.name
+        )
+        await run_in_threadpool(lexical_index.sync, index)
+        return list(range(total - len(chunks), total)), len(missing)
+    
+    async def copy_document(
+        self,
+        source_kb_id: int,
+        source_document_id: int,
+        kb_id: int,
+        document_id: int
+    ) -> Dict[int, int]:
+        """Copiar vetores já indexados de um documento idêntico (sem re-embedding)
+        
+        Retorna o mapeamento linha de origem -> nova linha no índice da base.
+        """
+        
+        source_index = get_vector_index(source_kb_id)
+        rows, vectors, payloads = await run_in_threadpool(
+            source_index.get_document_rows, source_document_id
+        )
+        if not payloads:
+            return {}
+        
+        index = get_vector_index(kb_id)
+        total = await run_in_threadpool(
+            index.add, vectors, document_id, payloads, source_index.model
+        )
+        await run_in_threadpool(get_lexical_index(kb_id).sync, index)
+        return dict(zip(rows, range(total - len(rows), total)))
+    
+    async def drop_index(self, kb_id: int):
+        """Apagar os índices vetorial e lexical da base (para reindexar do zero)"""
+        close_lexical_index(kb_id)
+        await run_in_threadpool(drop_vector_index, kb_id)
+    
+    async def install_index(self, kb_id: int, staging_path: Path) -> Path:
+        """Mover os índices construídos em `staging_path` para uma nova geração (ainda fora do ar)"""
+        return await run_in_threadpool(install_vector_index, kb_id, staging_path)
+    
+    async def replace_index(self, kb_id: int, generation_path: Path):
+        """Colocar no ar a geração instalada por `install_index`
+        
+        Só troca o ponteiro da geração; buscas em andamento terminam nos
+        índices antigos, apagados quando deixam de ser usados.
+        """
+        await run_in_threadpool(replace_vector_index, kb_id, generation_path)
+        close_lexical_index(kb_id)
+    
+    async def delete_document(self, kb_id: int, document_id: int) -> int:
+        """Remover os chunks de um documento dos índices vetorial e lexical"""
+        index = get_vector_index(kb_id)
+        removed = await run_in_threadpool(index.delete_document, document_id)
+        await run_in_threadpool(get_lexical_index(kb_id).delete_document, document_id)
+        return removed
     
     async def search(
         self,
         query: str,
         kb_id: int,
-        top_k: int = 5
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        rerank_top_n: Optional[int] = None
     ) -> List[Dict[str, Any]]:
-        """Buscar documentos relevantes"""
+        """Buscar documentos relevantes
+        
+        Busca híbrida: vetorial e BM25 em paralelo, rankings fundidos por
+        reciprocal rank fusion (RAG_HYBRID_SEARCH=False usa só a vetorial).
+        Com `rerank_top_n`, os top N candidatos são re-pontuados por um
+        cross-encoder e apenas os top_k melhores são devolvidos.
+        """
+        
+        if not rerank_top_n or rerank_top_n <= top_k:
+            return await self._retrieve(query, kb_id, top_k, document_ids)
+        
+        candidates = await self._retrieve(query, kb_id, rerank_top_n, document_ids)
+        try:
+            reranker = get_reranker()
+        except RuntimeError as e:
+            logger.warning(f"Re-ranking indisponível: {e}")
+            return candidates[:top_k]
         
-        if not LANGCHAIN_AVAILABLE or not self.embeddings:
+        return await reranker.rerank(
+            query, candidates, top_k, settings.RERANK_TIMEOUT_MS / 1000
+        )
+    
+    async def _retrieve(
+        self,
+        query: str,
+        kb_id: int,
+        top_k: int,
+        document_ids: Optional[List[int]]
+    ) -> List[Dict[str, Any]]:
+        index = get_vector_index(kb_id)
+        if not index.count:
             return []
         
         try:
-            # TODO: Implementar busca real usando ChromaDB ou similar
-            # Por enquanto, retorna resposta simulada
-            return [
-                {
-                    "content": f"Conteúdo relevante para: {query}",
-                    "score": 0.95,
-                    "metadata": {"source": "documento.pdf", "page": 1}
-                }
-            ]
+            if not settings.RAG_HYBRID_SEARCH:
+                return await self._vector_search(index, query, top_k, document_ids)
+            
+            # Mais candidatos de cada lado para a fusão
+            candidates = max(top_k * 4, 20)
+            lexical_index = get_lexical_index(kb_id)
+            await run_in_threadpool(lexical_index.sync, index)  # linhas anteriores ao BM25
+            
+            vector_results, lexical_results = await asyncio.gather(
+                self._vector_search(index, query, candidates, document_ids),
+                run_in_threadpool(lexical_index.search, query, candidates, document_ids)
+            )
+            
+            return await run_in_threadpool(
+                self._fuse, index, vector_results, lexical_results, top_k
+            )
         
         except Exception as e:
             raise Exception(f"Erro ao buscar: {str(e)}")
     
+    async def _vector_search(
+        self,
+        index,
+        query: str,
+        top_k: int,
+        document_ids: Optional[List[int]]
+    ) -> List[Dict[str, Any]]:
+        # Consultar com o mesmo modelo usado para indexar
+        embedder = get_embedder(index.model)
+        query_vector = await embedder.embed_query(query)
+        
+        return await run_in_threadpool(
+            index.search, query_vector, top_k, None, document_ids
+        )
+    
+    @staticmethod
+    def _fuse(index, vector_results, lexical_results, top_k: int) -> List[Dict[str, Any]]:
+        """Fundir rankings vetorial e lexical (RRF) e carregar os chunks lexicais"""
+        fused = reciprocal_rank_fusion(
+            [[r["row"] for r in vector_results], [row for row, _ in lexical_results]],
+            k=settings.RAG_RRF_K
+        )
+        top_rows = sorted(fused, key=fused.get, reverse=True)[:top_k]
+        
+        by_row = {r["row"]: r for r in vector_results}
+        missing = [row for row in top_rows if row not in by_row]
+        for chunk in index.get_rows(missing):
+            by_row[chunk["row"]] = chunk
+        
+        bm25_scores = dict(lexical_results)
+        results = []
+        for row in top_rows:
+            if row not in by_row:
+                continue
+            chunk = dict(by_row[row])
+            chunk["vector_score"] = chunk.pop("score", None)
+            chunk["bm25_score"] = bm25_scores.get(row)
+            chunk["score"] = fused[row]
+            results.append(chunk)
+        return results
+    
     async def create_embeddings(
         self,
         texts: List[str]
-    ) -> List[List[float]]:
+    ) -> np.ndarray:
         """Criar embeddings para textos"""
         
-        if not self.embeddings:
-            return []
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
         
         try:
-            return self.embeddings.embed_documents(texts)
+            return await self.embeddings.embed(texts)
         except Exception as e:
             raise Exception(f"Erro ao criar embeddings: {str(e)}")
     
@@ -123,17 +467,20 @@ class RAGService:
         documents: List[str],
         top_k: int = 5
     ) -> List[Dict[str, Any]]:
-        """Busca por similaridade"""
+        """Busca por similaridade (cosseno) em uma lista de textos"""
         
-        # Implementação simplificada
-        # TODO: Implementar busca real com embeddings
+        if not documents:
+            return []
         
-        results = []
-        for i, doc in enumerate(documents[:top_k]):
-            results.append({
-                "content": doc,
-                "score": 1.0 - (i * 0.1),  # Score simulado
-                "index": i
-            })
+        vectors = normalize(await self.create_embeddings([query] + documents))
+        scores = vectors[1:] @ vectors[0]
+        order = np.argsort(-scores)[:top_k]
         
-        return results
+        return [
+            {
+                "content": documents[i],
+                "score": float(scores[i]),
+                "index": int(i)
+            }
+            for i in order
+        ]
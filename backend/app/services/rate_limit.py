@@ -0,0 +1,315 @@
+"""Rate limiting com token buckets (chave de API, usuário e agente)
+
+Cada identidade tem um bucket com capacidade igual ao limite da janela e
+recarga contínua (limite / janela por segundo); uma requisição consome um
+token ou recebe o tempo até o próximo. A checagem é O(1): em memória do
+processo, um dicionário com descarte LRU; com RATE_LIMIT_BACKEND=redis, um
+script Lua atômico por bucket, compartilhado entre workers. Se o Redis
+falhar, os buckets locais assumem por alguns segundos (falha aberta por
+worker, não global).
+
+Limites aplicados pelo middleware (app/middleware.py):
+- chave de API: `ApiKey.rate_limit` requisições por hora;
+- usuário: requisições por minuto do plano (PLAN_REQUESTS_PER_MINUTE);
+- agente: RATE_LIMIT_AGENT_RPM mensagens por minuto no chat público.
+
+O uso das chaves (`total_requests`, `last_used_at`) é acumulado em memória
+e gravado em lote a cada USAGE_FLUSH_INTERVAL segundos (`UsageRecorder`).
+O limite mensal de mensagens do plano (`check_plan_limits`) é verificado no
+chat com a contagem dos rollups diários em cache (`MessageQuota`).
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from calendar import monthrange
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import bindparam, func, select
+
+from app.auth import check_plan_limits
+from app.config import settings
+from app.database import AsyncSessionLocal, async_engine
+from app.models import Agent, AgentDailyStats, ApiKey, User
+from app.services.principal_cache import Principal
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Requisições por minuto por usuário (0 = ilimitado)
+PLAN_REQUESTS_PER_MINUTE = {
+    "starter": 60,
+    "pro": 300,
+    "business": 1200,
+    "enterprise": 0
+}
+
+# Buckets guardados em memória (os mais antigos são descartados já cheios)
+MAX_BUCKETS = 100000
+
+# Segundos usando buckets locais depois de uma falha do Redis
+REDIS_RETRY_AFTER = 30
+
+# Retorna 0 se o token foi consumido ou os segundos até haver um disponível
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+def plan_requests_per_minute(plan: str) -> int:
+    return PLAN_REQUESTS_PER_MINUTE.get(plan, PLAN_REQUESTS_PER_MINUTE["starter"])
+
+
+class MemoryBuckets:
+    """Token buckets em memória do processo"""
+
+    def __init__(self, max_buckets: int):
+        self.max_buckets = max_buckets
+        self.buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # chave -> (tokens, instante)
+
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+
+        self.buckets[key] = (tokens, now)
+        self.buckets.move_to_end(key)
+        if len(self.buckets) > self.max_buckets:
+            self.buckets.popitem(last=False)
+        return wait
+
+
+class RateLimiter:
+    """Token buckets por identidade, em memória ou no Redis"""
+
+    def __init__(self, backend: str, redis_url: str):
+        self.local = MemoryBuckets(MAX_BUCKETS)
+        self.redis = None
+        self.script = None
+        self.redis_down_until = 0.0
+        self.counters = {"allowed": 0, "limited": 0, "redis_errors": 0}
+
+        if backend == "redis":
+            if REDIS_AVAILABLE:
+                self.redis = aioredis.from_url(redis_url)
+                self.script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+            else:
+                logger.warning("Pacote redis não instalado, usando rate limiting em memória")
+
+    async def take(self, key: str, limit: int, window: float) -> float:
+        """Consumir um token do bucket `key`; 0 = permitido, senão segundos de espera"""
+        rate = limit / window
+        wait = None
+        if self.script is not None and time.monotonic() >= self.redis_down_until:
+            try:
+                wait = float(await self.script(keys=[f"ratelimit:{key}"], args=[limit, rate]))
+            except Exception as e:
+                self.counters["redis_errors"] += 1
+                self.redis_down_until = time.monotonic() + REDIS_RETRY_AFTER
+                logger.warning(f"Redis indisponível para rate limiting, usando buckets locais: {e}")
+
+        if wait is None:
+            wait = self.local.take(key, limit, rate)
+
+        self.counters["limited" if wait else "allowed"] += 1
+        return wait
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            **self.counters,
+            "backend": "redis" if self.script is not None else "memory",
+            "local_buckets": len(self.local.buckets)
+        }
+
+
+@dataclass(frozen=True)
+class ApiKeyPrincipal:
+    """Chave de API válida e o plano do dono"""
+    id: int
+    user_id: int
+    rate_limit: int
+    plan: str
+
+
+class ApiKeyCache:
+    """Resolução de chaves de API com TTL (a chave é guardada apenas como sha256)"""
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[Optional[ApiKeyPrincipal], float]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[ApiKeyPrincipal]:
+        """Chave ativa e não expirada, ou None"""
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        cached = self.entries.get(digest)
+        if cached and cached[1] > time.monotonic():
+            self.entries.move_to_end(digest)
+            return cached[0]
+
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(
+                select(ApiKey.id, ApiKey.user_id, ApiKey.rate_limit, ApiKey.expires_at, User.plan)
+                .join(User, User.id == ApiKey.user_id)
+                .where(ApiKey.key == key, ApiKey.is_active == True, User.is_active == True)
+            )).first()
+
+        principal = None
+        if row and (row.expires_at is None or row.expires_at > datetime.utcnow()):
+            principal = ApiKeyPrincipal(row.id, row.user_id, row.rate_limit or 0, row.plan)
+
+        # Chaves inválidas também ficam em cache (evita uma consulta por tentativa)
+        self.entries[digest] = (principal, time.monotonic() + self.ttl)
+        self.entries.move_to_end(digest)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return principal
+
+
+class UsageRecorder:
+    """Contadores de uso das chaves de API, gravados no banco em lote"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.pending: Dict[int, Tuple[int, datetime]] = {}  # chave -> (requisições, último uso)
+        self.task: Optional[asyncio.Task] = None
+
+    def record_api_key(self, api_key_id: int):
+        count, _ = self.pending.get(api_key_id, (0, None))
+        self.pending[api_key_id] = (count + 1, datetime.utcnow())
+
+    async def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        await self.flush()
+
+    async def flush(self) -> int:
+        """Gravar os contadores acumulados (UPDATE ... SET total = total + n)"""
+        if not self.pending:
+            return 0
+
+        batch, self.pending = self.pending, {}
+        table = ApiKey.__table__
+        statement = table.update().where(table.c.id == bindparam("key_id")).values(
+            total_requests=func.coalesce(table.c.total_requests, 0) + bindparam("requests"),
+            last_used_at=bindparam("used_at")
+        )
+        try:
+            async with async_engine.begin() as conn:
+                await conn.execute(statement, [
+                    {"key_id": key_id, "requests": count, "used_at": used_at}
+                    for key_id, (count, used_at) in batch.items()
+                ])
+        except Exception:
+            # Devolver ao acumulador para a próxima rodada
+            for key_id, (count, used_at) in batch.items():
+                pending_count, pending_used_at = self.pending.get(key_id, (0, used_at))
+                self.pending[key_id] = (count + pending_count, max(used_at, pending_used_at))
+            raise
+        return len(batch)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Erro ao gravar uso das chaves de API: {e}")
+
+
+class MessageQuota:
+    """Limite mensal de mensagens do plano do dono do agente
+
+    A contagem do mês vem dos rollups diários (`agent_daily_stats.messages`)
+    e fica em cache por USAGE_REFRESH_INTERVAL segundos; entre as leituras,
+    os turnos aceitos por este worker são somados localmente.
+    """
+
+    def __init__(self, refresh_interval: int):
+        self.refresh_interval = refresh_interval
+        self.entries: Dict[int, Tuple[Principal, int, date, float]] = {}  # dono -> (usuário, usadas, mês, validade)
+
+    async def allow(self, owner_id: int, messages: int = 2) -> Tuple[bool, int]:
+        """Reservar `messages` da cota do dono; retorna (permitido, segundos até o próximo mês)"""
+        month = datetime.utcnow().date().replace(day=1)
+        entry = self.entries.get(owner_id)
+        if entry is None or entry[2] != month or entry[3] <= time.monotonic():
+            entry = await self._load(owner_id, month)
+
+        owner, used, _, expires = entry
+        if owner is not None and not check_plan_limits(owner, "messages", used):
+            return False, _seconds_until_next_month(month)
+
+        self.entries[owner_id] = (owner, used + messages, month, expires)
+        return True, 0
+
+    def invalidate(self, owner_id: int):
+        self.entries.pop(owner_id, None)
+
+    async def _load(self, owner_id: int, month: date):
+        async with AsyncSessionLocal() as db:
+            user = await db.get(User, owner_id)
+            used = await db.scalar(
+                select(func.coalesce(func.sum(AgentDailyStats.messages), 0))
+                .join(Agent, Agent.id == AgentDailyStats.agent_id)
+                .where(Agent.owner_id == owner_id, AgentDailyStats.day >= month)
+            )
+        owner = Principal.from_user(user) if user else None
+        entry = (owner, used or 0, month, time.monotonic() + self.refresh_interval)
+        self.entries[owner_id] = entry
+        return entry
+
+
+def _seconds_until_next_month(month: date) -> int:
+    next_month = datetime.combine(month, datetime.min.time()) + timedelta(days=monthrange(month.year, month.month)[1])
+    return max(int((next_month - datetime.utcnow()).total_seconds()), 1)
+
+
+rate_limiter = RateLimiter(
+    backend=settings.RATE_LIMIT_BACKEND,
+    redis_url=settings.REDIS_URL
+)
+api_key_cache = ApiKeyCache(ttl=settings.PRINCIPAL_CACHE_TTL, max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES)
+usage_recorder = UsageRecorder(interval=settings.USAGE_FLUSH_INTERVAL)
+message_quota = MessageQuota(refresh_interval=settings.USAGE_REFRESH_INTERVAL)
@@ -0,0 +1,92 @@
+"""Re-ranking de candidatos com cross-encoder local (CPU)
+
+O cross-encoder pontua cada par (consulta, chunk) em conjunto, o que é mais
+preciso que a similaridade de embeddings, porém mais caro; por isso só os
+top N candidatos da busca são re-pontuados. Os pares são processados em
+lotes até o limite de latência: candidatos não pontuados a tempo seguem
+depois dos pontuados, na ordem original.
+"""
+
+import logging
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+
+# Imports condicionais (modelo local é opcional)
+try:
+    from sentence_transformers import CrossEncoder
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class Reranker:
+    """Cross-encoder carregado sob demanda (uma instância por modelo)"""
+
+    def __init__(self, model: str):
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            raise RuntimeError("sentence-transformers não instalado")
+        self.name = model
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _rerank(
+        self,
+        query: str,
+        candidates: List[Dict[str, Any]],
+        top_k: int,
+        timeout: float
+    ) -> List[Dict[str, Any]]:
+        deadline = time.perf_counter() + timeout
+        batch_size = settings.RERANK_BATCH_SIZE
+
+        # Um cálculo por vez no modelo compartilhado
+        with self._lock:
+            if self._model is None:
+                self._model = CrossEncoder(self.name, device="cpu")
+
+            scores: List[float] = []
+            for start in range(0, len(candidates), batch_size):
+                if scores and time.perf_counter() >= deadline:
+                    break
+                batch = candidates[start:start + batch_size]
+                scores.extend(float(score) for score in self._model.predict(
+                    [(query, chunk["content"]) for chunk in batch],
+                    batch_size=batch_size,
+                    show_progress_bar=False
+                ))
+
+        scored = [dict(chunk, rerank_score=score) for chunk, score in zip(candidates, scores)]
+        scored.sort(key=lambda chunk: chunk["rerank_score"], reverse=True)
+
+        if len(scores) < len(candidates):
+            logger.info(
+                f"Re-ranking interrompido pelo limite de latência "
+                f"({len(scores)}/{len(candidates)} candidatos)"
+            )
+        return (scored + candidates[len(scores):])[:top_k]
+
+    async def rerank(
+        self,
+        query: str,
+        candidates: List[Dict[str, Any]],
+        top_k: int,
+        timeout: float
+    ) -> List[Dict[str, Any]]:
+        """Reordenar candidatos pela pontuação do cross-encoder e devolver top_k"""
+        if len(candidates) <= 1:
+            return candidates[:top_k]
+        return await run_in_threadpool(self._rerank, query, candidates, top_k, timeout)
+
+
+@lru_cache(maxsize=4)
+def get_reranker(model: str = None) -> Reranker:
+    """Obter reranker (instância única por modelo no processo)"""
+    return Reranker(model or settings.RERANK_MODEL)
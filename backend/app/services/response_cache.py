@@ -0,0 +1,228 @@
+"""Cache de respostas por agente
+
+Perguntas repetidas (a primeira de uma conversa) são respondidas do cache em
+vez de chamar o LLM. As entradas ficam no namespace (agente, versão, modelo,
+temperatura, contexto): editar o agente incrementa `Agent.version` e as
+respostas antigas deixam de valer; o contexto é um hash do system prompt
+enviado ao modelo (com o bloco RAG), então mudanças nos trechos
+recuperados também geram outra entrada.
+
+A busca é exata (pergunta normalizada) e, se habilitada, por similaridade
+de embeddings acima de um limiar (o embedding de uma pergunta que deu miss
+é guardado para o `store` da resposta, sem segunda chamada ao modelo).
+Entradas expiram por TTL e o total é limitado com descarte LRU.
+
+Configuração global em Settings (RESPONSE_CACHE_*) e por agente em
+`Agent.guardrails["cache"]`, por exemplo:
+
+    {"cache": {"enabled": true, "ttl": 3600, "semantic": true, "threshold": 0.95}}
+"""
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.models import Agent
+from app.services.embeddings import get_embedder
+from app.services.vector_index import normalize
+
+logger = logging.getLogger(__name__)
+
+Namespace = Tuple[int, int, str, float, str]
+
+# LLMService devolve mensagens de erro como texto; não guardar
+ERROR_PREFIXES = ("⚠️", "Erro ao gerar resposta")
+
+
+def normalize_question(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+@dataclass
+class CachePolicy:
+    """Política de cache de respostas de um agente"""
+    enabled: bool
+    ttl: int
+    semantic: bool
+    threshold: float
+
+    @classmethod
+    def from_agent(cls, agent: Agent) -> "CachePolicy":
+        config = (agent.guardrails or {}).get("cache", {})
+        return cls(
+            enabled=settings.RESPONSE_CACHE_ENABLED and bool(config.get("enabled", True)),
+            ttl=int(config.get("ttl", settings.RESPONSE_CACHE_TTL)),
+            semantic=bool(config.get("semantic", settings.RESPONSE_CACHE_SEMANTIC)),
+            threshold=float(config.get("threshold", settings.RESPONSE_CACHE_THRESHOLD))
+        )
+
+
+@dataclass
+class CacheEntry:
+    response: str
+    vector: Optional[np.ndarray]
+    expires_at: float
+
+
+class ResponseCache:
+    """Cache em memória do processo, com LRU global e índice por namespace"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple[Namespace, str], CacheEntry]" = OrderedDict()
+        self.namespaces: Dict[Namespace, Dict[str, CacheEntry]] = {}
+        # Embeddings de perguntas que deram miss, reaproveitados pelo `store` seguinte
+        self.pending: "OrderedDict[Tuple[Namespace, str], np.ndarray]" = OrderedDict()
+        self.stats: Dict[int, Dict[str, int]] = {}
+        self.semantic_available = True
+
+    @staticmethod
+    def namespace(agent: Agent, context: Optional[str] = None) -> Namespace:
+        context_hash = hashlib.sha256((context or "").encode("utf-8")).hexdigest()[:16]
+        return (agent.id, agent.version or 1, agent.model, float(agent.temperature or 0.0), context_hash)
+
+    async def lookup(self, agent: Agent, question: str, context: Optional[str] = None) -> Optional[str]:
+        """Resposta em cache para a pergunta (ou None), contabilizando hit/miss"""
+        policy = CachePolicy.from_agent(agent)
+        if not policy.enabled:
+            return None
+
+        namespace = self.namespace(agent, context)
+        key = normalize_question(question)
+
+        entry = self._get(namespace, key)
+        if entry:
+            self._record(agent.id, "exact_hits")
+            return entry.response
+
+        if policy.semantic and self.namespaces.get(namespace):
+            vector = await self._embed(key)
+            entry = self._most_similar(namespace, vector, policy.threshold)
+            if entry:
+                self._record(agent.id, "semantic_hits")
+                return entry.response
+            if vector is not None:
+                self._remember(namespace, key, vector)
+
+        self._record(agent.id, "misses")
+        return None
+
+    async def store(self, agent: Agent, question: str, response: str, context: Optional[str] = None):
+        policy = CachePolicy.from_agent(agent)
+        if not policy.enabled or not response or response.startswith(ERROR_PREFIXES):
+            return
+
+        namespace = self.namespace(agent, context)
+        key = normalize_question(question)
+        vector = self.pending.pop((namespace, key), None)
+        if vector is None and policy.semantic:
+            vector = await self._embed(key)
+
+        entry = CacheEntry(response=response, vector=vector, expires_at=time.time() + policy.ttl)
+        self.entries[(namespace, key)] = entry
+        self.entries.move_to_end((namespace, key))
+        self.namespaces.setdefault(namespace, {})[key] = entry
+
+        while len(self.entries) > self.max_entries:
+            (old_namespace, old_key), _ = self.entries.popitem(last=False)
+            self._discard(old_namespace, old_key)
+
+    def invalidate_agent(self, agent_id: int) -> int:
+        """Remover todas as entradas de um agente (todas as versões)"""
+        removed = 0
+        for pending in [pk for pk in self.pending if pk[0][0] == agent_id]:
+            del self.pending[pending]
+        for namespace in [ns for ns in self.namespaces if ns[0] == agent_id]:
+            for key in self.namespaces.pop(namespace):
+                self.entries.pop((namespace, key), None)
+                removed += 1
+        return removed
+
+    def agent_stats(self, agent_id: int) -> Dict[str, float]:
+        stats = self.stats.get(agent_id, {})
+        hits = stats.get("exact_hits", 0) + stats.get("semantic_hits", 0)
+        misses = stats.get("misses", 0)
+        return {
+            "hits": hits,
+            "exact_hits": stats.get("exact_hits", 0),
+            "semantic_hits": stats.get("semantic_hits", 0),
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses) * 100, 2) if hits + misses else 0.0
+        }
+
+    def _get(self, namespace: Namespace, key: str) -> Optional[CacheEntry]:
+        entry = self.entries.get((namespace, key))
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            self.entries.pop((namespace, key), None)
+            self._discard(namespace, key)
+            return None
+        self.entries.move_to_end((namespace, key))
+        return entry
+
+    def _most_similar(
+        self,
+        namespace: Namespace,
+        vector: Optional[np.ndarray],
+        threshold: float
+    ) -> Optional[CacheEntry]:
+        if vector is None:
+            return None
+
+        now = time.time()
+        candidates = [
+            (key, entry) for key, entry in self.namespaces.get(namespace, {}).items()
+            if entry.vector is not None and entry.expires_at > now
+        ]
+        if not candidates:
+            return None
+
+        scores = np.stack([entry.vector for _, entry in candidates]) @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+
+        key, entry = candidates[best]
+        self.entries.move_to_end((namespace, key))
+        return entry
+
+    async def _embed(self, text: str) -> Optional[np.ndarray]:
+        if not self.semantic_available:
+            return None
+        try:
+            embedder = get_embedder(settings.RESPONSE_CACHE_EMBEDDING_MODEL)
+            return normalize(await embedder.embed_query(text))
+        except RuntimeError as e:
+            # Sem modelo de embeddings disponível: apenas busca exata
+            logger.warning(f"Cache de respostas sem busca semântica: {e}")
+            self.semantic_available = False
+        except Exception as e:
+            logger.warning(f"Erro ao gerar embedding da pergunta: {e}")
+        return None
+
+    def _remember(self, namespace: Namespace, key: str, vector: np.ndarray):
+        self.pending[(namespace, key)] = vector
+        self.pending.move_to_end((namespace, key))
+        while len(self.pending) > self.max_entries:
+            self.pending.popitem(last=False)
+
+    def _discard(self, namespace: Namespace, key: str):
+        entries = self.namespaces.get(namespace)
+        if entries is not None:
+            entries.pop(key, None)
+            if not entries:
+                del self.namespaces[namespace]
+
+    def _record(self, agent_id: int, counter: str):
+        stats = self.stats.setdefault(agent_id, {})
+        stats[counter] = stats.get(counter, 0) + 1
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_ENTRIES)
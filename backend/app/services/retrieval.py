@@ -0,0 +1,195 @@
+"""Recuperação automática de contexto (RAG) para o chat
+
+Para agentes com bases de conhecimento ativas, a busca é disparada no
+início do turno e roda em paralelo com a montagem do histórico. O turno
+espera no máximo o orçamento de latência do agente; se a busca não terminar
+a tempo, segue sem contexto e o status fica registrado.
+
+Configuração global em Settings (RAG_CHAT_*) e por agente em
+`Agent.guardrails["rag"]`, por exemplo:
+
+    {"rag": {"enabled": true, "top_k": 4, "latency_budget_ms": 150, "max_tokens": 1500}}
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import Agent, KnowledgeBase
+from app.services.context import count_tokens
+from app.services.rag import RAGService
+
+logger = logging.getLogger(__name__)
+
+# Status da recuperação registrados em Message.metadata["rag"]
+OK = "ok"
+TIMEOUT = "timeout"
+ERROR = "error"
+
+
+@dataclass
+class RetrievalPolicy:
+    """Política de recuperação de contexto de um agente"""
+    enabled: bool
+    top_k: int
+    latency_budget_ms: int
+    max_tokens: int
+
+    @classmethod
+    def from_agent(cls, agent: Agent) -> "RetrievalPolicy":
+        config = (agent.guardrails or {}).get("rag", {})
+        return cls(
+            enabled=settings.RAG_CHAT_ENABLED and bool(config.get("enabled", True)),
+            top_k=max(int(config.get("top_k", settings.RAG_CHAT_TOP_K)), 1),
+            latency_budget_ms=int(config.get("latency_budget_ms", settings.RAG_CHAT_LATENCY_BUDGET_MS)),
+            max_tokens=int(config.get("max_tokens", settings.RAG_CHAT_MAX_TOKENS))
+        )
+
+
+@dataclass
+class RetrievalResult:
+    status: str
+    latency_ms: float
+    chunks: List[Dict[str, Any]] = field(default_factory=list)
+    error: Optional[str] = None
+
+    def context_block(self, model: str, max_tokens: int) -> Optional[str]:
+        """Trechos recuperados formatados para o system prompt (dentro do limite)"""
+        parts = []
+        budget = max_tokens
+        for i, chunk in enumerate(self.chunks, start=1):
+            text = f"[{i}] {chunk['content']}"
+            tokens = count_tokens(text, model)
+            if parts and tokens > budget:
+                break
+            parts.append(text)
+            budget -= tokens
+
+        if not parts:
+            return None
+        return "Informações relevantes da base de conhecimento:\n" + "\n\n".join(parts)
+
+    def to_metadata(self) -> Dict[str, Any]:
+        """Registro para auditoria (Message.metadata["rag"])"""
+        metadata = {
+            "status": self.status,
+            "latency_ms": round(self.latency_ms, 1),
+            "chunks": [
+                {
+                    "knowledge_base_id": chunk["knowledge_base_id"],
+                    "document_id": chunk.get("document_id"),
+                    "row": chunk.get("row"),
+                    "score": chunk.get("score"),
+                    "vector_score": chunk.get("vector_score"),
+                    "bm25_score": chunk.get("bm25_score"),
+                    "rerank_score": chunk.get("rerank_score"),
+                    "content": chunk["content"]
+                }
+                for chunk in self.chunks
+            ]
+        }
+        if self.error:
+            metadata["error"] = self.error
+        return metadata
+
+
+class ContextRetriever:
+    """Busca nas bases do agente, iniciada em background e limitada por prazo"""
+
+    def __init__(
+        self,
+        knowledge_bases: List[Tuple[int, str, Optional[int]]],
+        policy: RetrievalPolicy
+    ):
+        self.knowledge_bases = knowledge_bases
+        self.policy = policy
+        self._task: Optional[asyncio.Task] = None
+        self._started_at = 0.0
+
+    @classmethod
+    async def for_agent(cls, db: AsyncSession, agent: Agent) -> Optional["ContextRetriever"]:
+        """Retriever do agente, ou None se não há bases ativas ou RAG desligado"""
+        policy = RetrievalPolicy.from_agent(agent)
+        if not policy.enabled:
+            return None
+
+        result = await db.execute(
+            select(
+                KnowledgeBase.id,
+                KnowledgeBase.embedding_model,
+                KnowledgeBase.rerank_enabled,
+                KnowledgeBase.rerank_top_n
+            ).where(
+                KnowledgeBase.agent_id == agent.id,
+                KnowledgeBase.is_active == True,
+                KnowledgeBase.total_chunks > 0
+            )
+        )
+        knowledge_bases = result.all()
+        if not knowledge_bases:
+            return None
+
+        return cls([
+            (kb_id, model, rerank_top_n if rerank_enabled else None)
+            for kb_id, model, rerank_enabled, rerank_top_n in knowledge_bases
+        ], policy)
+
+    async def start(self, query: str):
+        """Disparar a busca em background
+        
+        Cede o event loop uma vez para a busca chegar à primeira operação de
+        I/O (embedding da consulta) antes de o chamador seguir com o histórico.
+        """
+        self._started_at = time.perf_counter()
+        self._task = asyncio.create_task(self._search(query))
+        await asyncio.sleep(0)
+
+    async def result(self) -> RetrievalResult:
+        """Aguardar a busca até o fim do orçamento de latência"""
+        remaining = self.policy.latency_budget_ms / 1000 - (time.perf_counter() - self._started_at)
+
+        try:
+            chunks = await asyncio.wait_for(self._task, timeout=max(remaining, 0))
+            status, error = OK, None
+        except asyncio.TimeoutError:
+            chunks, status, error = [], TIMEOUT, None
+        except Exception as e:
+            chunks, status, error = [], ERROR, str(e)
+
+        result = RetrievalResult(
+            status=status,
+            latency_ms=(time.perf_counter() - self._started_at) * 1000,
+            chunks=chunks,
+            error=error
+        )
+        if status != OK:
+            logger.info(
+                f"Turno seguiu sem contexto RAG ({status} em {result.latency_ms:.0f}ms)"
+                + (f": {error}" if error else "")
+            )
+        return result
+
+    async def _search(self, query: str) -> List[Dict[str, Any]]:
+        async def search_kb(kb_id: int, embedding_model: str, rerank_top_n: Optional[int]):
+            results = await RAGService(embedding_model).search(
+                query, kb_id, self.policy.top_k, rerank_top_n=rerank_top_n
+            )
+            return [
+                dict(chunk, knowledge_base_id=kb_id, rank=rank)
+                for rank, chunk in enumerate(results)
+            ]
+
+        per_kb = await asyncio.gather(*(
+            search_kb(*kb) for kb in self.knowledge_bases
+        ))
+
+        # Intercalar as bases pela posição (a ordem de cada base pode vir do re-ranking)
+        chunks = [chunk for results in per_kb for chunk in results]
+        chunks.sort(key=lambda chunk: (chunk.pop("rank"), -chunk["score"]))
+        return chunks[:self.policy.top_k]
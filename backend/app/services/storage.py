@@ -0,0 +1,95 @@
+"""Armazenamento de arquivos enviados (uploads)
+
+Os arquivos são endereçados pelo conteúdo: cada upload é gravado uma única
+vez em UPLOAD_DIR/blobs/<sha256[:2]>/<sha256><ext>, e todos os documentos
+com o mesmo conteúdo apontam para o mesmo blob. Os chunks extraídos ficam
+na tabela `chunks` (ver app/services/chunk_store.py).
+"""
+
+import hashlib
+import os
+import uuid
+from typing import Tuple
+
+import aiofiles
+from fastapi import UploadFile
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Document
+
+# Tamanho do bloco lido/gravado por vez (memória constante por upload)
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+class FileTooLargeError(Exception):
+    """Upload excedeu o tamanho máximo permitido"""
+
+
+async def save_upload(upload: UploadFile, file_path: str, max_size: int) -> Tuple[int, str]:
+    """Gravar upload em disco em blocos, calculando o SHA-256 no caminho
+
+    Interrompe assim que o tamanho passa de `max_size` e remove o arquivo
+    parcial em qualquer falha. Retorna (tamanho em bytes, sha256 hex).
+    """
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiofiles.open(file_path, "wb") as out:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if size > max_size:
+                    raise FileTooLargeError(f"Arquivo excede {max_size} bytes")
+
+                digest.update(chunk)
+                await out.write(chunk)
+
+    except BaseException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+
+    return size, digest.hexdigest()
+
+
+def blob_path(content_hash: str, file_ext: str) -> str:
+    """Caminho do blob endereçado pelo conteúdo"""
+    return os.path.join(settings.UPLOAD_DIR, "blobs", content_hash[:2], f"{content_hash}{file_ext}")
+
+
+async def store_upload(upload: UploadFile, file_ext: str, max_size: int) -> Tuple[str, int, str]:
+    """Gravar upload como blob endereçado pelo conteúdo
+
+    Retorna (caminho do blob, tamanho, sha256). Se o blob já existe, o
+    arquivo recém-recebido é descartado.
+    """
+    tmp_dir = os.path.join(settings.UPLOAD_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, f"{uuid.uuid4()}{file_ext}")
+
+    size, content_hash = await save_upload(upload, tmp_path, max_size)
+
+    file_path = blob_path(content_hash, file_ext)
+    if os.path.exists(file_path):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        os.replace(tmp_path, file_path)
+
+    return file_path, size, content_hash
+
+
+def release_blob(db: Session, document: Document):
+    """Remover o blob do documento se nenhum outro documento o referencia"""
+    shared = db.query(Document.id).filter(
+        Document.file_path == document.file_path,
+        Document.id != document.id
+    ).first()
+
+    if not shared and os.path.exists(document.file_path):
+        os.remove(document.file_path)
@@ -0,0 +1,72 @@
+"""Limite de tentativas de login por IP
+
+Janela deslizante em memória do processo: cada IP pode fazer até
+LOGIN_RATE_LIMIT tentativas (com sucesso ou não) a cada LOGIN_RATE_WINDOW
+segundos; acima disso a rota responde 429 com Retry-After antes de consultar
+o banco ou gastar CPU com bcrypt.
+
+O IP vem da conexão; atrás de um proxy reverso confiável, TRUST_PROXY_HEADERS
+faz usar o primeiro endereço de X-Forwarded-For.
+"""
+
+import time
+from collections import deque
+from typing import Deque, Dict
+
+from fastapi import Request
+
+from app.config import settings
+
+# Acima disso, IPs sem tentativas recentes são descartados
+MAX_TRACKED_IPS = 10000
+
+
+def client_ip(request: Request) -> str:
+    """IP do cliente (X-Forwarded-For apenas se o proxy for confiável)"""
+    if settings.TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+class LoginThrottle:
+    """Janela deslizante de tentativas por IP"""
+
+    def __init__(self, limit: int, window: int):
+        self.limit = limit
+        self.window = window
+        self.attempts: Dict[str, Deque[float]] = {}
+        self.blocked = 0
+
+    def hit(self, ip: str) -> int:
+        """Registrar uma tentativa; retorna 0 se permitida ou os segundos até liberar"""
+        if self.limit <= 0:
+            return 0
+
+        now = time.monotonic()
+        attempts = self.attempts.get(ip)
+        if attempts is None:
+            if len(self.attempts) >= MAX_TRACKED_IPS:
+                self._prune(now)
+            attempts = self.attempts[ip] = deque()
+
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+
+        if len(attempts) >= self.limit:
+            self.blocked += 1
+            return max(int(attempts[0] + self.window - now) + 1, 1)
+
+        attempts.append(now)
+        return 0
+
+    def _prune(self, now: float):
+        for ip in [ip for ip, attempts in self.attempts.items() if not attempts or attempts[-1] <= now - self.window]:
+            del self.attempts[ip]
+
+
+login_throttle = LoginThrottle(
+    limit=settings.LOGIN_RATE_LIMIT,
+    window=settings.LOGIN_RATE_WINDOW
+)
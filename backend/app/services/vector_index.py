@@ -0,0 +1,565 @@
+"""Índice vetorial persistente por base de conhecimento
+
+Cada KnowledgeBase tem um diretório próprio em VECTOR_INDEX_DIR com arquivos
+binários append-only, lidos via memory-map:
+
+    manifest.json   dimensão, modelo de embeddings, total de linhas, IVF
+    vectors.f32     embeddings normalizados (n x dim, float32)
+    doc_ids.i64     documento de cada linha
+    alive.u8        1 = ativo, 0 = removido (tombstone)
+    offsets.i64     posição de cada payload em payloads.jsonl
+    payloads.jsonl  conteúdo e metadados de cada chunk
+    hashes.bin      sha256 (32 bytes) do texto de cada chunk
+    centroids.npy   centróides do IVF (quando treinado)
+    assign.i32      lista IVF de cada linha
+
+O re-chunking constrói um índice novo em outro diretório (uma nova geração,
+`kb_<id>.g<n>`) e o coloca no ar trocando o ponteiro `kb_<id>.current`.
+Cada objeto `VectorIndex` lê sempre o seu próprio diretório e, depois de
+carregado, mantém os arquivos abertos; a geração antiga só é apagada quando
+o último objeto que a usa é liberado (buscas em andamento terminam nela).
+
+Até VECTOR_IVF_MIN_VECTORS linhas a busca é exata (produto interno em blocos
+sobre o memmap). Acima disso um IVF (k-means esférico) é treinado e a busca
+visita apenas as VECTOR_IVF_NPROBE listas mais próximas da consulta. Como os
+vetores são normalizados, o produto interno é a similaridade de cosseno.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import weakref
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Linhas processadas por bloco na busca exata (limita memória por consulta)
+SEARCH_BLOCK_ROWS = 65536
+
+# Tamanho máximo da amostra usada para treinar o k-means do IVF
+KMEANS_MAX_SAMPLE = 131072
+
+HASH_BYTES = 32
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Normalizar vetores (L2) para que produto interno = cosseno"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Índices dos k maiores scores, em ordem decrescente"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def _hash_bytes(chunk_hash: Optional[str]) -> bytes:
+    """sha256 hex -> 32 bytes (zeros quando o chunk não tem hash)"""
+    return bytes.fromhex(chunk_hash) if chunk_hash else bytes(HASH_BYTES)
+
+
+def train_kmeans(sample: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """K-means esférico (centróides normalizados) sobre uma amostra"""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=nlist)
+
+        # Listas vazias recebem um ponto aleatório da amostra
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+
+        centroids = normalize(sums)
+
+    return centroids
+
+
+class VectorIndex:
+    """Índice vetorial de uma base de conhecimento"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock = threading.RLock()
+        self._state = None
+        self._hash_rows: Optional[Dict[bytes, int]] = None
+        self.retired = False
+        self.manifest = self._load_manifest()
+
+    # Persistência
+
+    def _file(self, name: str) -> Path:
+        return self.path / name
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        manifest_path = self._file("manifest.json")
+        if manifest_path.exists():
+            return json.loads(manifest_path.read_text())
+        return {"dim": None, "model": None, "count": 0, "nlist": 0, "trained_count": 0}
+
+    def _save_manifest(self):
+        tmp_path = self._file("manifest.json.tmp")
+        tmp_path.write_text(json.dumps(self.manifest))
+        tmp_path.replace(self._file("manifest.json"))
+
+    def _read_array(self, name: str, dtype) -> np.ndarray:
+        file_path = self._file(name)
+        if not file_path.exists():
+            return np.empty(0, dtype=dtype)
+        # O manifest é gravado por último: linhas além de `count` são de uma escrita interrompida
+        return np.fromfile(file_path, dtype=dtype, count=self.count)
+
+    def _load_state(self) -> Dict[str, Any]:
+        """Carregar arrays por linha (pequenos), memmaps e o arquivo de payloads
+
+        Quem usa o estado segura os arquivos abertos: o diretório pode ser
+        apagado (geração substituída) sem afetar uma leitura em andamento.
+        """
+        if self._state is not None:
+            return self._state
+
+        state = {
+            "vectors": None,
+            "doc_ids": self._read_array("doc_ids.i64", np.int64),
+            "alive": self._read_array("alive.u8", np.uint8).astype(bool),
+            "offsets": None,
+            "payloads": None,
+            "assign": None,
+            "centroids": None,
+        }
+
+        if self.count:
+            state["vectors"] = np.memmap(
+                self._file("vectors.f32"), dtype=np.float32, mode="r",
+                shape=(self.count, self.dim)
+            )
+            state["offsets"] = self._read_array("offsets.i64", np.int64)
+            # Fechado quando o último estado que o referencia é liberado
+            state["payloads"] = open(self._file("payloads.jsonl"), "rb")
+
+        if self.manifest["nlist"]:
+            state["centroids"] = np.load(self._file("centroids.npy"))
+            state["assign"] = self._read_array("assign.i32", np.int32)
+
+        self._state = state
+        return state
+
+    @property
+    def count(self) -> int:
+        return self.manifest["count"]
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self.manifest["dim"]
+
+    @property
+    def model(self) -> Optional[str]:
+        return self.manifest["model"]
+
+    @property
+    def alive_count(self) -> int:
+        with self.lock:
+            return int(self._load_state()["alive"].sum())
+
+    # Escrita
+
+    def _check_writable(self):
+        if self.retired:
+            raise RuntimeError(f"Índice substituído por uma nova geração: {self.path}")
+
+    def retire(self):
+        """Marcar a geração como substituída e apagá-la quando o objeto for liberado"""
+        with self.lock:
+            self.retired = True
+            weakref.finalize(self, shutil.rmtree, str(self.path), True)
+
+    def add(
+        self,
+        vectors: np.ndarray,
+        document_id: int,
+        payloads: List[Dict[str, Any]],
+        model: str
+    ) -> int:
+        """Adicionar vetores de um documento. Retorna o total de linhas"""
+        vectors = normalize(vectors)
+        if len(vectors) != len(payloads):
+            raise ValueError("Número de vetores e payloads diferente")
+        if not len(vectors):
+            return self.count
+
+        with self.lock:
+            self._check_writable()
+            if self.dim is None:
+                self.path.mkdir(parents=True, exist_ok=True)
+                self.manifest["dim"] = int(vectors.shape[1])
+                self.manifest["model"] = model
+            elif vectors.shape[1] != self.dim or model != self.model:
+                raise ValueError(
+                    f"Embeddings incompatíveis com o índice ({model}, dim {vectors.shape[1]}); "
+                    f"índice usa {self.model}, dim {self.dim}"
+                )
+
+            self._truncate_to_count()
+
+            with open(self._file("payloads.jsonl"), "ab") as f:
+                offsets = []
+                for payload in payloads:
+                    offsets.append(f.tell())
+                    f.write(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+
+            with open(self._file("vectors.f32"), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._file("doc_ids.i64"), "ab") as f:
+                f.write(np.full(len(vectors), document_id, dtype=np.int64).tobytes())
+            with open(self._file("alive.u8"), "ab") as f:
+                f.write(np.ones(len(vectors), dtype=np.uint8).tobytes())
+            with open(self._file("offsets.i64"), "ab") as f:
+                f.write(np.asarray(offsets, dtype=np.int64).tobytes())
+            hashes = [_hash_bytes(payload.get("hash")) for payload in payloads]
+            with open(self._file("hashes.bin"), "ab") as f:
+                f.write(b"".join(hashes))
+
+            if self.manifest["nlist"]:
+                centroids = self._load_state()["centroids"]
+                assign = np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+                with open(self._file("assign.i32"), "ab") as f:
+                    f.write(assign.tobytes())
+
+            first_row = self.count
+            self.manifest["count"] += len(vectors)
+            self._save_manifest()
+            self._state = None
+
+            if self._hash_rows is not None:
+                for row, chunk_hash in enumerate(hashes, start=first_row):
+                    self._hash_rows.setdefault(chunk_hash, row)
+
+            if self._needs_training():
+                self.train()
+
+            return self.count
+
+    def _truncate_to_count(self):
+        """Descartar dados de uma escrita interrompida (além de `count`)"""
+        sizes = {
+            "vectors.f32": self.count * (self.dim or 0) * 4,
+            "doc_ids.i64": self.count * 8,
+            "alive.u8": self.count,
+            "offsets.i64": self.count * 8,
+            "hashes.bin": self.count * HASH_BYTES,
+        }
+        if self.manifest["nlist"]:
+            sizes["assign.i32"] = self.count * 4
+
+        for name, size in sizes.items():
+            file_path = self._file(name)
+            if file_path.exists() and file_path.stat().st_size > size:
+                with open(file_path, "r+b") as f:
+                    f.truncate(size)
+
+        payloads_path = self._file("payloads.jsonl")
+        if self.count and payloads_path.exists():
+            last_offset = int(np.fromfile(self._file("offsets.i64"), dtype=np.int64)[self.count - 1])
+            with open(payloads_path, "r+b") as f:
+                f.seek(last_offset)
+                f.readline()
+                f.truncate(f.tell())
+        elif payloads_path.exists():
+            payloads_path.unlink()
+
+    def delete_document(self, document_id: int) -> int:
+        """Marcar as linhas de um documento como removidas"""
+        with self.lock:
+            self._check_writable()
+            if not self.count:
+                return 0
+            state = self._load_state()
+            rows = np.flatnonzero((state["doc_ids"] == document_id) & state["alive"])
+            if len(rows):
+                alive = np.memmap(self._file("alive.u8"), dtype=np.uint8, mode="r+", shape=(self.count,))
+                alive[rows] = 0
+                alive.flush()
+                del alive
+                self._state = None
+            return len(rows)
+
+    def vectors_by_hash(self, chunk_hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Vetores já calculados para chunks com o mesmo texto (sha256)"""
+        with self.lock:
+            if not self.count:
+                return {}
+            if self._hash_rows is None:
+                raw = np.fromfile(self._file("hashes.bin"), dtype=np.uint8, count=self.count * HASH_BYTES)
+                self._hash_rows = {}
+                for row, chunk_hash in enumerate(raw.reshape(-1, HASH_BYTES)):
+                    self._hash_rows.setdefault(chunk_hash.tobytes(), row)
+            vectors = self._load_state()["vectors"]
+
+            found = {}
+            for chunk_hash in chunk_hashes:
+                row = self._hash_rows.get(_hash_bytes(chunk_hash)) if chunk_hash else None
+                if row is not None:
+                    found[chunk_hash] = np.asarray(vectors[row])
+            return found
+
+    def get_document_rows(self, document_id: int):
+        """Linhas, vetores e payloads ativos de um documento (para copiar entre índices)"""
+        with self.lock:
+            if not self.count:
+                return [], np.empty((0, 0), dtype=np.float32), []
+            state = self._load_state()
+            rows = np.flatnonzero((state["doc_ids"] == document_id) & state["alive"])
+            return rows.tolist(), np.asarray(state["vectors"][rows]), self._payloads(state, rows)
+
+    # IVF
+
+    def _needs_training(self) -> bool:
+        if self.count < settings.VECTOR_IVF_MIN_VECTORS:
+            return False
+        return self.count >= 2 * self.manifest["trained_count"]
+
+    def train(self):
+        """(Re)treinar o IVF e reatribuir todas as linhas"""
+        with self.lock:
+            self._check_writable()
+            state = self._load_state()
+            vectors = state["vectors"]
+            nlist = max(int(4 * np.sqrt(self.count)), 1)
+            nlist = min(nlist, settings.VECTOR_IVF_MAX_LISTS, self.count)
+
+            rng = np.random.default_rng(0)
+            sample_size = min(self.count, nlist * 64, KMEANS_MAX_SAMPLE)
+            sample_rows = np.sort(rng.choice(self.count, sample_size, replace=False))
+            centroids = train_kmeans(np.asarray(vectors[sample_rows]), nlist)
+
+            assign = np.empty(self.count, dtype=np.int32)
+            for start in range(0, self.count, SEARCH_BLOCK_ROWS):
+                block = np.asarray(vectors[start:start + SEARCH_BLOCK_ROWS])
+                assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+            np.save(self._file("centroids.npy"), centroids)
+            assign.tofile(self._file("assign.i32"))
+
+            self.manifest["nlist"] = nlist
+            self.manifest["trained_count"] = self.count
+            self._save_manifest()
+            self._state = None
+            logger.info(f"IVF treinado em {self.path} ({self.count} vetores, {nlist} listas)")
+
+    # Leitura
+
+    @staticmethod
+    def _payloads(state: Dict[str, Any], rows: Iterable[int]) -> List[Dict[str, Any]]:
+        """Payloads das linhas, lidos com pread (sem posição compartilhada entre threads)"""
+        offsets = state["offsets"]
+        fd = state["payloads"].fileno()
+        size = os.fstat(fd).st_size
+        payloads = []
+        for row in rows:
+            start = int(offsets[row])
+            end = int(offsets[row + 1]) if row + 1 < len(offsets) else size
+            line = os.pread(fd, end - start, start)
+            payloads.append(json.loads(line.split(b"\n", 1)[0]))
+        return payloads
+
+    def search(
+        self,
+        query_vector: np.ndarray,
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        document_ids: Optional[List[int]] = None
+    ) -> List[Dict[str, Any]]:
+        """Buscar os top_k chunks mais similares (cosseno)"""
+        with self.lock:
+            if not self.count:
+                return []
+            state = self._load_state()
+            count = self.count
+
+        query = normalize(query_vector).reshape(-1)
+        vectors = state["vectors"]
+        mask = state["alive"]
+
+        if document_ids is not None:
+            mask = mask & np.isin(state["doc_ids"], document_ids)
+
+        if state["centroids"] is not None:
+            nprobe = min(nprobe or settings.VECTOR_IVF_NPROBE, len(state["centroids"]))
+            probe = _top_k(state["centroids"] @ query, nprobe)
+            mask = mask & np.isin(state["assign"], probe)
+
+        candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            return []
+
+        if len(candidates) < count // 2:
+            # Poucos candidatos (IVF/filtro): ler apenas as linhas necessárias
+            scores = np.asarray(vectors[candidates]) @ query
+            order = _top_k(scores, top_k)
+            rows = candidates[order]
+            row_scores = scores[order]
+        else:
+            # Busca exata em blocos sobre o memmap
+            scores = np.empty(count, dtype=np.float32)
+            for start in range(0, count, SEARCH_BLOCK_ROWS):
+                scores[start:start + SEARCH_BLOCK_ROWS] = vectors[start:start + SEARCH_BLOCK_ROWS] @ query
+            scores[~mask] = -np.inf
+            rows = _top_k(scores, top_k)
+            rows = rows[np.isfinite(scores[rows])]
+            row_scores = scores[rows]
+
+        results = []
+        for row, score, payload in zip(rows, row_scores, self._payloads(state, rows)):
+            results.append({
+                "content": payload.get("content", ""),
+                "score": float(score),
+                "metadata": payload.get("metadata", {}),
+                "document_id": int(state["doc_ids"][row]),
+                "row": int(row)
+            })
+        return results
+
+    def get_rows(self, rows: List[int]) -> List[Dict[str, Any]]:
+        """Chunks ativos das linhas informadas (mesmo formato da busca, sem score)"""
+        with self.lock:
+            if not self.count:
+                return []
+            state = self._load_state()
+            rows = [row for row in rows if row < self.count and state["alive"][row]]
+
+            return [
+                {
+                    "content": payload.get("content", ""),
+                    "metadata": payload.get("metadata", {}),
+                    "document_id": int(state["doc_ids"][row]),
+                    "row": int(row)
+                }
+                for row, payload in zip(rows, self._payloads(state, rows))
+            ]
+
+    def iter_rows(self, start: int = 0, batch_size: int = 1000):
+        """Percorrer (linha, documento, payload) das linhas ativas a partir de `start`"""
+        with self.lock:
+            if start >= self.count:
+                return
+            state = self._load_state()
+            rows = np.flatnonzero(state["alive"][start:]) + start
+            doc_ids = state["doc_ids"]
+
+        for offset in range(0, len(rows), batch_size):
+            batch = rows[offset:offset + batch_size]
+            for row, payload in zip(batch, self._payloads(state, batch)):
+                yield int(row), int(doc_ids[row]), payload
+
+
+_indexes: Dict[int, VectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _pointer_path(kb_id: int) -> Path:
+    return Path(settings.VECTOR_INDEX_DIR) / f"kb_{kb_id}.current"
+
+
+def current_index_path(kb_id: int) -> Path:
+    """Diretório da geração no ar (`kb_<id>` até a primeira troca)"""
+    pointer = _pointer_path(kb_id)
+    try:
+        name = pointer.read_text().strip()
+    except FileNotFoundError:
+        name = f"kb_{kb_id}"
+    return pointer.with_name(name)
+
+
+def _next_generation_path(kb_id: int) -> Path:
+    root = Path(settings.VECTOR_INDEX_DIR)
+    prefix = f"kb_{kb_id}.g"
+    generations = [0]
+    for path in [*root.glob(f"{prefix}*"), current_index_path(kb_id)]:
+        if path.name.startswith(prefix) and path.name[len(prefix):].isdigit():
+            generations.append(int(path.name[len(prefix):]))
+    return root / f"{prefix}{max(generations) + 1}"
+
+
+def _set_current(kb_id: int, path: Path):
+    """Trocar o ponteiro da geração e aposentar a anterior (com o registro travado)"""
+    old_path = current_index_path(kb_id)
+    pointer = _pointer_path(kb_id)
+    pointer.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = pointer.with_name(pointer.name + ".tmp")
+    tmp_path.write_text(path.name)
+    tmp_path.replace(pointer)
+
+    index = _indexes.pop(kb_id, None)
+    if index is not None and index.path == old_path:
+        index.retire()
+    elif old_path.exists():
+        # Geração nunca aberta neste processo: sem leitores aqui
+        shutil.rmtree(old_path, ignore_errors=True)
+
+
+def get_vector_index(kb_id: int) -> VectorIndex:
+    """Obter (e manter aberto) o índice de uma base de conhecimento
+
+    Se outro processo trocou a geração, o objeto antigo é aposentado e a
+    geração atual é aberta.
+    """
+    path = current_index_path(kb_id)
+    with _indexes_lock:
+        index = _indexes.get(kb_id)
+        if index is None or index.path != path:
+            if index is not None:
+                index.retire()
+            index = VectorIndex(path)
+            _indexes[kb_id] = index
+        return index
+
+
+def staging_index_path(kb_id: int) -> Path:
+    """Diretório onde um novo índice da base é construído antes da troca"""
+    return Path(settings.VECTOR_INDEX_DIR) / f"kb_{kb_id}.staging"
+
+
+def install_vector_index(kb_id: int, staging_path: Path) -> Path:
+    """Mover um índice construído em `staging_path` para uma nova geração
+
+    A geração ainda não está no ar (ver `replace_vector_index`); se a
+    troca for desistida, basta apagar o diretório retornado.
+    """
+    Path(staging_path).mkdir(parents=True, exist_ok=True)
+    with _indexes_lock:
+        path = _next_generation_path(kb_id)
+        Path(staging_path).rename(path)
+    return path
+
+
+def replace_vector_index(kb_id: int, path: Path):
+    """Colocar no ar a geração em `path` (criada por `install_vector_index`)
+
+    Buscas em andamento terminam na geração antiga, que é apagada quando
+    deixa de ser usada.
+    """
+    with _indexes_lock:
+        _set_current(kb_id, Path(path))
+
+
+def drop_vector_index(kb_id: int):
+    """Remover o índice de uma base de conhecimento (a próxima escrita cria uma geração vazia)"""
+    with _indexes_lock:
+        _set_current(kb_id, _next_generation_path(kb_id))
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Benchmark de throughput do chat com e sem gravação em lote (write-behind)
+
+Sobe a aplicação em um único event loop (como um worker uvicorn) com um
+banco SQLite temporário e um servidor OpenAI simulado, e roda N sessões
+concorrentes fazendo turnos (com uma pausa de "digitação" entre eles) em
+poucos agentes (linhas "quentes").
+Compara a resposta gravada na própria requisição (CHAT_WRITE_BEHIND=False)
+com o buffer em lote e confere, ao final, se mensagens e contadores batem.
+
+Uso: python benchmark_chat_writes.py [--sessions 500] [--turns 3] [--agents 5] [--think 1.0] [--latency 0.05]
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import tempfile
+import time
+from collections import Counter
+
+# Banco temporário (precisa ser definido antes de importar a aplicação)
+TMP_DIR = tempfile.mkdtemp(prefix="chat_writes_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'chat.db')}"
+os.environ["DATABASE_ASYNC_URL"] = ""
+
+# Adicionar o diretório backend ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import httpx
+from sqlalchemy import func
+
+from app.config import settings
+from app.main import app
+from app.database import SessionLocal
+from app.models import User, Agent, Message
+from app.services.chat_writes import chat_writes
+from app.services.counters import counters
+from load_test_llm import MOCK_PORT, start_mock_server
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)] * 1000
+
+
+def counts(agent_ids):
+    db = SessionLocal()
+    try:
+        messages = db.query(func.count(Message.id)).scalar()
+        total_messages = db.query(func.sum(Agent.total_messages)).filter(Agent.id.in_(agent_ids)).scalar() or 0
+        return messages, total_messages
+    finally:
+        db.close()
+
+
+async def session(client, agent_id, args, latencies, statuses):
+    session_id = None
+    for turn in range(args.turns):
+        if turn:
+            await asyncio.sleep(args.think)
+        start = time.perf_counter()
+        try:
+            response = await client.post("/api/chat/", json={
+                "agent_id": agent_id,
+                "message": f"Pergunta {turn}",
+                "session_id": session_id,
+                "metadata": {}
+            })
+            status = response.status_code
+            if status == 200:
+                session_id = response.json()["session_id"]
+        except Exception as e:  # ASGITransport repassa exceções não tratadas (ex.: database is locked)
+            status = type(e).__name__
+        latencies.append(time.perf_counter() - start)
+        statuses[status] += 1
+
+
+async def scenario(label, write_behind, client, agent_ids, args):
+    await chat_writes.stop()
+    settings.CHAT_WRITE_BEHIND = write_behind
+    await chat_writes.start()
+
+    messages_before, totals_before = counts(agent_ids)
+    latencies, statuses = [], Counter()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        session(client, agent_ids[i % len(agent_ids)], args, latencies, statuses)
+        for i in range(args.sessions)
+    ))
+    elapsed = time.perf_counter() - start
+    await chat_writes.flush()
+    await counters.flush()
+
+    messages_after, totals_after = counts(agent_ids)
+    ok = statuses.get(200, 0)
+
+    print(f"\n📊 {label}")
+    print(f"   turnos             {ok} em {elapsed:.2f}s ({ok / elapsed:.1f} turnos/s)")
+    print(f"   latência           p50 {percentile(latencies, 50):8.1f} ms   p99 {percentile(latencies, 99):8.1f} ms")
+    print(f"   status             {dict(statuses)}")
+    print(
+        f"   conferência        mensagens +{messages_after - messages_before} "
+        f"(esperado {2 * ok}), total_messages +{totals_after - totals_before} (esperado {2 * ok})"
+    )
+    return ok / elapsed
+
+
+async def main(args):
+    settings.OPENAI_API_KEY = "sk-load-test"
+    settings.OPENAI_BASE_URL = f"http://127.0.0.1:{MOCK_PORT}/v1"
+    settings.RESPONSE_CACHE_ENABLED = False  # toda mensagem chama o LLM simulado
+    settings.RATE_LIMIT_ENABLED = False
+
+    async with app.router.lifespan_context(app):
+        db = SessionLocal()
+        user = User(email="writes@example.com", username="writes", hashed_password="x", plan="enterprise")
+        db.add(user)
+        db.commit()
+        agents = [Agent(name=f"Agente {i}", owner_id=user.id, is_published=True) for i in range(args.agents)]
+        db.add_all(agents)
+        db.commit()
+        agent_ids = [agent.id for agent in agents]
+        db.close()
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=300) as client:
+            print(
+                f"\n🚀 {args.sessions} sessões × {args.turns} turnos em {args.agents} agentes "
+                f"(pausa {args.think}s, LLM simulado: {args.latency * 1000:.0f} ms)"
+            )
+            inline = await scenario("Resposta gravada na requisição", False, client, agent_ids, args)
+            batched = await scenario(
+                f"Write-behind (flush a cada {settings.CHAT_WRITE_FLUSH_INTERVAL}s)", True, client, agent_ids, args
+            )
+
+    print(f"\n✅ Ganho de throughput: {batched / inline:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput do chat com gravação em lote")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--agents", type=int, default=5)
+    parser.add_argument("--think", type=float, default=1.0, help="segundos entre os turnos de uma sessão")
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Benchmark - gravação em lote do chat")
+    print("=" * 60)
+
+    start_mock_server(args.latency)
+    asyncio.run(main(args))
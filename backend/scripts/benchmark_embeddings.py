@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Benchmark de throughput de embeddings contra um servidor OpenAI simulado (local)
+
+O servidor simula latência proporcional ao lote, rejeita requisições acima
+de 2048 textos (como a API real) e aplica um limite de tokens por minuto,
+respondendo 429 com Retry-After quando excedido. Mede chunks/s do envio
+sequencial em lotes e do agendador com concorrência.
+
+Uso: python benchmark_embeddings.py [--chunks 5000] [--concurrency 8] [--server-tpm 10000000]
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import threading
+import time
+
+# Adicionar o diretório backend ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+from app.services.embeddings import OpenAIEmbedder
+from app.services.embedding_scheduler import EmbeddingScheduler
+
+MOCK_PORT = 8766
+MAX_INPUTS = 2048
+DIM = 8
+
+
+def create_mock_embeddings(latency: float, per_item: float, server_tpm: int) -> FastAPI:
+    """Servidor compatível com /v1/embeddings com limite de tokens por minuto"""
+    mock = FastAPI()
+    state = {"available": float(server_tpm), "updated": time.monotonic(), "rejected": 0}
+
+    @mock.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"]
+        if len(inputs) > MAX_INPUTS:
+            return JSONResponse(status_code=400, content={"error": {"message": "too many inputs"}})
+
+        # Balde de tokens: capacidade de 1 minuto, reabastecido continuamente
+        tokens = sum(len(text) // 4 + 1 for text in inputs)
+        now = time.monotonic()
+        state["available"] = min(server_tpm, state["available"] + (now - state["updated"]) * server_tpm / 60)
+        state["updated"] = now
+        if tokens > state["available"]:
+            state["rejected"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": "1"},
+                content={"error": {"message": "rate limit", "type": "tokens"}}
+            )
+        state["available"] -= tokens
+
+        await asyncio.sleep(latency + per_item * len(inputs))
+        return {
+            "object": "list",
+            "model": body["model"],
+            "data": [
+                {"object": "embedding", "index": i, "embedding": [0.1] * DIM}
+                for i in range(len(inputs))
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        }
+
+    def reset():
+        state.update(available=float(server_tpm), updated=time.monotonic())
+
+    mock.state.counters = state
+    mock.state.reset = reset
+    return mock
+
+
+def start_mock_server(app: FastAPI) -> uvicorn.Server:
+    config = uvicorn.Config(app, host="127.0.0.1", port=MOCK_PORT, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run(label: str, scheduler: EmbeddingScheduler, texts, mock: FastAPI):
+    counters = mock.state.counters
+    mock.state.reset()
+    rejected = counters["rejected"]
+    start = time.perf_counter()
+    try:
+        vectors = await scheduler.embed(texts)
+    except Exception as e:
+        print(f"   {label:<34} ❌ falhou: {str(e)[:60]}")
+        return
+    elapsed = time.perf_counter() - start
+    assert vectors.shape == (len(texts), DIM)
+    print(
+        f"   {label:<34} {elapsed:7.2f}s  {len(texts) / elapsed:8.1f} chunks/s"
+        f"  (429: {counters['rejected'] - rejected})"
+    )
+
+
+async def main(args, mock: FastAPI):
+    settings.OPENAI_API_KEY = "sk-benchmark"
+    settings.OPENAI_BASE_URL = f"http://127.0.0.1:{MOCK_PORT}/v1"
+
+    embedder = OpenAIEmbedder("text-embedding-ada-002")
+    texts = [f"chunk {i} " + "texto de exemplo " * 50 for i in range(args.chunks)]
+
+    print(f"\n🚀 {args.chunks} chunks, limite do servidor {args.server_tpm:,} tokens/min\n")
+
+    # Comportamento antigo: todos os textos em uma única requisição
+    await run("Requisição única (antigo)", EmbeddingScheduler(
+        embedder._embed_batch, max_batch_size=args.chunks, max_batch_tokens=10 ** 12, concurrency=1
+    ), texts, mock)
+
+    await run("Lotes sequenciais", EmbeddingScheduler(
+        embedder._embed_batch,
+        max_batch_size=args.batch_size,
+        concurrency=1,
+        tokens_per_minute=args.client_tpm
+    ), texts, mock)
+
+    await run(f"Agendador ({args.concurrency} em paralelo)", EmbeddingScheduler(
+        embedder._embed_batch,
+        max_batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        tokens_per_minute=args.client_tpm
+    ), texts, mock)
+
+    await run("Agendador sem orçamento (só retry)", EmbeddingScheduler(
+        embedder._embed_batch,
+        max_batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        max_retries=20
+    ), texts, mock)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de embeddings")
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--per-item", type=float, default=0.001)
+    parser.add_argument("--server-tpm", type=int, default=10000000)
+    parser.add_argument("--client-tpm", type=int, default=9000000)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Benchmark - embeddings")
+    print("=" * 60)
+
+    mock = create_mock_embeddings(args.latency, args.per_item, args.server_tpm)
+    start_mock_server(mock)
+    asyncio.run(main(args, mock))
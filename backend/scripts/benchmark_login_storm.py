@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latência do chat durante uma rajada de logins
+
+Sobe a aplicação em um único event loop (como um worker uvicorn) com um
+banco SQLite temporário e um servidor OpenAI simulado, mantém clientes de
+chat em laço e mede a latência de /api/chat/ sem carga extra e durante uma
+rajada de logins concorrentes. Compara o caminho antigo (bcrypt executado no
+event loop) com o pool de hashing atual.
+
+Uso: python benchmark_login_storm.py [--logins 30] [--chat-clients 4] [--latency 0.05]
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import tempfile
+import time
+from collections import Counter
+
+# Banco temporário (precisa ser definido antes de importar a aplicação)
+TMP_DIR = tempfile.mkdtemp(prefix="login_storm_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'storm.db')}"
+os.environ["DATABASE_ASYNC_URL"] = ""
+
+# Adicionar o diretório backend ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import httpx
+
+from app.config import settings
+from app.main import app
+from app.database import SessionLocal
+from app.models import User, Agent
+from app.auth import get_password_hash
+from app.api import auth as auth_routes
+from app.services.password_pool import PasswordPool
+from app.services.throttling import login_throttle
+from load_test_llm import MOCK_PORT, start_mock_server
+
+EMAIL = "storm@example.com"
+PASSWORD = "senha-do-benchmark"
+
+
+class InlinePool(PasswordPool):
+    """Caminho antigo: bcrypt chamado direto dentro do handler async"""
+
+    async def run(self, func, *args):
+        return func(*args)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)] * 1000
+
+
+async def chat_client(client, agent_id, stop, latencies, errors):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            response = await client.post("/api/chat/", json={
+                "agent_id": agent_id, "message": "Qual o prazo de entrega?", "metadata": {}
+            })
+            status = response.status_code
+        except Exception as e:  # ASGITransport repassa exceções não tratadas (ex.: database is locked)
+            status = type(e).__name__
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            errors.append(status)
+
+
+async def login_storm(client, total):
+    async def login(i):
+        response = await client.post(
+            "/api/auth/login",
+            data={"username": EMAIL, "password": PASSWORD if i % 2 else "senha-errada"},
+            headers={"X-Forwarded-For": f"10.0.{i // 250}.{i % 250}"}
+        )
+        return response.status_code
+
+    start = time.perf_counter()
+    statuses = Counter(await asyncio.gather(*(login(i) for i in range(total))))
+    return time.perf_counter() - start, statuses
+
+
+async def scenario(label, pool, client, agent_id, args):
+    auth_routes.password_pool = pool
+    login_throttle.attempts.clear()
+
+    async def measure(storm):
+        latencies, errors, stop = [], [], asyncio.Event()
+        clients = [
+            asyncio.create_task(chat_client(client, agent_id, stop, latencies, errors))
+            for _ in range(args.chat_clients)
+        ]
+        if storm:
+            elapsed, statuses = await login_storm(client, args.logins)
+        else:
+            await asyncio.sleep(args.quiet_seconds)
+            elapsed, statuses = None, None
+        stop.set()
+        await asyncio.gather(*clients)
+        return latencies, errors, elapsed, statuses
+
+    quiet, quiet_errors, _, _ = await measure(storm=False)
+    storm, storm_errors, elapsed, statuses = await measure(storm=True)
+
+    print(f"\n📊 {label}")
+    for phase, latencies, errors in (("sem carga", quiet, quiet_errors), ("na rajada", storm, storm_errors)):
+        print(
+            f"   chat {phase:<12}  p50 {percentile(latencies, 50):8.1f} ms   p99 {percentile(latencies, 99):8.1f} ms"
+            f"  ({len(latencies)} req, {len(errors)} erros)"
+        )
+    print(
+        f"   logins             {args.logins} em {elapsed:.2f}s ({args.logins / elapsed:.1f}/s)  "
+        f"status: {dict(sorted(statuses.items()))}"
+    )
+    pool.close()
+
+
+async def main(args):
+    settings.OPENAI_API_KEY = "sk-load-test"
+    settings.OPENAI_BASE_URL = f"http://127.0.0.1:{MOCK_PORT}/v1"
+    settings.RESPONSE_CACHE_ENABLED = False  # toda mensagem chama o LLM simulado
+    settings.TRUST_PROXY_HEADERS = True  # um IP por login da rajada
+    settings.LOGIN_RATE_LIMIT = 0
+
+    async with app.router.lifespan_context(app):
+        db = SessionLocal()
+        user = User(email=EMAIL, username="storm", hashed_password=get_password_hash(PASSWORD))
+        db.add(user)
+        db.commit()
+        agent = Agent(name="Benchmark", owner_id=user.id, is_published=True)
+        db.add(agent)
+        db.commit()
+        agent_id = agent.id
+        db.close()
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120) as client:
+            print(
+                f"\n🚀 {args.chat_clients} clientes de chat (LLM simulado: {args.latency * 1000:.0f} ms), "
+                f"rajada de {args.logins} logins"
+            )
+            await scenario("bcrypt no event loop (antigo)", InlinePool(1, 0), client, agent_id, args)
+            await scenario(
+                f"Pool de hashing ({settings.PASSWORD_HASH_WORKERS} threads, fila {settings.PASSWORD_HASH_MAX_PENDING})",
+                PasswordPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING),
+                client, agent_id, args
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latência do chat durante rajada de logins")
+    parser.add_argument("--logins", type=int, default=30)
+    parser.add_argument("--chat-clients", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--quiet-seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Benchmark - chat durante rajada de logins")
+    print("=" * 60)
+
+    start_mock_server(args.latency)
+    asyncio.run(main(args))
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Benchmark de parsing/chunking de PDFs grandes
+
+Gera um corpus sintético (PDFs com texto em todas as páginas) e compara o
+caminho antigo (PyPDFLoader carregando o documento inteiro em um único
+processo) com o parsing por faixas de páginas em um pool de processos, para
+1, 2, 4 ... núcleos. Cada cenário roda em um processo próprio, para que o
+pico de memória (ru_maxrss) de um não contamine o do outro.
+
+Uso: python benchmark_parsing.py [--pages 1000] [--documents 4] [--pages-per-task 25]
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import multiprocessing
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Adicionar o diretório backend ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config import settings
+from app.services.rag import RAGService, LANGCHAIN_AVAILABLE, PYPDF_AVAILABLE, _split, pdf_page_count
+
+WORDS = (
+    "contrato cliente entrega prazo valor pagamento garantia produto servico "
+    "suporte politica reembolso cadastro pedido nota fiscal desconto frete"
+).split()
+LINES_PER_PAGE = 40
+
+
+def write_pdf(path: str, pages: int, seed: int = 0):
+    """PDF mínimo (texto ASCII em Helvetica) escrito à mão, sem dependências"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # árvore de páginas, preenchida no final
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in range(pages):
+        lines = []
+        for line in range(LINES_PER_PAGE):
+            words = [WORDS[(seed + page * 7 + line * 3 + i) % len(WORDS)] for i in range(12)]
+            lines.append(f"Pagina {page + 1} linha {line + 1}: " + " ".join(words))
+        text = " T* ".join(f"({line}) Tj" for line in lines)
+        stream = f"BT /F1 10 Tf 12 TL 40 800 Td {text} ET".encode("ascii")
+
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        kids.append(b"%d 0 R" % len(objects))
+
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def peak_memory_mb() -> float:
+    """Pico de memória do processo e do maior processo filho (MB)"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own / 1024, children / 1024
+
+
+def run_baseline(paths, chunk_size, chunk_overlap):
+    """Caminho antigo: documento inteiro carregado e dividido de uma vez"""
+    from langchain_community.document_loaders import PyPDFLoader
+
+    chunks = 0
+    for path in paths:
+        chunks += len(_split(PyPDFLoader(path).load(), chunk_size, chunk_overlap))
+    return chunks
+
+
+async def run_parallel(paths, chunk_size, chunk_overlap, executor):
+    """Faixas de páginas no pool; documentos da pasta processados ao mesmo tempo"""
+    rag_service = RAGService()
+
+    async def consume(path):
+        count = 0
+        async for batch in rag_service.iter_chunks(path, chunk_size, chunk_overlap, executor=executor):
+            count += len(batch)
+        return count
+
+    return sum(await asyncio.gather(*(consume(path) for path in paths)))
+
+
+def scenario(label, paths, processes, args, results):
+    settings.PDF_PAGES_PER_TASK = args.pages_per_task
+    settings.INGESTION_PROCESSES = processes or 1
+
+    if processes == 0:
+        start = time.perf_counter()
+        chunks = run_baseline(paths, args.chunk_size, args.chunk_overlap)
+        elapsed = time.perf_counter() - start
+    else:
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            # Aquecer o pool (na aplicação ele é criado uma vez, no startup)
+            list(pool.map(pdf_page_count, paths[:1] * processes))
+
+            start = time.perf_counter()
+            chunks = asyncio.run(run_parallel(paths, args.chunk_size, args.chunk_overlap, pool))
+            elapsed = time.perf_counter() - start
+
+    results.put((label, elapsed, chunks, *peak_memory_mb()))
+
+
+def run(label, paths, processes, args, pages):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=scenario, args=(label, paths, processes, args, results))
+    process.start()
+    label, elapsed, chunks, own_mb, child_mb = results.get()
+    process.join()
+
+    print(
+        f"   {label:<28} {elapsed:7.2f}s  {pages / elapsed:8.1f} páginas/s"
+        f"  {chunks:6d} chunks  RSS {own_mb:6.0f}MB (worker {child_mb:5.0f}MB)"
+    )
+
+
+def main(args):
+    if not (LANGCHAIN_AVAILABLE and PYPDF_AVAILABLE):
+        print("❌ langchain e pypdf são necessários para o benchmark")
+        return
+
+    process_counts = []
+    n = 1
+    while n < (os.cpu_count() or 1):
+        process_counts.append(n)
+        n *= 2
+    process_counts.append(os.cpu_count() or 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"\n📄 Gerando corpus sintético ({args.pages} páginas por PDF)...")
+        single = os.path.join(tmp, "grande.pdf")
+        write_pdf(single, args.pages)
+        folder = []
+        for i in range(args.documents):
+            path = os.path.join(tmp, f"doc_{i}.pdf")
+            write_pdf(path, args.pages, seed=i)
+            folder.append(path)
+
+        print(f"\n🚀 Um PDF de {args.pages} páginas ({os.cpu_count()} núcleos disponíveis)\n")
+        run("PyPDFLoader (antigo)", [single], 0, args, args.pages)
+        for processes in process_counts:
+            run(f"Faixas, {processes} processo(s)", [single], processes, args, args.pages)
+
+        total_pages = args.pages * args.documents
+        print(f"\n🚀 Pasta com {args.documents} PDFs ({total_pages} páginas)\n")
+        run("PyPDFLoader (antigo)", folder, 0, args, total_pages)
+        for processes in process_counts:
+            run(f"Faixas, {processes} processo(s)", folder, processes, args, total_pages)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de parsing de PDFs")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--pages-per-task", type=int, default=settings.PDF_PAGES_PER_TASK)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Benchmark - parsing de PDFs")
+    print("=" * 60)
+
+    main(args)
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Benchmark das consultas quentes de conversas e mensagens
+
+Popula um banco de teste (10M de mensagens por padrão) sem os índices
+compostos, mede as consultas de chat, histórico e analytics e mostra o plano
+de execução de cada uma; em seguida aplica as migrações do Alembic (índices
+compostos e carga de `agent_daily_stats`), repete as medições e mede as
+consultas dos dashboards sobre as métricas pré-agregadas. Um banco SQLite já
+populado em execução anterior é reaproveitado.
+
+ATENÇÃO: use apenas um banco descartável - os índices são removidos e o
+histórico de migrações do banco é reiniciado.
+
+Uso: python benchmark_queries.py [--messages 10000000] [--database-url sqlite:////tmp/bench.db]
+"""
+
+import sys
+import os
+import argparse
+import importlib.util
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Adicionar o diretório backend ao path
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, func, insert, select, text
+
+from app.config import settings
+from app.database import Base
+from app.models import User, Agent, AgentDailyStats, Conversation, Message
+
+MESSAGES_PER_CONVERSATION = 20
+SEED_BATCH = 20000
+DAYS = 90
+CHANNELS = ["webchat", "whatsapp", "telegram", "api"]
+
+
+def load_migration_indexes():
+    """Índices criados pela migração 0001 (removidos para o cenário "antes")"""
+    path = os.path.join(BACKEND_DIR, "alembic", "versions", "0001_conversation_message_indexes.py")
+    spec = importlib.util.spec_from_file_location("migration_0001", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.INDEXES
+
+
+def seed(engine, args):
+    """Popular usuários, agentes, conversas e mensagens em lotes"""
+    rng = random.Random(42)
+    conversations = max(args.messages // MESSAGES_PER_CONVERSATION, 1)
+    now = datetime.utcnow()
+
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"id": i, "email": f"user{i}@bench.local", "username": f"user{i}",
+             "hashed_password": "x", "plan": "pro", "is_active": True}
+            for i in range(1, args.users + 1)
+        ])
+        conn.execute(insert(Agent.__table__), [
+            {"id": i, "name": f"Agente {i}", "owner_id": (i - 1) % args.users + 1,
+             "model": "gpt-4", "is_active": True, "is_published": True}
+            for i in range(1, args.agents + 1)
+        ])
+
+    message_id = 0
+    start = time.perf_counter()
+    for first in range(1, conversations + 1, SEED_BATCH // MESSAGES_PER_CONVERSATION):
+        last = min(first + SEED_BATCH // MESSAGES_PER_CONVERSATION, conversations + 1)
+        conversation_rows, message_rows = [], []
+        for conversation_id in range(first, last):
+            created_at = now - timedelta(seconds=rng.randint(0, DAYS * 86400))
+            is_active = rng.random() < 0.1
+            conversation_rows.append({
+                "id": conversation_id,
+                "agent_id": rng.randint(1, args.agents),
+                "session_id": f"bench-{conversation_id}",
+                "channel": rng.choice(CHANNELS),
+                "is_active": is_active,
+                "ended_at": None if is_active else created_at + timedelta(minutes=30),
+                "rating": rng.randint(1, 5) if rng.random() < 0.3 else None,
+                "created_at": created_at,
+            })
+            for position in range(MESSAGES_PER_CONVERSATION):
+                message_id += 1
+                assistant = position % 2 == 1
+                message_rows.append({
+                    "id": message_id,
+                    "conversation_id": conversation_id,
+                    "role": "assistant" if assistant else "user",
+                    "content": f"mensagem {position} da conversa {conversation_id}",
+                    "latency": rng.uniform(0.3, 4.0) if assistant else None,
+                    "created_at": created_at + timedelta(seconds=position * 15),
+                })
+
+        with engine.begin() as conn:
+            conn.execute(insert(Conversation.__table__), conversation_rows)
+            conn.execute(insert(Message.__table__), message_rows)
+
+        elapsed = time.perf_counter() - start
+        print(f"\r   {message_id:>11,d} mensagens ({message_id / elapsed:,.0f}/s)", end="", flush=True)
+    print()
+
+
+def count(query):
+    return select(func.count()).select_from(query.subquery())
+
+
+def hot_queries(conversation_id: int, agent_id: int, owner_id: int):
+    """Consultas do chat e do histórico, e as de analytics sobre as tabelas brutas"""
+    start_date = datetime.utcnow() - timedelta(days=30)
+    return [
+        ("chat: janela de contexto", select(Message).where(
+            Message.conversation_id == conversation_id,
+            Message.id > 0
+        ).order_by(Message.created_at.desc(), Message.id.desc()).limit(33)),
+        ("get_chat_history", select(Message).where(
+            Message.conversation_id == conversation_id
+        ).order_by(Message.created_at)),
+        ("analytics: conversas ativas", count(select(Conversation.id).where(
+            Conversation.agent_id == agent_id,
+            Conversation.is_active == True
+        ))),
+        ("analytics: total de mensagens", count(select(Message.id).join(Conversation).where(
+            Conversation.agent_id == agent_id
+        ))),
+        ("analytics: rating médio", select(func.avg(Conversation.rating)).where(
+            Conversation.agent_id == agent_id,
+            Conversation.rating.isnot(None)
+        )),
+        ("analytics: mensagens por dia", select(
+            func.date(Message.created_at), func.count(Message.id)
+        ).join(Conversation).where(
+            Conversation.agent_id == agent_id,
+            Message.created_at >= start_date
+        ).group_by(func.date(Message.created_at))),
+        ("analytics: tempo de resposta", select(func.avg(Message.latency)).where(
+            Message.conversation_id.in_(
+                select(Conversation.id).where(Conversation.agent_id == agent_id)
+            ),
+            Message.role == 'assistant'
+        )),
+        ("stats: conversas por canal", select(
+            Conversation.channel, func.count(Conversation.id)
+        ).join(Agent).where(
+            Agent.owner_id == owner_id
+        ).group_by(Conversation.channel)),
+        ("dashboard: total de mensagens", count(
+            select(Message.id).join(Conversation).join(Agent).where(Agent.owner_id == owner_id)
+        )),
+    ]
+
+
+def rollup_queries(agent_id: int, owner_id: int):
+    """Consultas atuais dos dashboards (tabela agent_daily_stats)"""
+    start_date = (datetime.utcnow() - timedelta(days=30)).date()
+    owned = AgentDailyStats.agent_id.in_(select(Agent.id).where(Agent.owner_id == owner_id))
+    totals = select(
+        func.sum(AgentDailyStats.conversations),
+        func.sum(AgentDailyStats.conversations_ended),
+        func.sum(AgentDailyStats.messages),
+        func.sum(AgentDailyStats.rating_sum),
+        func.sum(AgentDailyStats.latency_sum),
+    )
+    return [
+        ("analytics: totais do agente", totals.where(AgentDailyStats.agent_id == agent_id)),
+        ("analytics: mensagens por dia", select(
+            AgentDailyStats.day, func.sum(AgentDailyStats.messages)
+        ).where(
+            AgentDailyStats.agent_id == agent_id,
+            AgentDailyStats.day >= start_date
+        ).group_by(AgentDailyStats.day)),
+        ("stats: conversas por canal", select(
+            AgentDailyStats.channel, func.sum(AgentDailyStats.conversations)
+        ).where(owned).group_by(AgentDailyStats.channel)),
+        ("dashboard: totais do usuário", totals.where(owned)),
+    ]
+
+
+def explain(conn, sql: str):
+    """Plano de execução no formato do banco"""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        return [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+    if dialect == "postgresql":
+        return [row[0] for row in conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {sql}")]
+    return [str(row[0]) for row in conn.exec_driver_sql(f"EXPLAIN {sql}")]
+
+
+def measure(engine, queries, repeat: int):
+    results = {}
+    with engine.connect() as conn:
+        for label, query in queries:
+            sql = str(query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.exec_driver_sql(sql).all()
+                timings.append((time.perf_counter() - start) * 1000)
+            results[label] = (statistics.median(timings), explain(conn, sql))
+    return results
+
+
+def report(title, results):
+    print(f"\n📊 {title}\n")
+    for label, (median_ms, plan) in results.items():
+        print(f"   {label:<32} {median_ms:10.2f} ms")
+        for line in plan:
+            print(f"      {line}")
+
+
+def analyze(engine):
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def main(args):
+    url = args.database_url or f"sqlite:///{os.path.join(tempfile.gettempdir(), 'aimaestro_benchmark.db')}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+
+    # Cenário "antes": sem os índices da migração e sem histórico do Alembic
+    indexes = load_migration_indexes()
+    with engine.begin() as conn:
+        for name, table, _ in indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+        conn.execute(text("DELETE FROM agent_daily_stats"))
+
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count(Message.id))).scalar()
+    if existing >= args.messages:
+        print(f"\n♻️  Reaproveitando {existing:,d} mensagens de {url}")
+    else:
+        if existing:
+            print(f"\n❌ O banco já tem {existing:,d} mensagens; use um banco vazio")
+            return
+        print(f"\n🌱 Populando {args.messages:,d} mensagens em {url}...")
+        seed(engine, args)
+    analyze(engine)
+
+    with engine.connect() as conn:
+        # Agente com mais conversas, seu dono e uma conversa dele
+        agent_id, owner_id = conn.execute(
+            select(Conversation.agent_id, Agent.owner_id).join(Agent)
+            .group_by(Conversation.agent_id, Agent.owner_id)
+            .order_by(func.count(Conversation.id).desc()).limit(1)
+        ).one()
+        conversation_id = conn.execute(
+            select(func.max(Conversation.id)).where(Conversation.agent_id == agent_id)
+        ).scalar()
+
+    queries = hot_queries(conversation_id, agent_id, owner_id)
+    report("Antes (apenas chaves primárias e session_id)", measure(engine, queries, args.repeat))
+
+    print("\n🔧 Aplicando migrações (alembic upgrade head)...")
+    settings.DATABASE_URL = url
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    start = time.perf_counter()
+    command.upgrade(config, "head")
+    print(f"   Migrações aplicadas em {time.perf_counter() - start:.1f}s")
+    analyze(engine)
+
+    report("Depois (índices compostos)", measure(engine, queries, args.repeat))
+
+    with engine.connect() as conn:
+        rows = conn.execute(select(func.count(AgentDailyStats.id))).scalar()
+    report(
+        f"Dashboards sobre agent_daily_stats ({rows:,d} linhas)",
+        measure(engine, rollup_queries(agent_id, owner_id), args.repeat)
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark das consultas de conversas e mensagens")
+    parser.add_argument("--messages", type=int, default=10_000_000)
+    parser.add_argument("--agents", type=int, default=50)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database-url", default="", help="banco descartável (padrão: SQLite temporário)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Benchmark - consultas de conversas e mensagens")
+    print("=" * 60)
+
+    main(args)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Teste de carga do LLMService contra um servidor OpenAI simulado (local)
+
+Compara o caminho antigo (SDK síncrono chamado dentro de async def, que
+bloqueia o event loop) com o caminho atual (clientes assíncronos nativos),
+disparando N requisições concorrentes em um único event loop - o mesmo
+cenário de um worker uvicorn atendendo vários /api/chat ao mesmo tempo.
+
+Uso: python load_test_llm.py [--requests 200] [--latency 0.5]
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import threading
+import time
+
+# Adicionar o diretório backend ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import openai
+import uvicorn
+from fastapi import FastAPI, Request
+
+from app.config import settings
+from app.services.llm import LLMService
+
+MOCK_PORT = 8765
+
+
+def create_mock_openai(latency: float) -> FastAPI:
+    """Servidor compatível com /v1/chat/completions que responde após `latency` segundos"""
+    mock = FastAPI()
+
+    @mock.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        return {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "ok"},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        }
+
+    return mock
+
+
+def start_mock_server(latency: float) -> uvicorn.Server:
+    config = uvicorn.Config(
+        create_mock_openai(latency),
+        host="127.0.0.1",
+        port=MOCK_PORT,
+        log_level="warning",
+        limit_concurrency=10000,
+        backlog=4096
+    )
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def blocking_call(client: openai.OpenAI):
+    """Reproduz o comportamento antigo: SDK síncrono dentro de async def"""
+    client.chat.completions.create(
+        model="gpt-4",
+        messages=[{"role": "user", "content": "oi"}]
+    )
+
+
+async def run(label: str, make_call, total: int):
+    start = time.perf_counter()
+    await asyncio.gather(*(make_call() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    print(f"   {label:<28} {elapsed:8.2f}s  {total / elapsed:8.1f} req/s")
+    return elapsed
+
+
+async def main(total: int, latency: float):
+    base_url = f"http://127.0.0.1:{MOCK_PORT}/v1"
+    settings.OPENAI_API_KEY = "sk-load-test"
+    settings.OPENAI_BASE_URL = base_url
+
+    sync_client = openai.OpenAI(api_key="sk-load-test", base_url=base_url)
+    llm = LLMService("gpt-4")
+
+    async def async_call():
+        await llm.generate(messages=[{"role": "user", "content": "oi"}])
+
+    print(f"\n🚀 {total} requisições concorrentes, latência simulada de {latency}s\n")
+    blocking = await run("SDK síncrono (antigo)", lambda: blocking_call(sync_client), total)
+    non_blocking = await run("Cliente assíncrono (atual)", async_call, total)
+    print(f"\n📈 Ganho de concorrência: {blocking / non_blocking:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga do LLMService")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Teste de carga - LLMService")
+    print("=" * 60)
+
+    start_mock_server(args.latency)
+    asyncio.run(main(args.requests, args.latency))
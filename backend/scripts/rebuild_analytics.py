@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Recalcular as métricas pré-agregadas de analytics (agent_daily_stats)
+
+O chat mantém os contadores a cada mensagem; este script os recalcula a partir
+de `conversations` e `messages` - para corrigir divergências (ex: mensagens
+importadas direto no banco) ou após restaurar um backup.
+
+Uso: python rebuild_analytics.py [--agent-id 123]
+"""
+
+import sys
+import os
+import argparse
+import time
+
+# Adicionar o diretório backend ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.database import SessionLocal
+from app.models import Agent
+from app.services.analytics_rollup import rebuild_rollups
+
+
+def main(agent_id=None):
+    db = SessionLocal()
+    try:
+        if agent_id is not None and db.get(Agent, agent_id) is None:
+            print(f"❌ Agente {agent_id} não encontrado")
+            return
+
+        scope = f"do agente {agent_id}" if agent_id is not None else "de todos os agentes"
+        print(f"\n🔄 Recalculando métricas {scope}...")
+
+        start = time.perf_counter()
+        rows = rebuild_rollups(db, agent_id)
+        print(f"✅ {rows} linhas (agente × dia × canal) em {time.perf_counter() - start:.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recalcular métricas de analytics")
+    parser.add_argument("--agent-id", type=int, default=None)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("AI-Maestro - Recalcular analytics")
+    print("=" * 60)
+
+    main(args.agent_id)
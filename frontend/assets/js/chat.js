@@ -59,7 +59,7 @@ async function sendMessage() {
   sendButton.disabled = true
 
   try {
-    const response = await fetchWithAuth('/chat/', {
+    const response = await fetchWithAuth('/chat/stream', {
       method: 'POST',
       body: JSON.stringify({
         agent_id: parseInt(agentId, 10),
@@ -71,9 +71,19 @@ async function sendMessage() {
     if (!response) return
     if (!response.ok) throw new Error('Erro ao enviar mensagem')
 
-    const data = await response.json()
-    sessionId = sessionId || data.session_id
-    appendMessage(data.message, 'assistant')
+    const bubble = appendMessage('', 'assistant')
+    let text = ''
+
+    await readEventStream(response, (event) => {
+      if (event.type === 'start') {
+        sessionId = sessionId || event.session_id
+      } else if (event.type === 'delta') {
+        text += event.content
+        updateMessage(bubble, text)
+      } else if (event.type === 'error') {
+        throw new Error(event.detail)
+      }
+    })
   } catch (error) {
     showAlert(alertContainer, error.message, 'danger')
   } finally {
@@ -81,12 +91,38 @@ async function sendMessage() {
   }
 }
 
+async function readEventStream(response, onEvent) {
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    const events = buffer.split('\n\n')
+    buffer = events.pop()
+    for (const rawEvent of events) {
+      const dataLine = rawEvent.split('\n').find((line) => line.startsWith('data: '))
+      if (dataLine) {
+        onEvent(JSON.parse(dataLine.slice(6)))
+      }
+    }
+  }
+}
+
 function appendMessage(text, role = 'assistant') {
   clearAlert(alertContainer)
   const wrapper = document.createElement('div')
   wrapper.className = `message-bubble ${role === 'user' ? 'user' : 'assistant'}`
+  messagesElement.appendChild(wrapper)
+  updateMessage(wrapper, text)
+  return wrapper
+}
+
+function updateMessage(wrapper, text) {
   const safeText = escapeHTML(text).replace(/\n/g, '<br>')
   wrapper.innerHTML = `<p class="mb-0">${safeText}</p>`
-  messagesElement.appendChild(wrapper)
   messagesElement.scrollTop = messagesElement.scrollHeight
 }